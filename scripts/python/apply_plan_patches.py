@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Apply one or more patch sets from fragments/manifest.json to the plan.
+
+    python scripts/python/apply_plan_patches.py phase2
+    python scripts/python/apply_plan_patches.py --stream phase2
+    python scripts/python/apply_plan_patches.py --watch phase2
+    python scripts/python/apply_plan_patches.py --list
+    python scripts/python/apply_plan_patches.py --profile --trace plan-trace.json phase2
+"""
+
+import argparse
+import os
+import sys
+
+from plan_tools import PLAN_PATH
+from plan_tools.fragments import FragmentRegistry
+from plan_tools.patch import APPLIED, MODIFIED, PatchError, run
+from plan_tools.stream import run_streaming
+from plan_tools.trace import add_arguments, from_args, report
+from plan_tools.watch import PatchDaemon, make_watcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply plan patch sets in one batch.')
+    parser.add_argument('patch_sets', nargs='*', help='patch set names from fragments/manifest.json')
+    parser.add_argument('--plan', default=PLAN_PATH, help='plan file, relative to the project root')
+    parser.add_argument('--list', action='store_true', help='list available patch sets')
+    parser.add_argument('--stream', action='store_true',
+                        help='memory-map the plan and stream the output (for very large plans)')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and re-apply patches when fragments or the plan change')
+    parser.add_argument('--poll', action='store_true', help='with --watch, poll instead of using inotify')
+    parser.add_argument('--debounce', type=float, default=0.1,
+                        help='with --watch, seconds to wait for changes to settle (default 0.1)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the outcome of every unit')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.watch and (args.profile or args.trace):
+        parser.error('--profile and --trace apply to single runs, not --watch')
+
+    registry = FragmentRegistry()
+    if args.list or not args.patch_sets:
+        for name in registry.patch_sets():
+            print(f"{name}: {registry.manifest[name].get('description', '')}")
+        return 0
+
+    # Change to project root directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+
+    if args.watch:
+        return watch(args, registry)
+
+    tracer = from_args(args, 'apply_plan_patches')
+    try:
+        with tracer.span('fragments', sets=len(args.patch_sets)):
+            batches = [registry.patch_set(name) for name in args.patch_sets]
+        result = (run_streaming if args.stream else run)(args.plan, batches, tracer=tracer)
+    except (KeyError, PatchError) as e:
+        print(f'Error: {e.args[0]}', file=sys.stderr)
+        return 1
+    finally:
+        report(tracer, args)
+
+    for outcome in result.outcomes:
+        if args.verbose or outcome.state == MODIFIED:
+            print(f'  {outcome.batch}: {outcome.unit} ({outcome.state})')
+    if result.changed:
+        applied = sum(outcome.state == APPLIED for outcome in result.outcomes)
+        print(f'Applied {applied} change(s) to {args.plan}'
+              + (' (merged with changes made while it ran)' if result.merged else ''))
+    else:
+        print(f'Nothing to apply, {args.plan} left unchanged')
+    return 0
+
+
+def watch(args, registry):
+    daemon = PatchDaemon(args.plan, args.patch_sets, registry)
+    try:
+        result = daemon.load()
+    except (KeyError, PatchError) as e:
+        print(f'Error: {e.args[0]}', file=sys.stderr)
+        return 1
+    print(f"{'Applied changes to' if result.changed else 'Loaded'} {args.plan}; "
+          f"watching {len(daemon.watched_paths())} files (Ctrl+C to stop)")
+    watcher = make_watcher(daemon.watched_paths(), poll=args.poll)
+    try:
+        daemon.serve(watcher, debounce=args.debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
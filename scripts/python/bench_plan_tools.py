@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark plan parsing and patching over synthetic plans of growing size.
+
+Each size generates a plan with that many frontmatter todos and a deep
+heading tree, then runs the same patch workload through every path:
+
+  legacy  - one str.replace per anchor over the whole file, as the
+            original add_phase2_features.py did
+  engine  - plan_tools.patch: parse once, indexed lookups, one splice
+  stream  - plan_tools.stream: mmap + streamed output
+
+Stage timings (parse, anchor lookup, apply, write) are the best of
+--repeat runs; peak Python heap is measured in a separate traced run.
+The stream path must stay within --stream-budget times the size of the
+inserted fragments (plus a fixed allowance) whatever the plan size, and
+the run fails if it does not. Results are written as JSON tagged with
+the git commit, and --compare reports regressions between two result
+files.
+
+    python scripts/python/bench_plan_tools.py --sizes 100 1000 10000
+    python scripts/python/bench_plan_tools.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from plan_tools.document import parse
+from plan_tools.history import head_commit
+from plan_tools.patch import PatchBatch, resolve_batches, write_atomic
+from plan_tools.stream import run_streaming
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+TODOS_PER_PHASE = 50
+STAGES = ['parse', 'lookup', 'apply', 'write']
+STREAM_SLACK = 256 * 1024      # fixed heap of a streaming run: locks, tracer, regex state
+
+
+def generate_plan(todo_count, depth=3, seed=0):
+    """Return synthetic plan text with `todo_count` todos and a matching section tree."""
+    rng = random.Random(seed)
+    lines = ['---', 'name: Synthetic Plan', f'overview: "Benchmark plan with {todo_count} todos"', 'todos:']
+    for index in range(todo_count):
+        phase, item = divmod(index, TODOS_PER_PHASE)
+        lines += [f'  - id: phase{phase}-item{item}',
+                  f'    content: "Phase {phase}.{item + 1}: Build feature {index} with validation and tests"',
+                  f'    status: {rng.choice(["pending", "pending", "in_progress", "completed"])}']
+    lines += ['isProject: false', '---', '', '# Synthetic Plan', '']
+    for index in range(todo_count):
+        phase, item = divmod(index, TODOS_PER_PHASE)
+        if item == 0:
+            lines += [f'## Phase {phase}: Workstream {phase}', '']
+        lines += [f'### {phase}.{item + 1} Feature {index}', '', '**Features:**', '',
+                  f'- Capability {index}a', f'- Capability {index}b', '']
+        for level in range(4, 4 + depth - 1):
+            lines += ['#' * level + f' Detail {index}.{level}', '', f'Notes for level {level}.', '']
+        if index % 10 == 0:
+            lines += ['```sql', f'CREATE TABLE feature_{index} (id UUID PRIMARY KEY);',
+                      '# not a heading', '```', '']
+    return '\n'.join(lines) + '\n'
+
+
+def workload(todo_count, patches=20, seed=1):
+    """Pick (todo id, section number) anchors spread across the plan."""
+    rng = random.Random(seed)
+    picks = sorted(rng.sample(range(todo_count), min(patches, todo_count)))
+    work = []
+    for number, index in enumerate(picks):
+        phase, item = divmod(index, TODOS_PER_PHASE)
+        todo = (f'  - id: bench-new-{number}\n    content: "Benchmark insert {number}"\n'
+                f'    status: pending\n')
+        section = f'### {phase}.{item + 1}b Inserted {number}\n\nInserted body {number}.\n\n'
+        work.append((f'phase{phase}-item{item}', f'{phase}.{item + 1}', todo, section))
+    return work
+
+
+def fragment_bytes(work):
+    return sum(len((todo + section).encode('utf-8')) for _, _, todo, section in work)
+
+
+def build_batch(work):
+    batch = PatchBatch('bench')
+    for todo_id, section_number, todo, section in work:
+        batch.add_todos(todo, after=todo_id)
+        batch.insert_section(section, after=section_number)
+    return batch
+
+
+def run_legacy(path, work, timings):
+    started = time.perf_counter()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    read_done = time.perf_counter()
+    anchors = []
+    for todo_id, section_number, todo, section in work:
+        # The original scripts anchored on the full literal text around the insert point
+        start = content.index(f'  - id: {todo_id}\n')
+        todo_anchor = content[start:content.index('\n', content.index('    status:', start)) + 1]
+        heading = content.index(f'\n### {section_number} ')
+        following = content.find('\n### ', heading + 1)
+        boundary = content[following:content.index('\n', following + 1)] if following != -1 else None
+        anchors.append((todo_anchor, todo, boundary, section))
+    lookup_done = time.perf_counter()
+    for todo_anchor, todo, boundary, section in anchors:
+        content = content.replace(todo_anchor, todo_anchor + todo)
+        if boundary is None:
+            content = content + '\n' + section
+        else:
+            content = content.replace(boundary, '\n' + section.rstrip('\n') + '\n' + boundary)
+    apply_done = time.perf_counter()
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    finished = time.perf_counter()
+    timings.update(parse=read_done - started, lookup=lookup_done - read_done,
+                   apply=apply_done - lookup_done, write=finished - apply_done)
+
+
+def run_engine(path, work, timings):
+    started = time.perf_counter()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    plan = parse(text)
+    parsed = time.perf_counter()
+    resolution = resolve_batches(plan, [build_batch(work)])
+    resolved = time.perf_counter()
+    content = plan.splice(resolution.edits)
+    applied = time.perf_counter()
+    write_atomic(path, content)
+    finished = time.perf_counter()
+    timings.update(parse=parsed - started, lookup=resolved - parsed,
+                   apply=applied - resolved, write=finished - applied)
+
+
+def run_stream(path, work, timings):
+    # Parsing, lookup and the streamed write are interleaved; report one total
+    started = time.perf_counter()
+    run_streaming(path, [build_batch(work)])
+    timings.update(write=time.perf_counter() - started)
+
+
+PATHS = {'legacy': run_legacy, 'engine': run_engine, 'stream': run_stream}
+
+
+def measure(path_name, source, work, repeat, scratch):
+    runner = PATHS[path_name]
+    target = os.path.join(scratch, f'{path_name}.plan.md')
+    best = {}
+    for _ in range(repeat):
+        shutil.copyfile(source, target)
+        timings = {}
+        runner(target, work, timings)
+        for stage, seconds in timings.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+    shutil.copyfile(source, target)
+    tracemalloc.start()
+    runner(target, work, {})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'path': path_name, 'stages': {stage: round(best.get(stage, 0.0), 6) for stage in STAGES},
+            'total': round(sum(best.values()), 6), 'peak_bytes': peak}
+
+
+def benchmark(sizes, paths, repeat, patches, depth, stream_budget):
+    results = []
+    over_budget = 0
+    with tempfile.TemporaryDirectory(prefix='plan-bench-') as scratch:
+        for size in sizes:
+            source = os.path.join(scratch, 'source.plan.md')
+            with open(source, 'w', encoding='utf-8', newline='') as f:
+                f.write(generate_plan(size, depth=depth))
+            work = workload(size, patches=patches)
+            inserted = fragment_bytes(work)
+            for path_name in paths:
+                result = measure(path_name, source, work, repeat, scratch)
+                result.update(size=size, bytes=os.path.getsize(source), fragment_bytes=inserted)
+                results.append(result)
+                flag = ''
+                if path_name == 'stream' and result['peak_bytes'] > stream_budget * inserted + STREAM_SLACK:
+                    flag = f'  OVER BUDGET ({stream_budget:g}x {inserted / 1e3:.1f} KB of fragments)'
+                    over_budget += 1
+                print(f"{size:>7} todos  {path_name:<7} total {result['total'] * 1000:9.1f} ms  "
+                      f"peak {result['peak_bytes'] / 1e6:8.1f} MB{flag}", file=sys.stderr)
+    return results, over_budget
+
+
+def compare(old_path, new_path, threshold, floor):
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    baseline = {(result['size'], result['path']): result for result in old['results']}
+    regressions = 0
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for result in new['results']:
+        before = baseline.get((result['size'], result['path']))
+        if before is None or not before['total']:
+            continue
+        ratio = result['total'] / before['total']
+        memory = result['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else 1.0
+        flag = ''
+        # Sub-floor timings are mostly noise; only memory can regress there
+        slower = ratio > 1 + threshold and result['total'] >= floor
+        if slower or memory > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{result['size']:>7} {result['path']:<7} time x{ratio:5.2f}  memory x{memory:5.2f}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark plan parsing and patching.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='todo counts to generate')
+    parser.add_argument('--paths', nargs='+', choices=list(PATHS), default=list(PATHS))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size and path (best is kept)')
+    parser.add_argument('--patches', type=int, default=20, help='todo + section inserts per run')
+    parser.add_argument('--depth', type=int, default=3, help='heading levels below each ### section')
+    parser.add_argument('--stream-budget', type=float, default=32,
+                        help='fail if the stream path peaks above this many times the inserted bytes (default 32)')
+    parser.add_argument('-o', '--output', help='result file (default: scripts/python/.cache/bench/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='with --compare, relative slowdown that counts as a regression (default 0.2)')
+    parser.add_argument('--floor-ms', type=float, default=5.0,
+                        help='with --compare, ignore slowdowns of runs faster than this (default 5)')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        try:
+            return compare(*args.compare, args.threshold, args.floor_ms / 1000)
+        except (OSError, ValueError) as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 1
+        except KeyError as e:
+            print(f'Error: not a benchmark result file (no {e.args[0]!r})', file=sys.stderr)
+            return 1
+
+    # Paths given on the command line are relative to where we were run from
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    # Change to project root directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+
+    commit = head_commit()
+    results, over_budget = benchmark(args.sizes, args.paths, args.repeat, args.patches, args.depth,
+                                     args.stream_budget)
+    report = {'meta': {'commit': commit, 'python': platform.python_version(),
+                       'platform': platform.platform(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'repeat': args.repeat, 'patches': args.patches, 'depth': args.depth},
+              'results': results}
+    output = args.output or os.path.join('scripts', 'python', '.cache', 'bench', f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    print(f'Wrote {output}')
+    if over_budget:
+        print(f'FAIL: stream peak memory over budget in {over_budget} run(s)', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
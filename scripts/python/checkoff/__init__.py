@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""Offline-first delta sync of supplier check-offs, with a device simulator."""
+
+from checkoff.client import Replica
+from checkoff.log import EventLog, SyncError
+from checkoff.service import SyncServer, SyncService, UnknownEvent
+from checkoff.simulator import Simulation, SimulationConfig, SimulationReport
+
+__all__ = ['EventLog', 'Replica', 'Simulation', 'SimulationConfig', 'SimulationReport', 'SyncError', 'SyncServer',
+           'SyncService', 'UnknownEvent']
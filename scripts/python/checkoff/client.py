@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""A supplier device's replica of one event, usable offline.
+
+Check-offs are applied locally at once and queued as numbered ops; each
+sync sends the queued ops and the last version seen, and gets back the
+ack (highest op number the server has applied) and the changes since
+that version. Ops stay queued until acked, so a lost response just
+means the same batch goes again, and the server skips what it already
+has. The local view is the server state with queued ops on top.
+"""
+
+import time
+
+from checkoff.log import GUEST_FIELD, SyncError
+
+
+def wall_clock_ms():
+    return int(time.time() * 1000)
+
+
+class Replica:
+    def __init__(self, device_id, clock=wall_clock_ms, batch=500):
+        self.device_id = device_id
+        self.clock = clock
+        self.batch = batch
+        self.version = None         # None until the first snapshot
+        self.guests = []
+        self.cells = {}             # (guest, action, field) -> (value, ts), as the server has it
+        self.outbox = []            # [number, guest, action, field, value, ts] not yet acked
+        self.number = 0
+        self.hlc = 0
+
+    def tick(self):
+        """Next hybrid logical clock time: wall clock ms, but always after anything seen."""
+        self.hlc = max(self.clock(), self.hlc + 1)
+        return self.hlc
+
+    def _queue(self, guest, action, field, value):
+        self.number += 1
+        self.outbox.append([self.number, guest, action, field, value, self.tick()])
+
+    def check_off(self, guest, action, completed=True, notes=None):
+        """Mark (or with completed=False unmark) a guest for an action type, optionally with notes."""
+        if not 0 <= guest < len(self.guests) or self.guests[guest] is None:
+            raise SyncError(f'no guest {guest} on device {self.device_id}')
+        self._queue(guest, action, 'c', int(completed))
+        if notes is not None:
+            self._queue(guest, action, 'n', notes)
+
+    def bulk_check_off(self, guests, action, completed=True):
+        for guest in guests:
+            self.check_off(guest, action, completed)
+
+    def value(self, guest, action, field='c'):
+        for op in reversed(self.outbox):
+            if op[1] == guest and op[2] == action and op[3] == field:
+                return op[4]
+        cell = self.cells.get((guest, action, field))
+        return cell[0] if cell else None
+
+    def completed(self, action):
+        """Indexes of guests checked off for an action type in the local view."""
+        done = {guest for (guest, kind, field), (value, _) in self.cells.items()
+                if kind == action and field == 'c' and value}
+        for _, guest, kind, field, value, _ in self.outbox:
+            if kind == action and field == 'c':
+                (done.add if value else done.discard)(guest)
+        return done
+
+    def request(self):
+        return {'device': self.device_id, 'since': self.version, 'ops': self.outbox[:self.batch]}
+
+    def receive(self, response):
+        """Apply a sync response: drop acked ops, then apply the reset snapshot or the changes."""
+        acked = response.get('ack')
+        if acked is not None:
+            self.outbox = [op for op in self.outbox if op[0] > acked]
+        if 'reset' in response:
+            snapshot = response['reset']
+            self.guests = list(snapshot['guests'])
+            self.cells = {(guest, action, field): (value, ts) for guest, action, field, value, ts in snapshot['cells']}
+            self.version = snapshot['version']
+            latest = max((ts for *_, ts in snapshot['cells']), default=0)
+        else:
+            if response['from'] != self.version:
+                raise SyncError(f"delta from version {response['from']} does not follow {self.version}")
+            latest = 0
+            for guest, action, field, value, ts in response['changes']:
+                if field == GUEST_FIELD:
+                    if guest == len(self.guests):
+                        self.guests.append(value)
+                    else:
+                        self.guests[guest] = value
+                else:
+                    self.cells[guest, action, field] = (value, ts)
+                    latest = max(latest, ts)
+            self.version = response['to']
+        self.hlc = max(self.hlc, latest)
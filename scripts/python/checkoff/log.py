@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Append-only, versioned change log of one event's guest list and check-offs.
+
+Every change that takes effect gets the next version number, so a device
+that has seen version V needs exactly the entries after V. Check-off
+state is a set of cells, one per (guest, action type, field), where the
+field is completed (0/1) or notes. A device writes a cell with its
+hybrid logical clock time; the write with the greatest (time, device id)
+wins whatever order writes reach the server, and losing writes are
+acknowledged but never logged. Devices number their ops, and the server
+keeps the highest number applied per device, so a batch resent after a
+lost response is applied once.
+
+Guests are referred to by their index in the event's guest list, which
+never changes (removed guests leave a hole), so deltas carry small
+integers instead of UUIDs. Entries older than the retained window are
+dropped by compact(); a device further behind gets a snapshot instead.
+With a path, entries are appended to a JSONL file and replayed on open.
+"""
+
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+
+FIELDS = ('c', 'n')             # completed, notes
+GUEST_FIELD = 'g'               # guest list entry (record, or None once removed)
+MAX_NOTES = 2000
+
+
+class SyncError(Exception):
+    pass
+
+
+@dataclass
+class Cell:
+    ts: int
+    device: str
+    value: object
+    version: int
+
+
+class EventLog:
+    def __init__(self, event_id, guests=(), path=None, keep=50000):
+        self.event_id = event_id
+        self.guests = []            # index -> guest record, None once removed
+        self.cells = {}             # (guest, action, field) -> Cell
+        self.entries = []           # (key, value, ts, device) for versions floor+1 ...
+        self.floor = 0              # versions up to here are only in the snapshot
+        self.acked = {}             # device -> highest op number applied
+        self.keep = keep
+        self.path = path
+        self._file = None
+        if path and os.path.exists(path):
+            self._replay(path)
+        if path:
+            self._file = open(path, 'a', encoding='utf-8')
+        if guests and not self.guests:
+            records = []
+            for record in guests:
+                self._append((len(self.guests), None, GUEST_FIELD), record, 0, '', records)
+            self._write(records)
+
+    @property
+    def version(self):
+        return self.floor + len(self.entries)
+
+    # -- writes
+
+    def _append(self, key, value, ts, device, records):
+        self.entries.append((key, value, ts, device))
+        if key[2] == GUEST_FIELD:
+            guest = key[0]
+            if guest == len(self.guests):
+                self.guests.append(value)
+            else:
+                self.guests[guest] = value
+        else:
+            self.cells[key] = Cell(ts, device, value, self.version)
+        records.append({'v': self.version, 'k': list(key), 'x': value, 't': ts, 'd': device})
+
+    def _write(self, records):
+        if self._file is not None and records:
+            self._file.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def add_guest(self, record, ts=0):
+        """Append a guest to the list (organizer side); returns its index."""
+        records = []
+        self._append((len(self.guests), None, GUEST_FIELD), record, ts, '', records)
+        self._write(records)
+        return len(self.guests) - 1
+
+    def update_guest(self, index, record, ts=0):
+        """Replace a guest's record, or remove the guest with record=None."""
+        if not 0 <= index < len(self.guests) or self.guests[index] is None:
+            raise SyncError(f'no guest {index} in event {self.event_id}')
+        records = []
+        self._append((index, None, GUEST_FIELD), record, ts, '', records)
+        self._write(records)
+
+    def push(self, device, ops):
+        """Merge a device's ops [(number, guest, action, field, value, ts)]; returns counts and the ack."""
+        if not isinstance(device, str) or not device:
+            raise SyncError('push without a device id')
+        for op in ops:
+            # Checked before sorting: a malformed op must be a 400, not a TypeError out of sorted()
+            if not isinstance(op, (list, tuple)) or len(op) != 6:
+                raise SyncError(f'malformed op {op!r}')
+            if not isinstance(op[0], int) or isinstance(op[0], bool) or op[0] < 1:
+                raise SyncError(f'op number must be a positive integer, got {op[0]!r}')
+        acked = self.acked.get(device, 0)
+        applied = duplicates = conflicts = 0
+        rejected = []
+        records = []
+        for number, guest, action, field, value, ts in sorted(ops, key=lambda op: op[0]):
+            if number <= acked:
+                duplicates += 1
+                continue
+            acked = number
+            problem = self._check(guest, action, field, value, ts)
+            if problem:
+                rejected.append([number, problem])
+                continue
+            key = (guest, action, field)
+            current = self.cells.get(key)
+            if current is not None and (current.ts, current.device) >= (ts, device):
+                conflicts += 1      # a later write already won
+                continue
+            self._append(key, value, ts, device, records)
+            applied += 1
+        if acked != self.acked.get(device, 0):
+            self.acked[device] = acked
+            records.append({'ack': [device, acked]})
+        self._write(records)
+        if len(self.entries) > 2 * self.keep:
+            self.compact()
+        return {'ack': acked, 'applied': applied, 'duplicates': duplicates, 'conflicts': conflicts,
+                'rejected': rejected}
+
+    def _check(self, guest, action, field, value, ts):
+        if not isinstance(guest, int) or not 0 <= guest < len(self.guests) or self.guests[guest] is None:
+            return 'unknown guest'
+        if not isinstance(action, str) or not action or len(action) > 50:
+            return 'invalid action type'
+        if field not in FIELDS:
+            return 'invalid field'
+        if field == 'c' and value not in (0, 1):
+            return 'completed must be 0 or 1'
+        if field == 'n' and not (value is None or isinstance(value, str) and len(value) <= MAX_NOTES):
+            return 'invalid notes'
+        if not isinstance(ts, int) or ts < 0:
+            return 'invalid timestamp'
+        return None
+
+    # -- reads
+
+    def snapshot(self):
+        return {'event': self.event_id, 'version': self.version, 'guests': self.guests,
+                'cells': [[guest, action, field, cell.value, cell.ts]
+                          for (guest, action, field), cell in self.cells.items()]}
+
+    def pull(self, since):
+        """Changes after version `since`, the latest per cell, or a snapshot when `since` is out of range."""
+        if since is None or since < self.floor or since > self.version:
+            return {'reset': self.snapshot()}
+        latest = {}
+        for key, value, ts, _ in self.entries[since - self.floor:]:
+            # Later versions of a cell replace earlier ones but keep its first position, so a guest
+            # added in this range still comes before check-offs that refer to it
+            latest[key] = (value, ts)
+        return {'from': since, 'to': self.version,
+                'changes': [[guest, action, field, value, ts]
+                            for (guest, action, field), (value, ts) in latest.items()]}
+
+    def entries_between(self, start, end):
+        """Log entries with versions in (start, end] as (version, key, value, ts, device)."""
+        start = max(start, self.floor)
+        return [(self.floor + offset + 1, *entry)
+                for offset, entry in enumerate(self.entries[start - self.floor:end - self.floor], start - self.floor)]
+
+    # -- retention and persistence
+
+    def compact(self, keep=None):
+        """Drop all but the last `keep` entries (devices further behind get a snapshot)."""
+        keep = self.keep if keep is None else keep
+        drop = max(0, len(self.entries) - keep)
+        if not drop:
+            return
+        self.floor += drop
+        del self.entries[:drop]
+        if self.path:
+            self._rewrite()
+
+    def _rewrite(self):
+        state = {'event': self.event_id, 'floor': self.floor, 'guests': self.guests, 'acked': self.acked,
+                 'cells': [[list(key), cell.ts, cell.device, cell.value, cell.version]
+                           for key, cell in self.cells.items()]}
+        lines = [json.dumps({'snapshot': state}, separators=(',', ':'))]
+        for version, key, value, ts, device in self.entries_between(self.floor, self.version):
+            lines.append(json.dumps({'v': version, 'k': list(key), 'x': value, 't': ts, 'd': device},
+                                    separators=(',', ':')))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                        prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _replay(self, path):
+        """Rebuild the log from its file; the entries kept are those after the last snapshot."""
+        intact = 0
+        with open(path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    intact += len(line)
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    if not line.endswith(b'\n'):
+                        break       # torn final write; everything before it is intact
+                    raise SyncError(f'{path}:{number}: unreadable log entry') from None
+                intact += len(line)
+                if 'snapshot' in record:
+                    state = record['snapshot']
+                    self.floor, self.entries = state['floor'], []
+                    self.guests, self.acked = state['guests'], state['acked']
+                    self.cells = {tuple(key): Cell(ts, device, value, version)
+                                  for key, ts, device, value, version in state['cells']}
+                elif 'ack' in record:
+                    device, acked = record['ack']
+                    self.acked[device] = max(acked, self.acked.get(device, 0))
+                else:
+                    if record['v'] != self.version + 1:
+                        raise SyncError(f'{path}:{number}: expected version {self.version + 1}, got {record["v"]}')
+                    self._append(tuple(record['k']), record['x'], record['t'], record['d'], [])
+        if intact < os.path.getsize(path):
+            os.truncate(path, intact)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
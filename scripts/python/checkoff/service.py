@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Sync service for supplier check-off (sections 3.4 and 3.5).
+
+One round trip both pushes a device's queued ops and pulls what changed
+since its last version:
+
+    POST /api/events/<event id>/sync  {"device": ..., "since": 1234, "ops": [[number, guest, action, field, value, ts]]}
+    -> {"ack": 17, "applied": 3, "duplicates": 0, "conflicts": 1, "rejected": [],
+        "from": 1234, "to": 1240, "changes": [[guest, action, field, value, ts]]}   (or "reset": snapshot)
+
+GET /api/events/<event id>/guests returns the whole guest list with each
+guest's check-offs, which is what devices refetch without the log; the
+simulator uses it as the baseline. Bodies are JSON, deflated when the
+request says Content-Encoding / Accept-Encoding: deflate. Logs live in
+memory, or under a directory as one JSONL file per event. Events are
+created by the operator (SyncService.event()); requests only reach events
+that exist, and get a 404 otherwise.
+"""
+
+import asyncio
+import json
+import os
+import re
+import zlib
+from datetime import datetime, timezone
+
+from checkoff.log import EventLog, SyncError
+
+EVENT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+ROUTE_RE = re.compile(r'^/api/events/([^/]+)/(sync|guests)$')
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large'}
+MAX_BODY = 4 * 1024 * 1024
+
+
+class UnknownEvent(SyncError):
+    pass
+
+
+def encode(message, compress=True):
+    data = json.dumps(message, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return zlib.compress(data, 6) if compress else data
+
+
+def decode(data, compressed=True):
+    return json.loads(zlib.decompress(data) if compressed else data)
+
+
+def timestamp(ts):
+    return datetime.fromtimestamp(ts / 1000, timezone.utc).replace(tzinfo=None).isoformat(timespec='milliseconds')
+
+
+class SyncService:
+    def __init__(self, directory=None, keep=50000):
+        self.directory = directory
+        self.keep = keep
+        self.logs = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def log_path(self, event_id):
+        return os.path.join(self.directory, f'{event_id}.jsonl') if self.directory else None
+
+    def event(self, event_id, guests=()):
+        """The event's log, opened (or created with `guests`) on first use."""
+        log = self.logs.get(event_id)
+        if log is None:
+            if not EVENT_ID_RE.match(event_id or ''):
+                raise SyncError(f'invalid event id {event_id!r}')
+            log = self.logs[event_id] = EventLog(event_id, guests, path=self.log_path(event_id), keep=self.keep)
+        return log
+
+    def existing(self, event_id):
+        """The log of an event that is open or has a file under the directory; never creates one."""
+        log = self.logs.get(event_id)
+        if log is not None:
+            return log
+        path = self.log_path(event_id) if EVENT_ID_RE.match(event_id or '') else None
+        if path is None or not os.path.exists(path):
+            raise UnknownEvent(f'unknown event {event_id!r}')
+        return self.event(event_id)
+
+    def sync(self, event_id, request):
+        log = self.existing(event_id)
+        if not isinstance(request, dict):
+            raise SyncError('expected a JSON object')
+        device = request.get('device')
+        if not isinstance(device, str) or not device:
+            raise SyncError('device must be a non-empty string')
+        since = request.get('since')
+        if since is not None and (not isinstance(since, int) or isinstance(since, bool)):
+            raise SyncError('since must be a version number')
+        ops = request.get('ops') or []
+        if not isinstance(ops, list):
+            raise SyncError('ops must be a list')
+        response = log.push(device, ops) if ops else {'ack': log.acked.get(device)}
+        response.update(log.pull(since))
+        return response
+
+    def guest_list(self, event_id):
+        """Every guest with its check-offs, as a full refetch returns them."""
+        log = self.existing(event_id)
+        checkoffs = {}
+        for (guest, action, field), cell in log.cells.items():
+            entry = checkoffs.setdefault(guest, {}).setdefault(action, {'completed': False, 'completed_at': None,
+                                                                        'notes': None})
+            if field == 'c':
+                entry['completed'] = bool(cell.value)
+                entry['completed_at'] = timestamp(cell.ts) if cell.value else None
+            else:
+                entry['notes'] = cell.value
+        return {'event': event_id, 'version': log.version,
+                'guests': [dict(record, checkoffs=checkoffs.get(index, {}))
+                           for index, record in enumerate(log.guests) if record is not None]}
+
+    def close(self):
+        for log in self.logs.values():
+            log.close()
+
+
+class SyncServer:
+    """asyncio HTTP/1.1 front for a SyncService, in the style of the waitlist stand-in."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def respond(self, method, target, body, compressed):
+        match = ROUTE_RE.match(target.split('?', 1)[0].rstrip('/'))
+        if not match:
+            return 404, {'error': 'Not found'}
+        event_id, route = match.groups()
+        if (route, method) not in (('sync', 'POST'), ('guests', 'GET')):
+            return 405, {'error': 'Method not allowed'}
+        try:
+            if route == 'guests':
+                return 200, self.service.guest_list(event_id)
+            try:
+                request = decode(body, compressed)
+            except (ValueError, zlib.error):
+                return 400, {'error': 'Malformed request body'}
+            return 200, self.service.sync(event_id, request)
+        except UnknownEvent as e:
+            return 404, {'error': str(e)}
+        except SyncError as e:
+            return 400, {'error': str(e)}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split(None, 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                deflate = 'deflate' in headers.get('accept-encoding', '')
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': 'Request body too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection != 'close' and (version.strip() != 'HTTP/1.0' or connection == 'keep-alive')
+                    status, payload = self.respond(method, target, body,
+                                                   headers.get('content-encoding', '') == 'deflate')
+                data = encode(payload, compress=deflate)
+                writer.write((f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n'
+                              + ('Content-Encoding: deflate\r\n' if deflate else '')
+                              + f'Content-Length: {len(data)}\r\n'
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('ascii') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=3100, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if ready:
+            ready(server)
+        async with server:
+            await server.serve_forever()
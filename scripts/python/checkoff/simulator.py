@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""Discrete-event simulation of many supplier devices syncing one event.
+
+Devices check guests off at random (a share of them on a small set of
+VIPs, so devices with the same action type collide), some lose
+connectivity for minutes and queue their check-offs, responses are lost
+now and then (so batches are resent), device clocks are skewed, and the
+organizer edits the guest list during the run. The server side is the
+real EventLog and SyncService, timed with the CPU clock; the network is
+a round-trip time plus per-device bandwidth. Mode "delta" syncs through
+the change log; mode "refetch" pushes check-offs the same way but
+downloads the whole guest list whenever the version changed, as the
+plan's sections 3.4/3.5 assume.
+
+At the end every device syncs until idle, and the run checks that all
+replicas equal the server and that replaying the accepted ops in a
+different interleaving gives the same state.
+"""
+
+import heapq
+import math
+import random
+import time
+import uuid
+from array import array
+from dataclasses import dataclass, field
+
+from checkoff.client import Replica
+from checkoff.log import EventLog
+from checkoff.service import SyncService, encode
+
+EVENT_ID = 'simulated-event'
+FIRST_NAMES = ('Ana', 'Ben', 'Chloe', 'Dev', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam')
+LAST_NAMES = ('Okafor', 'Schmidt', 'Tanaka', 'Rossi', 'Nguyen', 'Silva', 'Kowalski', 'Haddad', 'Murphy', 'Lund')
+COMPANIES = ('Acme Corp', 'Globex', 'Initech', 'Umbrella Events', 'Stark Industries', 'Wayne Enterprises', None)
+MODES = ('delta', 'refetch')
+
+
+@dataclass
+class SimulationConfig:
+    guests: int = 10000
+    devices: int = 200
+    duration: float = 600.0             # simulated seconds of check-offs
+    checkoffs: float = 2.0              # per device per minute
+    interval: float = 10.0              # seconds between syncs while online
+    hot_share: float = 0.2              # check-offs on the VIP set, where devices collide
+    hot_guests: int = 50
+    offline_share: float = 0.25         # devices that drop offline once
+    offline: tuple = (60.0, 240.0)      # offline period bounds, seconds
+    loss: float = 0.02                  # responses lost in transit
+    rtt: float = 0.08                   # seconds
+    bandwidth: float = 5e6              # bits per second per device
+    skew: float = 2.0                   # device clock skew bound, seconds
+    guest_updates: int = 20             # organizer edits during the run
+    actions: tuple = ('photographed', 'greeted', 'videoed')
+    compress: bool = True
+    seed: int = 0
+
+
+@dataclass
+class SimulationReport:
+    mode: str
+    devices: int
+    requests: int = 0
+    bytes_up: int = 0
+    bytes_down: int = 0
+    initial_bytes: int = 0              # first full load per device, included in bytes_down
+    peak_egress: float = 0.0            # bytes per second in the busiest second after the initial loads
+    server_seconds: float = 0.0
+    created: int = 0
+    applied: int = 0
+    duplicates: int = 0
+    conflicts: int = 0
+    rejected: int = 0
+    round_trips: array = field(default_factory=lambda: array('d'))
+    upload_delays: array = field(default_factory=lambda: array('d'))    # check-off -> accepted by the server
+    propagation: array = field(default_factory=lambda: array('d'))      # check-off -> visible on another device
+    converged: bool = False
+    order_independent: bool = False
+    drained_at: float = 0.0
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(share * len(ordered)) - 1))]
+
+
+def synthetic_guest(rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)), 'first_name': first, 'last_name': last,
+            'email': f'{first.lower()}.{last.lower()}{rng.randrange(10000)}@example.com',
+            'company': rng.choice(COMPANIES), 'importance_score': round(rng.uniform(0, 100), 2),
+            'rsvp_status': 'confirmed'}
+
+
+class Device:
+    def __init__(self, number, replica, action, offline):
+        self.number = number
+        self.replica = replica
+        self.action = action
+        self.offline = offline          # (start, end) or None
+        self.pending = None             # request in flight: (sent at, request, bytes up)
+        self.initial = True
+
+    def online(self, now):
+        return self.offline is None or not self.offline[0] <= now < self.offline[1]
+
+
+class Simulation:
+    def __init__(self, config, mode):
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {MODES}')
+        self.config = config
+        self.mode = mode
+        self.rng = random.Random(config.seed)
+        self.now = 0.0
+        self.queue = []
+        self.counter = 0
+        self.report = SimulationReport(mode, config.devices)
+        self.service = SyncService()
+        self.initial_guests = [synthetic_guest(self.rng) for _ in range(config.guests)]
+        self.log = self.service.event(EVENT_ID, self.initial_guests)
+        # Who made each version and when, for propagation latency
+        self.origin = [''] * (self.log.version + 1)
+        self.made = array('d', [0.0]) * (self.log.version + 1)
+        self.stamps = {}                # (device, ts) -> when the check-off was made
+        self.accepted = []              # (device, op) pushed and not duplicates, for the replay check
+        self.organizer = []             # (index, record) guest list edits, in order
+        self.egress = {}                # whole second -> bytes sent by the server, initial loads aside
+        self.full_list = {}             # whole second -> (encoded size, server seconds), refetch mode
+        self.devices = []
+        for number in range(config.devices):
+            skew = self.rng.uniform(-config.skew, config.skew)
+            replica = Replica(f'device-{number:04d}', clock=lambda skew=skew: max(0, int((self.now + skew) * 1000)))
+            offline = None
+            if self.rng.random() < config.offline_share:
+                start = self.rng.uniform(0.1, 0.7) * config.duration
+                offline = (start, start + self.rng.uniform(*config.offline))
+            self.devices.append(Device(number, replica, config.actions[number % len(config.actions)], offline))
+
+    def schedule(self, at, kind, target=None):
+        self.counter += 1
+        heapq.heappush(self.queue, (at, self.counter, kind, target))
+
+    def transfer(self, size):
+        return size * 8 / self.config.bandwidth
+
+    # -- device side
+
+    def check_off(self, device):
+        replica = device.replica
+        if replica.version is not None:
+            rng = self.rng
+            if rng.random() < self.config.hot_share:
+                guest = rng.randrange(min(self.config.hot_guests, len(replica.guests)))
+            else:
+                guest = rng.randrange(len(replica.guests))
+            if replica.guests[guest] is not None:
+                roll = rng.random()
+                before = replica.number
+                replica.check_off(guest, device.action, completed=roll >= 0.1,
+                                  notes=f'note {rng.randrange(1000)}' if roll > 0.95 else None)
+                for op in replica.outbox[len(replica.outbox) - (replica.number - before):]:
+                    self.stamps[replica.device_id, op[5]] = self.now
+                self.report.created += replica.number - before
+        self.schedule(self.now + self.rng.expovariate(self.config.checkoffs / 60), 'checkoff', device)
+
+    def send(self, device):
+        if not device.online(self.now):
+            self.schedule(device.offline[1], 'sync', device)
+            return
+        request = device.replica.request()
+        size = len(encode(request, self.config.compress))
+        device.pending = (self.now, request, size)
+        self.report.requests += 1
+        self.report.bytes_up += size
+        self.schedule(self.now + self.config.rtt / 2 + self.transfer(size), 'server', device)
+
+    def deliver(self, device, response):
+        sent, request, _ = device.pending
+        device.pending = None
+        replica = device.replica
+        self.report.round_trips.append(self.now - sent)
+        if response is not None:
+            before = replica.version
+            replica.receive(response)
+            if before is not None:
+                me = replica.device_id
+                for version in range(before + 1, replica.version + 1):
+                    if self.origin[version] != me:
+                        self.report.propagation.append(self.now - self.made[version])
+        self.schedule(self.now + self.config.interval * self.rng.uniform(0.8, 1.2), 'sync', device)
+
+    # -- server side
+
+    def serve(self, device):
+        _, request, _ = device.pending
+        replica = device.replica
+        started = time.perf_counter()
+        before, acked = self.log.version, self.log.acked.get(replica.device_id, 0)
+        if self.mode == 'delta':
+            response = self.service.sync(EVENT_ID, request)
+            body = encode(response, self.config.compress)
+            elapsed = time.perf_counter() - started
+            size = len(body)
+        else:
+            response = self.log.push(replica.device_id, request['ops']) if request['ops'] else {}
+            size = len(encode(response, self.config.compress))
+            elapsed = time.perf_counter() - started
+            if replica.version != self.log.version or device.initial:
+                second = int(self.now)
+                if second not in self.full_list:
+                    # The list is re-encoded at most once per simulated second; its size barely moves
+                    started = time.perf_counter()
+                    encoded = len(encode(self.service.guest_list(EVENT_ID), self.config.compress))
+                    self.full_list[second] = (encoded, time.perf_counter() - started)
+                encoded, listing = self.full_list[second]
+                size += encoded
+                elapsed += listing
+                response = dict(response, reset=self.log.snapshot())
+            else:
+                response = dict(response, **{'from': replica.version, 'to': replica.version, 'changes': []})
+        self.account(device, request, response, before, acked)
+        self.report.server_seconds += elapsed
+        self.report.bytes_down += size
+        send_time = self.transfer(size)
+        if device.initial:
+            self.report.initial_bytes += size
+            device.initial = False
+        else:
+            for offset in range(int(send_time) + 1):
+                second = int(self.now) + offset
+                self.egress[second] = self.egress.get(second, 0) + size / max(1.0, send_time)
+        lost = self.rng.random() < self.config.loss
+        self.schedule(self.now + elapsed + send_time + self.config.rtt / 2, 'deliver',
+                      (device, None if lost else response))
+
+    def account(self, device, request, response, before, acked):
+        for key in ('applied', 'duplicates', 'conflicts'):
+            setattr(self.report, key, getattr(self.report, key) + response.get(key, 0))
+        self.report.rejected += len(response.get('rejected', ()))
+        me = device.replica.device_id
+        self.accepted.extend((me, op) for op in request['ops'] if op[0] > acked)
+        for version, _, _, ts, origin in self.log.entries_between(before, self.log.version):
+            made = self.stamps.get((origin, ts), self.now)
+            self.origin.append(origin)
+            self.made.append(made)
+            self.report.upload_delays.append(self.now - made)
+
+    def edit_guests(self):
+        rng = self.rng
+        before = self.log.version
+        ts = int(self.now * 1000)
+        if rng.random() < 0.5:
+            record = synthetic_guest(rng)
+            index = self.log.add_guest(record, ts)
+        else:
+            index = rng.randrange(len(self.log.guests))
+            record = dict(self.log.guests[index], company=rng.choice(COMPANIES))
+            self.log.update_guest(index, record, ts)
+        self.organizer.append((index, record))
+        for _ in range(self.log.version - before):
+            self.origin.append('organizer')
+            self.made.append(self.now)
+
+    # -- run
+
+    def settled(self):
+        return all(not device.replica.outbox and device.replica.version == self.log.version
+                   for device in self.devices)
+
+    def run(self):
+        config = self.config
+        for device in self.devices:
+            self.schedule(self.rng.uniform(0, config.interval), 'sync', device)
+            self.schedule(self.rng.expovariate(config.checkoffs / 60), 'checkoff', device)
+        for _ in range(config.guest_updates):
+            self.schedule(self.rng.uniform(0, config.duration), 'organizer')
+        deadline = config.duration + 3600
+        while self.queue:
+            self.now, _, kind, target = heapq.heappop(self.queue)
+            if self.now > deadline:
+                break
+            if kind == 'checkoff':
+                if self.now < config.duration:
+                    self.check_off(target)
+            elif kind == 'sync':
+                self.send(target)
+            elif kind == 'server':
+                self.serve(target)
+            elif kind == 'deliver':
+                self.deliver(*target)
+                if self.now >= config.duration and self.settled():
+                    break
+            elif kind == 'organizer':
+                self.edit_guests()
+        self.report.drained_at = self.now
+        self.report.peak_egress = max(self.egress.values(), default=0.0)
+        self.report.converged = self.settled() and all(self.matches(device.replica) for device in self.devices)
+        self.report.order_independent = self.replay_matches()
+        return self.report
+
+    def matches(self, replica):
+        return replica.guests == self.log.guests and replica.cells == {
+            key: (cell.value, cell.ts) for key, cell in self.log.cells.items()}
+
+    def replay_matches(self):
+        """Apply the accepted ops again with devices interleaved differently: the state must not change."""
+        rng = random.Random(self.config.seed + 1)
+        replay = EventLog('replay', self.initial_guests)
+        for index, record in self.organizer:
+            if index == len(replay.guests):
+                replay.add_guest(record)
+            else:
+                replay.update_guest(index, record)
+        streams = {}
+        for device_id, op in self.accepted:
+            streams.setdefault(device_id, []).append(op)
+        # Each device's ops stay in order (a device sends them that way); devices interleave at random
+        pending = [(device_id, list(reversed(ops))) for device_id, ops in streams.items()]
+        while pending:
+            slot = rng.randrange(len(pending))
+            device_id, ops = pending[slot]
+            replay.push(device_id, [ops.pop()])
+            if not ops:
+                pending[slot] = pending[-1]
+                pending.pop()
+        return replay.guests == self.log.guests and {key: (cell.ts, cell.device, cell.value)
+                                                     for key, cell in replay.cells.items()} == {
+            key: (cell.ts, cell.device, cell.value) for key, cell in self.log.cells.items()}
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Offline-first check-off sync for suppliers (sections 3.4 and 3.5).
+
+    python scripts/python/checkoff_sync.py simulate --devices 300 --guests 10000 --duration 600
+    python scripts/python/checkoff_sync.py simulate --mode delta --offline-share 0.5 --loss 0.05 -o report.json
+    python scripts/python/checkoff_sync.py serve --directory sync-logs --event gala-2026 --guests guests.csv
+
+`simulate` replays many devices against the sync service in simulated
+time, once syncing deltas from the per-event change log and once
+refetching the full guest list as the plan has it, and compares bytes
+transferred, peak server egress and how long a check-off takes to reach
+the other devices. It fails if any replica ends up different from the
+server or if conflict resolution depends on the order ops arrive in.
+`serve` runs the sync endpoints over HTTP (logs kept under --directory,
+or in memory), optionally seeding an event from a guests CSV export.
+Only the --event and events already logged under --directory are served;
+requests for any other event get a 404.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+
+from checkoff.log import SyncError
+from checkoff.service import SyncServer, SyncService
+from checkoff.simulator import MODES, Simulation, SimulationConfig, percentile
+
+
+def summarize(report):
+    return {
+        'requests': report.requests,
+        'bytes_up': report.bytes_up,
+        'bytes_down': report.bytes_down,
+        'initial_bytes': report.initial_bytes,
+        'steady_bytes_per_device': round((report.bytes_down - report.initial_bytes) / max(1, report.devices)),
+        'peak_egress_bytes_per_s': round(report.peak_egress),
+        'server_seconds': round(report.server_seconds, 3),
+        'ops': {'created': report.created, 'applied': report.applied, 'duplicates': report.duplicates,
+                'conflicts': report.conflicts, 'rejected': report.rejected},
+        'round_trip_ms': {f'p{p}': round(percentile(report.round_trips, p / 100) * 1000, 1) for p in (50, 95, 99)},
+        'upload_delay_s': {f'p{p}': round(percentile(report.upload_delays, p / 100), 2) for p in (50, 95, 99)},
+        'propagation_s': {f'p{p}': round(percentile(report.propagation, p / 100), 2) for p in (50, 95, 99)},
+        'converged': report.converged,
+        'order_independent': report.order_independent,
+        'drained_at_s': round(report.drained_at, 1),
+    }
+
+
+def megabytes(count):
+    return f'{count / 1024 / 1024:.1f} MB'
+
+
+def simulate(args):
+    config = SimulationConfig(guests=args.guests, devices=args.devices, duration=args.duration,
+                              checkoffs=args.checkoffs, interval=args.interval, hot_share=args.hot_share,
+                              offline_share=args.offline_share, loss=args.loss, rtt=args.rtt / 1000,
+                              bandwidth=args.bandwidth * 1e6, guest_updates=args.guest_updates,
+                              compress=not args.no_compress, seed=args.seed)
+    modes = MODES if args.mode == 'both' else (args.mode,)
+    results = {}
+    for mode in modes:
+        started = time.perf_counter()
+        results[mode] = summarize(Simulation(config, mode).run())
+        print(f'{mode}: simulated in {time.perf_counter() - started:.1f} s', file=sys.stderr)
+
+    rows = [('requests', lambda r: str(r['requests'])),
+            ('downloaded', lambda r: megabytes(r['bytes_down'])),
+            ('  of which initial load', lambda r: megabytes(r['initial_bytes'])),
+            ('uploaded', lambda r: megabytes(r['bytes_up'])),
+            ('after load, per device', lambda r: f"{r['steady_bytes_per_device'] / 1024:.1f} KB"),
+            ('peak egress after load', lambda r: f"{megabytes(r['peak_egress_bytes_per_s'])}/s"),
+            ('server CPU', lambda r: f"{r['server_seconds']:.2f} s"),
+            ('round trip p50 / p95', lambda r: f"{r['round_trip_ms']['p50']:.0f} / {r['round_trip_ms']['p95']:.0f} ms"),
+            ('upload delay p50 / p95', lambda r: f"{r['upload_delay_s']['p50']} / {r['upload_delay_s']['p95']} s"),
+            ('propagation p50 / p95 / p99',
+             lambda r: ' / '.join(str(r['propagation_s'][p]) for p in ('p50', 'p95', 'p99')) + ' s'),
+            ('ops applied / dup / conflict', lambda r: '{applied} / {duplicates} / {conflicts}'.format(**r['ops'])),
+            ('converged, order-independent', lambda r: f"{r['converged']}, {r['order_independent']}")]
+    print(f"{config.devices} devices, {config.guests} guests, {config.duration:.0f} s, "
+          f"{config.checkoffs:g} check-offs/device/min, sync every {config.interval:g} s")
+    print(f"{'':<30}" + ''.join(f'{mode:>28}' for mode in modes))
+    for label, cell in rows:
+        print(f'{label:<30}' + ''.join(f'{cell(results[mode]):>28}' for mode in modes))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(config), 'results': results}, f, indent=2, default=list)
+    failures = [f'{mode}: replicas did not converge' for mode, result in results.items() if not result['converged']]
+    failures += [f'{mode}: state depends on op order' for mode, result in results.items()
+                 if not result['order_independent']]
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+def serve(args):
+    service = SyncService(args.directory)
+    if args.event:
+        guests = ()
+        if args.guests:
+            with open(args.guests, 'r', encoding='utf-8-sig', newline='') as f:
+                guests = [{(key or '').strip().lower(): value for key, value in row.items()}
+                          for row in csv.DictReader(f)]
+        log = service.event(args.event, guests)
+        print(f'Event {args.event}: {sum(1 for guest in log.guests if guest is not None)} guests, '
+              f'version {log.version}', file=sys.stderr)
+    server = SyncServer(service)
+
+    def ready(listener):
+        address = listener.sockets[0].getsockname()
+        print(f"Check-off sync on http://{address[0]}:{address[1]}/api/events/<event id>/sync "
+              f"({args.directory or 'memory'}, Ctrl+C to stop)", file=sys.stderr)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready=ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline-first delta sync for supplier check-off.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('simulate', help='replay many devices and compare delta sync with full refetches')
+    run.add_argument('--mode', choices=MODES + ('both',), default='both', help='sync strategy (default both)')
+    run.add_argument('--devices', type=int, default=200, help='supplier devices (default 200)')
+    run.add_argument('--guests', type=int, default=10000, help='guests on the list (default 10000)')
+    run.add_argument('--duration', type=float, default=600, help='simulated seconds of check-offs (default 600)')
+    run.add_argument('--checkoffs', type=float, default=2, help='check-offs per device per minute (default 2)')
+    run.add_argument('--interval', type=float, default=10, help='seconds between syncs (default 10)')
+    run.add_argument('--hot-share', type=float, default=0.2,
+                     help='share of check-offs on 50 VIPs, where devices conflict (default 0.2)')
+    run.add_argument('--offline-share', type=float, default=0.25,
+                     help='share of devices offline for 1-4 minutes (default 0.25)')
+    run.add_argument('--loss', type=float, default=0.02, help='share of responses lost (default 0.02)')
+    run.add_argument('--rtt', type=float, default=80, help='network round trip in ms (default 80)')
+    run.add_argument('--bandwidth', type=float, default=5, help='per-device Mbit/s (default 5)')
+    run.add_argument('--guest-updates', type=int, default=20, help='organizer guest list edits (default 20)')
+    run.add_argument('--no-compress', action='store_true', help='count bytes without deflate')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('-o', '--output', help='write the JSON report here')
+
+    stand_in = commands.add_parser('serve', help='run the sync endpoints over HTTP')
+    stand_in.add_argument('--host', default='127.0.0.1')
+    stand_in.add_argument('--port', type=int, default=3100)
+    stand_in.add_argument('--directory', help='keep one JSONL change log per event here (default: memory)')
+    stand_in.add_argument('--event', help='event id to open (or create) at startup')
+    stand_in.add_argument('--guests', help='CSV export of guests to seed a new --event with')
+    args = parser.parse_args(argv)
+
+    handlers = {'simulate': simulate, 'serve': serve}
+    try:
+        return handlers[args.command](args)
+    except (SyncError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
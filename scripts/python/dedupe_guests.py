@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Find duplicate guests in a CSV export and write duplicate_detections rows.
+
+    python scripts/python/dedupe_guests.py guests.csv -o duplicates.csv
+    python scripts/python/dedupe_guests.py guests.csv --organization <uuid> --min-confidence 80
+
+The output columns match the duplicate_detections table, so the file can
+be loaded with COPY duplicate_detections (organization_id, guest_id_1,
+guest_id_2, match_confidence, match_reason, status) FROM ... CSV HEADER.
+"""
+
+import argparse
+import csv
+import sys
+import time
+
+from guests.dedup import Deduplicator, Detection
+from guests.records import read_guests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect duplicate guests with blocking keys.')
+    parser.add_argument('input', help='guest CSV (id, first/last name, email, company, phone, ...)')
+    parser.add_argument('-o', '--output', help='output CSV (default: stdout)')
+    parser.add_argument('--organization', default='',
+                        help='organization_id for rows whose file has no organization column')
+    parser.add_argument('--window', type=int, default=5, help='sorted-neighbourhood window (default 5)')
+    parser.add_argument('--name-threshold', type=float, default=0.85,
+                        help='minimum name similarity for fuzzy matches (default 0.85)')
+    parser.add_argument('--min-confidence', type=float, default=70.0,
+                        help='drop matches below this confidence (default 70)')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    guests = list(read_guests(args.input, organization_id=args.organization))
+    loaded = time.perf_counter()
+    deduplicator = Deduplicator(window=args.window, name_threshold=args.name_threshold,
+                                min_confidence=args.min_confidence)
+    detections = deduplicator.detect(guests)
+    finished = time.perf_counter()
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(Detection.COLUMNS)
+        writer.writerows(detection.row() for detection in detections)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f'{len(detections)} duplicate pair(s) among {len(guests)} guests '
+          f'(read {loaded - started:.2f} s, matched {finished - loaded:.2f} s)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Export guest lists to CSV, Excel (.xlsx) or PDF.
+
+    python scripts/python/export_guests.py --dsn postgresql://... --event <uuid> -o guests.xlsx
+    python scripts/python/export_guests.py --dsn ... --event <uuid> --event <uuid> --out-dir exports/ --format pdf
+    python scripts/python/export_guests.py --source guests.csv --fields first_name,last_name,email -o guests.pdf
+    python scripts/python/export_guests.py --dsn ... --organization <uuid> --tag VIP -o vips.csv
+
+Rows are streamed from a server-side cursor (or the --source file)
+straight into the writer, so memory does not grow with the guest count.
+With several events (or source files), each gets its own file in
+--out-dir and the exports run in parallel, one per worker process.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from guests.export import (DEFAULT_FIELDS, EVENT_FIELDS, FIELDS, FORMATS, ExportError, ExportFilter, ExportJob,
+                           export_all)
+from guests.importer import GuestImportError
+
+
+def split_list(values):
+    return tuple(item.strip() for value in values or () for item in value.split(',') if item.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream guest lists into CSV, XLSX or PDF files.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dsn', help='PostgreSQL connection string')
+    source.add_argument('--source', action='append', help='export a guest CSV/TSV/XLSX file instead (repeatable)')
+    parser.add_argument('--event', action='append', help='event id (repeatable; one file per event)')
+    parser.add_argument('--organization', help='only guests of this organization')
+    parser.add_argument('--format', choices=FORMATS, help='output format (default: from the -o extension, else csv)')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('-o', '--output', help='output file for a single export')
+    output.add_argument('--out-dir', help='directory for one file per event or source')
+    parser.add_argument('--fields', action='append',
+                        help=f"comma-separated fields (default {','.join(DEFAULT_FIELDS)}; "
+                             f"available {','.join(FIELDS)})")
+    parser.add_argument('--status', action='append', help='only these RSVP statuses (comma-separated)')
+    parser.add_argument('--check-in', action='append', help='only these check-in statuses (comma-separated)')
+    parser.add_argument('--min-importance', type=float, help='only guests scoring at least this')
+    parser.add_argument('--tag', action='append', help='only guests with all of these tags (comma-separated)')
+    parser.add_argument('--title', default='', help='report title for PDF exports')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size for bulk exports')
+    args = parser.parse_args(argv)
+
+    inputs = args.source or args.event or [None]
+    if args.output and len(inputs) > 1:
+        parser.error('several events or sources need --out-dir')
+    format = args.format
+    if format is None:
+        extension = os.path.splitext(args.output or '')[1].lstrip('.').lower()
+        format = extension if extension in FORMATS else 'csv'
+    fields = split_list(args.fields) or tuple(name for name in DEFAULT_FIELDS
+                                              if args.event or args.source or name not in EVENT_FIELDS)
+    filters = ExportFilter(statuses=split_list(args.status), check_in=split_list(args.check_in),
+                           min_importance=args.min_importance, tags=split_list(args.tag))
+
+    jobs = []
+    for item in inputs:
+        if args.output:
+            output = args.output
+        else:
+            name = os.path.splitext(os.path.basename(item))[0] if args.source else item or 'guests'
+            output = os.path.join(args.out_dir, f'{name}.{format}')
+        jobs.append(ExportJob(output=output, format=format, fields=fields, filters=filters, dsn=args.dsn,
+                              organization_id=args.organization, event_id=None if args.source else item,
+                              source=item if args.source else None, title=args.title))
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    summary = []
+    try:
+        for stats in export_all(jobs, workers=args.workers):
+            summary.append({'output': stats.output, 'rows': stats.rows, 'rsvp': dict(stats.statuses),
+                            'seconds': round(stats.seconds, 2)})
+    except (ExportError, GuestImportError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Maintain and query cross-event guest history rollups (section 2.12).
+
+    python scripts/python/guest_rollups.py rebuild event_guests.csv -o rollups.bin
+    python scripts/python/guest_rollups.py apply rollups.bin changes.jsonl
+    python scripts/python/guest_rollups.py guest rollups.bin <guest uuid>
+    python scripts/python/guest_rollups.py org rollups.bin <organization uuid> --top 10
+    python scripts/python/guest_rollups.py bench --rows 500000
+
+`rebuild` reads a full export (backfill), e.g. COPY (SELECT eg.event_id,
+eg.guest_id, e.organization_id, eg.rsvp_status, eg.check_in_status,
+eg.importance_score, e.date AS event_date FROM event_guests eg JOIN
+events e ON e.id = eg.event_id) TO STDOUT WITH CSV HEADER. `apply` folds
+change records, one JSON object per line with "op" ("upsert" or
+"delete") and the same columns, such as a trigger or outbox would emit.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from guests.rollups import COUNTS, GuestRollups, RollupError
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            yield {(key or '').strip().lower(): value for key, value in row.items()}
+
+
+def read_changes(path):
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise RollupError(f'{path}:{number}: {e}') from None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def rebuild(args):
+    started = time.perf_counter()
+    rollups = GuestRollups.rebuild(read_rows(args.input))
+    rollups.save(args.output)
+    print(f'{len(rollups.guests)} guests, {len(rollups.events)} events, {len(rollups.organizations)} '
+          f'organizations -> {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB) '
+          f'in {time.perf_counter() - started:.2f} s', file=sys.stderr)
+    return 0
+
+
+def apply(args):
+    rollups = GuestRollups.load(args.rollups)
+    started = time.perf_counter()
+    applied = sum(1 for change in read_changes(args.changes) if rollups.apply(change))
+    rollups.save(args.rollups)
+    print(f'Applied {applied} change(s) in {time.perf_counter() - started:.2f} s', file=sys.stderr)
+    return 0
+
+
+def show(args):
+    rollups = GuestRollups.load(args.rollups)
+    if args.command == 'guest':
+        summary = rollups.guest(args.id)
+    else:
+        summary = rollups.organization(args.id)
+        if summary is not None and args.top:
+            summary['top_guests'] = rollups.top_guests(args.id, args.top, by=args.by)
+    if summary is None:
+        print(f'Error: no history for {args.id}', file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+def synthetic_rows(count, seed):
+    rng = random.Random(seed)
+    organizations = [f'org-{number}' for number in range(max(1, count // 100000))]
+    events = [(f'event-{number}', rng.choice(organizations), date(2023, 1, 1) + timedelta(days=rng.randrange(1000)))
+              for number in range(max(10, count // 200))]
+    by_org = {}
+    for event in events:
+        by_org.setdefault(event[1], []).append(event)
+    guests = [(f'guest-{number}', rng.choice(organizations)) for number in range(max(1, count // 6))]
+    rows = {}
+    while len(rows) < count:
+        guest_id, organization_id = rng.choice(guests)
+        event_id, _, day = rng.choice(by_org.get(organization_id) or events)
+        rows[guest_id, event_id] = {
+            'event_id': event_id, 'guest_id': guest_id, 'organization_id': organization_id,
+            'rsvp_status': rng.choice(('pending', 'confirmed', 'confirmed', 'declined', 'maybe')),
+            'check_in_status': 'checked_in' if rng.random() < 0.45 else 'not_checked_in',
+            'importance_score': f'{rng.uniform(0, 100):.2f}' if rng.random() < 0.8 else None,
+            'event_date': day.isoformat()}
+    return list(rows.values())
+
+
+def bench(args):
+    rng = random.Random(args.seed)
+    rows = synthetic_rows(args.rows, args.seed)
+    started = time.perf_counter()
+    rollups = GuestRollups.rebuild(rows)
+    built = time.perf_counter() - started
+    print(f'{len(rows)} rows, {len(rollups.guests)} guests: rebuild {built:.2f} s '
+          f'({len(rows) / built:,.0f} rows/s)')
+
+    changes = []
+    for _ in range(args.changes):
+        row = dict(rng.choice(rows))
+        if rng.random() < 0.1:
+            changes.append({'op': 'delete', 'event_id': row['event_id'], 'guest_id': row['guest_id']})
+        else:
+            row['check_in_status'] = rng.choice(('checked_in', 'not_checked_in'))
+            row['rsvp_status'] = rng.choice(('confirmed', 'declined'))
+            changes.append(row)
+    started = time.perf_counter()
+    for change in changes:
+        rollups.apply(change)
+    folded = time.perf_counter() - started
+    print(f'{len(changes)} changes folded: {folded / max(1, len(changes)) * 1e6:.1f} us each')
+
+    # The final state, to check the incremental result and to time queries without rollups
+    final = {(row['guest_id'], row['event_id']): row for row in rows}
+    for change in changes:
+        key = (change['guest_id'], change['event_id'])
+        if change.get('op') == 'delete':
+            final.pop(key, None)
+        else:
+            final[key] = change
+    fresh = GuestRollups.rebuild(final.values())
+    sample = rng.sample(rollups.guests.ids, min(args.queries, len(rollups.guests)))
+    if any(rollups.guest(guest_id) != fresh.guest(guest_id) for guest_id in sample):
+        print('MISMATCH between incremental rollups and a rebuild', file=sys.stderr)
+        return 1
+
+    lookups = []
+    for guest_id in sample:
+        started = time.perf_counter()
+        rollups.guest(guest_id)
+        lookups.append(time.perf_counter() - started)
+    scans = []
+    remaining = list(final.values())
+    for guest_id in sample[:max(1, len(sample) // 50)]:
+        started = time.perf_counter()
+        GuestRollups.rebuild(row for row in remaining if row['guest_id'] == guest_id).guest(guest_id)
+        scans.append(time.perf_counter() - started)
+    print(f'guest summary: rollup {statistics.median(lookups) * 1e6:.1f} us, '
+          f'scanning all rows {statistics.median(scans) * 1000:.1f} ms (median)')
+
+    path = os.path.join(args.directory, 'bench-rollups.bin')
+    os.makedirs(args.directory, exist_ok=True)
+    started = time.perf_counter()
+    rollups.save(path)
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    GuestRollups.load(path)
+    loaded = time.perf_counter() - started
+    print(f'snapshot {os.path.getsize(path) / 1024 / 1024:.1f} MB: save {saved:.2f} s, load {loaded:.2f} s')
+    os.unlink(path)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cross-event guest history rollups.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    full = commands.add_parser('rebuild', help='build rollups from a full event_guests export')
+    full.add_argument('input', help='CSV: event_id, guest_id, organization_id, rsvp_status, check_in_status, '
+                                    'importance_score, event_date')
+    full.add_argument('-o', '--output', required=True, help='rollup snapshot to write')
+
+    fold = commands.add_parser('apply', help='fold JSONL change records into a snapshot')
+    fold.add_argument('rollups')
+    fold.add_argument('changes', help="JSONL file, or - for stdin")
+
+    guest = commands.add_parser('guest', help="print one guest's history summary")
+    guest.add_argument('rollups')
+    guest.add_argument('id')
+
+    org = commands.add_parser('org', help="print an organization's cross-event summary")
+    org.add_argument('rollups')
+    org.add_argument('id')
+    org.add_argument('--top', type=int, default=0, help='include the N guests with the highest --by count')
+    org.add_argument('--by', choices=COUNTS, default='attended', help='ranking for --top (default attended)')
+
+    measure = commands.add_parser('bench', help='time folding and queries on synthetic data')
+    measure.add_argument('--rows', type=int, default=200000, help='synthetic event_guests rows (default 200000)')
+    measure.add_argument('--changes', type=int, default=20000, help='incremental changes to fold')
+    measure.add_argument('--queries', type=int, default=1000, help='guests to look up')
+    measure.add_argument('--seed', type=int, default=0)
+    measure.add_argument('--directory', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'),
+                         help='where to write the temporary snapshot')
+    args = parser.parse_args(argv)
+
+    handlers = {'rebuild': rebuild, 'apply': apply, 'guest': show, 'org': show, 'bench': bench}
+    try:
+        return handlers[args.command](args)
+    except (RollupError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Build and query the bitmap segment index (section 2.9).
+
+    python scripts/python/guest_segments.py build --tags guest_tags.csv --segments segment_guests.csv \\
+        --define no-shows='VIP AND NOT checked-in' -o segments.idx
+    python scripts/python/guest_segments.py query segments.idx 'VIP AND speaker AND NOT checked-in' --count
+    python scripts/python/guest_segments.py tag segments.idx <guest uuid> checked-in
+    python scripts/python/guest_segments.py define segments.idx <segment uuid> '(VIP OR Press) AND NOT Staff'
+    python scripts/python/guest_segments.py bench --guests 500000
+
+Input files are CSV with a header, as written by
+COPY (SELECT gt.guest_id, t.name AS tag FROM guest_tags gt JOIN tags t ON t.id = gt.tag_id
+WHERE t.organization_id = ...) TO STDOUT WITH CSV HEADER, and likewise
+segment_guests (segment_id, guest_id) and guests (id) for guests without
+tags. `bench` compares bitmap evaluation with checking every guest's
+tags one row at a time, on synthetic data.
+"""
+
+import argparse
+import csv
+import os
+import random
+import statistics
+import sys
+import time
+
+from guests.segments import SegmentError, SegmentIndex
+
+BENCH_TAGS = {'VIP': 0.05, 'speaker': 0.02, 'checked-in': 0.6, 'press': 0.08, 'sponsor': 0.03,
+              'board member': 0.002, 'staff': 0.01, 'investor': 0.04}
+BENCH_QUERIES = ['VIP AND speaker AND NOT checked-in', '(VIP OR "board member") AND NOT staff',
+                 'press OR sponsor OR investor', 'NOT checked-in', 'segment:invited AND NOT checked-in']
+
+
+def read_pairs(path, first, second):
+    """(first, second) column values from a CSV; each of `first`/`second` lists accepted header names."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        columns = []
+        for names in (first, second):
+            found = [header.index(name) for name in names if name in header]
+            if not found:
+                raise SegmentError(f"{path}: no {' / '.join(names)} column")
+            columns.append(found[0])
+        for row in reader:
+            if len(row) > max(columns):
+                yield row[columns[0]], row[columns[1]]
+
+
+def read_ids(path):
+    for guest_id, _ in read_pairs(path, ('id', 'guest_id'), ('id', 'guest_id')):
+        yield guest_id
+
+
+def parse_definitions(definitions):
+    out = []
+    for definition in definitions:
+        segment_id, sep, expression = definition.partition('=')
+        if not sep or not segment_id.strip():
+            raise SegmentError(f'--define expects ID=EXPRESSION, got {definition!r}')
+        out.append((segment_id.strip(), expression))
+    return out
+
+
+def build(args):
+    started = time.perf_counter()
+    guest_tags = read_pairs(args.tags, ('guest_id',), ('tag', 'name', 'tag_name')) if args.tags else ()
+    segment_guests = read_pairs(args.segments, ('segment_id',), ('guest_id',)) if args.segments else ()
+    index = SegmentIndex.build(guest_tags, segment_guests, read_ids(args.guests) if args.guests else ())
+    for segment_id, expression in parse_definitions(args.define):
+        index.define_segment(segment_id, expression)
+    index.save(args.output)
+    print(f'{len(index.live)} guests, {len(index.tags)} tags, {len(index.segments)} segments '
+          f'({len(index.dynamic)} dynamic) -> {args.output}, {os.path.getsize(args.output) / 1024:.0f} KB '
+          f'in {time.perf_counter() - started:.2f} s', file=sys.stderr)
+    return 0
+
+
+def query(args):
+    started = time.perf_counter()
+    with SegmentIndex.open(args.index) as index:
+        bitmap = index.evaluate(args.expression)
+        elapsed = time.perf_counter() - started
+        if args.count:
+            print(len(bitmap))
+        else:
+            ids = index.ids
+            for number, ordinal in enumerate(bitmap):
+                if args.limit is not None and number >= args.limit:
+                    break
+                print(ids[ordinal])
+    print(f'{len(bitmap)} guest(s) in {elapsed * 1000:.1f} ms', file=sys.stderr)
+    return 0
+
+
+def update(args):
+    with SegmentIndex.open(args.index) as index:
+        if args.command == 'tag':
+            (index.untag if args.remove else index.tag)(args.guest_id, *args.tags)
+        elif args.drop:
+            index.drop_segment(args.segment_id)
+        else:
+            if args.expression is None:
+                raise SegmentError('define needs an expression (or --drop)')
+            index.define_segment(args.segment_id, args.expression)
+        index.save(args.index)
+    return 0
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def bench(args):
+    rng = random.Random(args.seed)
+    guest_ids = [f'{number:08x}-guest' for number in range(args.guests)]
+    rows = [(guest_id, tag) for guest_id in guest_ids for tag, share in BENCH_TAGS.items() if rng.random() < share]
+    invited = [('invited', guest_id) for guest_id in rng.sample(guest_ids, args.guests // 10)]
+    tags_by_guest = {guest_id: set() for guest_id in guest_ids}
+    for guest_id, tag in rows:
+        tags_by_guest[guest_id].add(tag)
+    invited_set = {guest_id for _, guest_id in invited}
+
+    started = time.perf_counter()
+    index = SegmentIndex.build(rows, invited, guest_ids)
+    built = time.perf_counter() - started
+    path = os.path.join(args.directory, 'bench-segments.idx')
+    os.makedirs(args.directory, exist_ok=True)
+    started = time.perf_counter()
+    index.save(path)
+    saved = time.perf_counter() - started
+    print(f'{args.guests} guests, {len(rows)} tag rows: build {built:.2f} s, save {saved:.2f} s, '
+          f'snapshot {os.path.getsize(path) / 1024:.0f} KB')
+
+    # Row by row: what evaluating the expression per guest costs, as a sequential scan would
+    checks = {
+        BENCH_QUERIES[0]: lambda tags, guest_id: 'VIP' in tags and 'speaker' in tags and 'checked-in' not in tags,
+        BENCH_QUERIES[1]: lambda tags, guest_id: ('VIP' in tags or 'board member' in tags) and 'staff' not in tags,
+        BENCH_QUERIES[2]: lambda tags, guest_id: 'press' in tags or 'sponsor' in tags or 'investor' in tags,
+        BENCH_QUERIES[3]: lambda tags, guest_id: 'checked-in' not in tags,
+        BENCH_QUERIES[4]: lambda tags, guest_id: guest_id in invited_set and 'checked-in' not in tags,
+    }
+    started = time.perf_counter()
+    with SegmentIndex.open(path) as mapped:
+        opened = time.perf_counter() - started
+        print(f'open {opened * 1000:.1f} ms')
+        print(f"{'expression':<42} {'matches':>8} {'cold':>9} {'bitmap':>9} {'row scan':>9}")
+        for expression in BENCH_QUERIES:
+            started = time.perf_counter()
+            cold = len(mapped.evaluate(expression))
+            cold_time = time.perf_counter() - started
+            bitmap, warm = timed(lambda: mapped.evaluate(expression), args.repeat)
+            check = checks[expression]
+            scanned, scan = timed(lambda: [guest_id for guest_id, tags in tags_by_guest.items()
+                                           if check(tags, guest_id)], max(1, args.repeat // 5))
+            if cold != len(bitmap) or set(mapped.guest_ids(bitmap)) != set(scanned):
+                print(f'MISMATCH for {expression}', file=sys.stderr)
+                return 1
+            print(f'{expression:<42} {len(bitmap):>8} {cold_time * 1000:>7.2f}ms {warm * 1000:>7.2f}ms '
+                  f'{scan * 1000:>7.1f}ms')
+
+    index.define_segment('no-shows', BENCH_QUERIES[0])
+    updates = [(rng.choice(guest_ids), rng.choice(list(BENCH_TAGS))) for _ in range(args.updates)]
+    started = time.perf_counter()
+    for number, (guest_id, tag) in enumerate(updates):
+        (index.tag if number % 2 else index.untag)(guest_id, tag)
+    per_update = (time.perf_counter() - started) / max(1, len(updates))
+    if index.segments['no-shows'] != index.evaluate(BENCH_QUERIES[0]):
+        print('MISMATCH after incremental updates', file=sys.stderr)
+        return 1
+    print(f'{len(updates)} tag changes with 1 dynamic segment: {per_update * 1e6:.1f} us each')
+    os.unlink(path)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bitmap index of guest tags and segments.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('build', help='build an index snapshot from CSV exports')
+    create.add_argument('--tags', help='CSV with guest_id and tag (or name) columns')
+    create.add_argument('--segments', help='CSV with segment_id and guest_id columns (static segments)')
+    create.add_argument('--guests', help='CSV with an id column, to include guests without tags')
+    create.add_argument('--define', action='append', default=[], metavar='ID=EXPRESSION',
+                        help='add a dynamic segment (repeatable)')
+    create.add_argument('-o', '--output', required=True, help='index file to write')
+
+    find = commands.add_parser('query', help='print the guest ids matching an expression')
+    find.add_argument('index')
+    find.add_argument('expression', help="e.g. 'VIP AND speaker AND NOT checked-in'")
+    find.add_argument('--count', action='store_true', help='print only the number of matches')
+    find.add_argument('--limit', type=int, help='print at most this many ids')
+
+    tag = commands.add_parser('tag', help='tag (or --remove a tag from) one guest and save')
+    tag.add_argument('index')
+    tag.add_argument('guest_id')
+    tag.add_argument('tags', nargs='+')
+    tag.add_argument('--remove', action='store_true')
+
+    define = commands.add_parser('define', help='create, change or --drop a dynamic segment and save')
+    define.add_argument('index')
+    define.add_argument('segment_id')
+    define.add_argument('expression', nargs='?')
+    define.add_argument('--drop', action='store_true')
+
+    measure = commands.add_parser('bench', help='compare bitmap evaluation with a row-by-row scan')
+    measure.add_argument('--guests', type=int, default=200000, help='synthetic guests (default 200000)')
+    measure.add_argument('--updates', type=int, default=20000, help='incremental tag changes to time')
+    measure.add_argument('--repeat', type=int, default=10, help='timed runs per query (median reported)')
+    measure.add_argument('--seed', type=int, default=0)
+    measure.add_argument('--directory', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'),
+                         help='where to write the temporary snapshot')
+    args = parser.parse_args(argv)
+
+    handlers = {'build': build, 'query': query, 'tag': update, 'define': update, 'bench': bench}
+    try:
+        return handlers[args.command](args)
+    except (SegmentError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""Guest data tooling: normalisation, import, export, importance scoring and duplicate detection."""
+
+from guests.dedup import Deduplicator, Detection
+from guests.records import Guest, read_guests
+
+__all__ = ['Deduplicator', 'Detection', 'Guest', 'read_guests']
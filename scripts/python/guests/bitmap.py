@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Compressed bitmaps of guest ordinals, after Roaring bitmaps.
+
+Values are split into 65536-wide chunks by their high bits. A chunk with
+at most 4096 values is a sorted array('H') of the low 16 bits (2 bytes a
+value); a denser chunk is a 65536-bit int, so AND/OR/ANDNOT of dense
+chunks are single big-int operations done in C. A tag on a handful of
+guests costs a few bytes, and "everyone not checked in" at most 8 KB per
+65536 guests.
+
+Bitmaps serialize to a little-endian layout (chunk table, then chunk
+data) and can be read back lazily from any buffer, such as an mmap: a
+chunk is only decoded when an operation touches it.
+"""
+
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+CHUNK_BITS = 16
+LOW_MASK = (1 << CHUNK_BITS) - 1
+ARRAY_MAX = 4096
+BITSET_BYTES = (1 << CHUNK_BITS) // 8
+ARRAY, BITSET = 0, 1
+HEADER = struct.Struct('<I')            # number of chunks
+ENTRY = struct.Struct('<IB3xI')         # high bits, container kind, cardinality
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def bitset_values(value):
+    """Set bit positions of a chunk bitset, ascending."""
+    out = []
+    data = value.to_bytes(BITSET_BYTES, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            out += [base + bit for bit in BYTE_BITS[byte]]
+    return out
+
+
+def array_to_bitset(values):
+    data = bytearray(BITSET_BYTES)
+    for low in values:
+        data[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(data, 'little')
+
+
+def count(container):
+    if isinstance(container, int):
+        return container.bit_count()
+    if isinstance(container, tuple):
+        return container[2]
+    return len(container)
+
+
+def shrink(container):
+    """An array for at most ARRAY_MAX values, a bitset above; None when empty."""
+    if isinstance(container, int):
+        cardinality = container.bit_count()
+        if cardinality > ARRAY_MAX:
+            return container
+        return array('H', bitset_values(container)) if cardinality else None
+    if len(container) > ARRAY_MAX:
+        return array_to_bitset(container)
+    return container if len(container) else None
+
+
+def and_containers(a, b):
+    if isinstance(a, int):
+        if isinstance(b, int):
+            return shrink(a & b)
+        a, b = b, a
+    if isinstance(b, int):
+        data = b.to_bytes(BITSET_BYTES, 'little')
+        return shrink(array('H', [low for low in a if data[low >> 3] >> (low & 7) & 1]))
+    if len(a) > len(b):
+        a, b = b, a
+    other = set(b)
+    return shrink(array('H', [low for low in a if low in other]))
+
+
+def or_containers(a, b):
+    if isinstance(a, int) or isinstance(b, int):
+        return ((a if isinstance(a, int) else array_to_bitset(a))
+                | (b if isinstance(b, int) else array_to_bitset(b)))
+    return shrink(array('H', sorted(set(a).union(b))))
+
+
+def andnot_containers(a, b):
+    if isinstance(a, int):
+        return shrink(a & ~(b if isinstance(b, int) else array_to_bitset(b)))
+    if isinstance(b, int):
+        data = b.to_bytes(BITSET_BYTES, 'little')
+        return shrink(array('H', [low for low in a if not data[low >> 3] >> (low & 7) & 1]))
+    other = set(b)
+    return shrink(array('H', [low for low in a if low not in other]))
+
+
+def copy_container(container):
+    # ints are immutable; arrays are edited in place by add() and discard()
+    return container if isinstance(container, int) else array('H', container)
+
+
+def decode(source, kind, start, cardinality):
+    if kind == BITSET:
+        return int.from_bytes(source[start:start + BITSET_BYTES], 'little')
+    values = array('H')
+    values.frombytes(source[start:start + 2 * cardinality])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class Bitmap:
+    """A set of non-negative ints stored as compressed 65536-value chunks."""
+
+    __slots__ = ('_chunks', '_source')
+
+    def __init__(self, values=()):
+        self._chunks = {}       # high bits -> array, int, or (kind, offset, cardinality) not yet decoded
+        self._source = None
+        if values:
+            self.update(values)
+
+    def _chunk(self, high):
+        container = self._chunks.get(high)
+        if isinstance(container, tuple):
+            container = self._chunks[high] = decode(self._source, *container)
+        return container
+
+    @classmethod
+    def _from_chunks(cls, chunks):
+        bitmap = cls()
+        bitmap._chunks = chunks
+        return bitmap
+
+    def __len__(self):
+        return sum(count(container) for container in self._chunks.values())
+
+    def __bool__(self):
+        return bool(self._chunks)
+
+    def __contains__(self, value):
+        container = self._chunk(value >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = value & LOW_MASK
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __iter__(self):
+        for high in sorted(self._chunks):
+            container = self._chunk(high)
+            base = high << CHUNK_BITS
+            for low in bitset_values(container) if isinstance(container, int) else container:
+                yield base | low
+
+    def __eq__(self, other):
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        if self._chunks.keys() != other._chunks.keys():
+            return False
+        for high in self._chunks:
+            mine, theirs = self._chunk(high), other._chunk(high)
+            if isinstance(mine, int) != isinstance(theirs, int) or mine != theirs:
+                return False
+        return True
+
+    def __repr__(self):
+        return f'<Bitmap {len(self)} values in {len(self._chunks)} chunks>'
+
+    def add(self, value):
+        high, low = value >> CHUNK_BITS, value & LOW_MASK
+        container = self._chunk(high)
+        if container is None:
+            self._chunks[high] = array('H', [low])
+        elif isinstance(container, int):
+            self._chunks[high] = container | 1 << low
+        else:
+            index = bisect_left(container, low)
+            if index == len(container) or container[index] != low:
+                container.insert(index, low)
+                if len(container) > ARRAY_MAX:
+                    self._chunks[high] = array_to_bitset(container)
+
+    def discard(self, value):
+        high, low = value >> CHUNK_BITS, value & LOW_MASK
+        container = self._chunk(high)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = shrink(container & ~(1 << low))
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                del container[index]
+            container = container or None
+        if container is None:
+            del self._chunks[high]
+        else:
+            self._chunks[high] = container
+
+    def update(self, values):
+        """Add many values at once (sorted and grouped by chunk, far cheaper than repeated add())."""
+        values = sorted(values)
+        start = 0
+        while start < len(values):
+            high = values[start] >> CHUNK_BITS
+            end = bisect_left(values, (high + 1) << CHUNK_BITS, start)
+            lows = array('H', dict.fromkeys(value & LOW_MASK for value in values[start:end]))
+            existing = self._chunk(high)
+            self._chunks[high] = shrink(lows) if existing is None else or_containers(existing, lows)
+            start = end
+
+    def load(self):
+        """Decode every chunk, so the bitmap no longer needs the buffer it was read from."""
+        for high in self._chunks:
+            self._chunk(high)
+        self._source = None
+
+    def copy(self):
+        return self._from_chunks({high: copy_container(self._chunk(high)) for high in self._chunks})
+
+    def __and__(self, other):
+        chunks = {}
+        small, large = (self, other) if len(self._chunks) <= len(other._chunks) else (other, self)
+        for high in small._chunks:
+            if high in large._chunks:
+                container = and_containers(small._chunk(high), large._chunk(high))
+                if container is not None:
+                    chunks[high] = container
+        return self._from_chunks(chunks)
+
+    def __or__(self, other):
+        chunks = {}
+        for high in self._chunks.keys() | other._chunks.keys():
+            mine, theirs = self._chunk(high), other._chunk(high)
+            if mine is None or theirs is None:
+                chunks[high] = copy_container(theirs if mine is None else mine)
+            else:
+                chunks[high] = or_containers(mine, theirs)
+        return self._from_chunks(chunks)
+
+    def __sub__(self, other):
+        """AND NOT."""
+        chunks = {}
+        for high in self._chunks:
+            mine, theirs = self._chunk(high), other._chunk(high)
+            container = copy_container(mine) if theirs is None else andnot_containers(mine, theirs)
+            if container is not None:
+                chunks[high] = container
+        return self._from_chunks(chunks)
+
+    def to_bytes(self):
+        entries = [HEADER.pack(len(self._chunks))]
+        data = []
+        for high in sorted(self._chunks):
+            container = self._chunk(high)
+            if isinstance(container, int):
+                entries.append(ENTRY.pack(high, BITSET, container.bit_count()))
+                data.append(container.to_bytes(BITSET_BYTES, 'little'))
+            else:
+                entries.append(ENTRY.pack(high, ARRAY, len(container)))
+                if sys.byteorder != 'little':
+                    container = array('H', container)
+                    container.byteswap()
+                data.append(container.tobytes())
+        return b''.join(entries + data)
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0):
+        """A bitmap decoding its chunks from `buffer` (bytes, mmap) on first use; returns (bitmap, end offset)."""
+        (chunks,) = HEADER.unpack_from(buffer, offset)
+        bitmap = cls()
+        bitmap._source = buffer
+        position = offset + HEADER.size + chunks * ENTRY.size
+        for index in range(chunks):
+            high, kind, cardinality = ENTRY.unpack_from(buffer, offset + HEADER.size + index * ENTRY.size)
+            bitmap._chunks[high] = (kind, position, cardinality)
+            position += BITSET_BYTES if kind == BITSET else 2 * cardinality
+        return bitmap, position
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Duplicate guest detection with blocking (section 2.8 matching strategies).
+
+Instead of comparing every pair of guests, candidate pairs come from
+blocking keys:
+
+  email    - guests sharing a normalized email (exact email match)
+  phone    - guests sharing the last ten digits of their phone number
+  name     - sorted neighbourhood: guests are sorted by (company, last,
+             first), (company, first, last) and (last, first, company),
+             and each guest is only compared with the next `window`
+             guests in each order
+
+Name and company similarity is 1 - Levenshtein distance / longer length.
+Neighbours are first screened with bit sketches of their names (see
+sketches()), a whole column at a time; the survivors for one guest are
+measured as a batch with the bit-parallel algorithm of Myers/Hyyrö,
+which reuses the guest's character masks for every candidate. Work is
+O(n * window) per organization, not O(n^2).
+"""
+
+import operator
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import compress
+
+from guests.distance import levenshtein_batch, similarity
+from guests.records import normalize_company, normalize_email, normalize_phone, normalize_text
+
+EMAIL_CONFIDENCE = 100.0
+PHONE_BASE_CONFIDENCE = 60.0    # shared phone, different names
+PHONE_MAX_CONFIDENCE = 95.0     # shared phone, same name
+
+
+def sketches(text):
+    """(character bits, hashed bigram bits) of `text`.
+
+    One edit changes at most 2 character bits and 4 bigram bits, and hash
+    collisions only hide differences, so popcount(a ^ b) of either sketch,
+    divided by 2 or 4, is a lower bound on the edit distance.
+    """
+    chars = 0
+    bigrams = 0
+    previous = 0
+    for code in map(ord, text):
+        chars |= 1 << (code & 63)
+        bigrams |= 1 << ((previous * 31 + code) & 255)
+        previous = code
+    return chars, bigrams
+
+
+@dataclass
+class Detection:
+    """One duplicate_detections row."""
+    organization_id: str
+    guest_id_1: str
+    guest_id_2: str
+    match_confidence: float
+    match_reason: str
+    status: str = 'pending'
+
+    COLUMNS = ('organization_id', 'guest_id_1', 'guest_id_2', 'match_confidence', 'match_reason', 'status')
+
+    def row(self):
+        return [getattr(self, column) for column in self.COLUMNS]
+
+
+class _Keys:
+    """Normalized matching keys for one organization's guests, column-wise."""
+
+    def __init__(self, guests):
+        self.ids = [guest.id for guest in guests]
+        self.emails = [normalize_email(guest.email) for guest in guests]
+        self.phones = [normalize_phone(guest.phone) for guest in guests]
+        firsts = [normalize_text(guest.first_name) for guest in guests]
+        lasts = [normalize_text(guest.last_name) for guest in guests]
+        self.names = [f'{first} {last}'.strip() for first, last in zip(firsts, lasts)]
+        self.companies = [normalize_company(guest.company) for guest in guests]
+        self.name_lengths = [len(name) for name in self.names]
+        self.name_chars, self.name_bigrams = map(list, zip(*map(sketches, self.names))) if guests else ([], [])
+        # Sorted-neighbourhood orders; a typo early in one field is caught by an
+        # order that sorts on the other fields first. '\0' joins sort like the
+        # field tuples but compare faster.
+        self.orders = []
+        for fields in ((self.companies, lasts, firsts), (self.companies, firsts, lasts),
+                       (lasts, firsts, self.companies)):
+            sort_keys = list(map('\0'.join, zip(*fields)))
+            self.orders.append(sorted(range(len(guests)), key=sort_keys.__getitem__))
+
+
+class Deduplicator:
+    def __init__(self, window=5, name_threshold=0.85, company_threshold=0.8, min_confidence=70.0,
+                 max_block=50):
+        self.window = window
+        self.name_threshold = name_threshold
+        self.company_threshold = company_threshold
+        self.min_confidence = min_confidence
+        # Exact-key blocks larger than this (a shared switchboard number, a role
+        # address) are linked as a chain instead of all pairs
+        self.max_block = max_block
+
+    def detect(self, guests):
+        """Return Detection rows for `guests`, compared only within their organization."""
+        organizations = defaultdict(list)
+        for guest in guests:
+            organizations[guest.organization_id].append(guest)
+        detections = []
+        for organization_id, members in organizations.items():
+            detections += self.detect_organization(organization_id, members)
+        return detections
+
+    def detect_organization(self, organization_id, guests):
+        keys = _Keys(guests)
+        reasons = defaultdict(dict)     # (i, j) -> {reason: confidence}
+        for i, j in self._exact_pairs(keys.emails):
+            reasons[i, j]['exact email match'] = EMAIL_CONFIDENCE
+        phone_pairs = list(self._exact_pairs(keys.phones))
+        distances = [levenshtein_batch(keys.names[i], [keys.names[j]])[0] for i, j in phone_pairs]
+        for (i, j), distance in zip(phone_pairs, distances):
+            score = similarity(distance, keys.names[i], keys.names[j])
+            reasons[i, j]['phone number match'] = \
+                PHONE_BASE_CONFIDENCE + (PHONE_MAX_CONFIDENCE - PHONE_BASE_CONFIDENCE) * score
+        for order in keys.orders:
+            self._neighbourhood(keys, order, reasons)
+
+        detections = []
+        for (i, j), found in reasons.items():
+            confidence = round(max(found.values()), 2)
+            if confidence < self.min_confidence:
+                continue
+            first, second = sorted((keys.ids[i], keys.ids[j]))
+            reason = '; '.join(sorted(found, key=found.get, reverse=True))
+            detections.append(Detection(organization_id, first, second, confidence, reason))
+        detections.sort(key=lambda detection: (-detection.match_confidence, detection.guest_id_1,
+                                               detection.guest_id_2))
+        return detections
+
+    def _exact_pairs(self, values):
+        first = {}
+        blocks = {}
+        for index, value in enumerate(values):
+            if value:
+                seen = first.setdefault(value, index)
+                if seen != index:
+                    blocks.setdefault(value, [seen]).append(index)
+        for members in blocks.values():
+            if len(members) > self.max_block:
+                yield from zip(members, members[1:])
+            else:
+                for position, a in enumerate(members):
+                    for b in members[position + 1:]:
+                        yield a, b
+
+    def _neighbourhood(self, keys, order, reasons):
+        names, companies = keys.names, keys.companies
+        usable = [i for i in order if names[i] and companies[i]]
+        # Per position: the name's sketches and the edits it allows; a pair is
+        # only measured if neither sketch differs by more than those edits can
+        chars = [keys.name_chars[i] for i in usable]
+        bigrams = [keys.name_bigrams[i] for i in usable]
+        budgets = [int((1 - self.name_threshold) * keys.name_lengths[i] + 1e-9) for i in usable]
+        char_budgets = [2 * budget for budget in budgets]
+        bigram_budgets = [4 * budget for budget in budgets]
+        candidates = defaultdict(list)
+        for offset in range(1, self.window + 1):
+            # Whole-column bit arithmetic on the character sketches, so the
+            # per-pair work for the bulk of the neighbours stays in C
+            fits = map(operator.le, map(int.bit_count, map(operator.xor, chars, chars[offset:])),
+                       map(max, char_budgets, char_budgets[offset:]))
+            for position in compress(range(len(usable) - offset), fits):
+                other = position + offset
+                if (bigrams[position] ^ bigrams[other]).bit_count() <= \
+                        max(bigram_budgets[position], bigram_budgets[other]):
+                    candidates[usable[position]].append(usable[other])
+
+        for i, others in candidates.items():
+            name, company = names[i], companies[i]
+            for j, distance in zip(others, levenshtein_batch(name, [names[j] for j in others])):
+                name_score = similarity(distance, name, names[j])
+                if name_score < self.name_threshold:
+                    continue
+                other_company = companies[j]
+                company_score = 1.0 if company == other_company else similarity(
+                    levenshtein_batch(company, [other_company])[0], company, other_company)
+                if company_score < self.company_threshold:
+                    continue
+                pair = (i, j) if i < j else (j, i)
+                reasons[pair][f'fuzzy name+company match (name {name_score:.2f}, company {company_score:.2f})'] = \
+                    100 * (0.7 * name_score + 0.3 * company_score)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Edit distance helpers shared by duplicate detection and column matching."""
+
+
+def levenshtein_batch(pattern, texts):
+    """Edit distances from `pattern` to each of `texts`, bit-parallel over the pattern."""
+    length = len(pattern)
+    if not length:
+        return [len(text) for text in texts]
+    masks = {}
+    for position, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << position)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    distances = []
+    for text in texts:
+        positive, negative, score = full, 0, length
+        for char in text:
+            equal = masks.get(char, 0)
+            vertical = equal | negative
+            horizontal = (((equal & positive) + positive) ^ positive) | equal
+            up = negative | (~(horizontal | positive) & full)
+            down = positive & horizontal
+            if up & last:
+                score += 1
+            elif down & last:
+                score -= 1
+            up = ((up << 1) | 1) & full
+            down = (down << 1) & full
+            positive = down | (~(vertical | up) & full)
+            negative = up & vertical
+        distances.append(score)
+    return distances
+
+
+def similarity(distance, first, second):
+    longest = max(len(first), len(second))
+    return 1.0 - distance / longest if longest else 1.0
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Streaming guest export (section 2.7): CSV, XLSX and PDF.
+
+Rows go from the source to the writer one at a time, so memory stays
+flat no matter how many guests an event has:
+
+  postgres_rows  - a named (server-side) cursor; psycopg fetches
+                   `fetch_size` rows per round trip instead of the
+                   whole result set
+  file_rows      - a guest CSV/TSV/XLSX file, for exports without a
+                   database
+
+Writers share open_sheet(name, columns, widths) / write_row(values) /
+close(): CsvWriter, guests.xlsx.XlsxWriter (rows streamed into the zip
+entry) and guests.pdf.PdfWriter (pages written as they fill). XLSX and
+PDF exports end with a summary sheet of event metadata and RSVP counts.
+export_all() runs one export per event across a process pool.
+"""
+
+import csv
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from guests.importer import connect, read_table
+from guests.pdf import PdfWriter
+from guests.records import match_columns, normalize_header, split_full_name
+from guests.xlsx import XlsxWriter
+
+# Export field -> (column label, SQL expression, relative column width)
+FIELDS = {
+    'first_name': ('First name', 'g.first_name', 1.0),
+    'last_name': ('Last name', 'g.last_name', 1.0),
+    'email': ('Email', 'g.email', 2.0),
+    'company': ('Company', 'g.company', 1.5),
+    'job_title': ('Job title', 'g.job_title', 1.5),
+    'phone': ('Phone', 'g.phone', 1.0),
+    'tags': ('Tags', "(SELECT string_agg(t.name, ', ' ORDER BY t.name) FROM guest_tags gt "
+                     "JOIN tags t ON t.id = gt.tag_id WHERE gt.guest_id = g.id)", 1.5),
+    'rsvp_status': ('RSVP', 'eg.rsvp_status', 0.8),
+    'check_in_status': ('Check-in', 'eg.check_in_status', 1.0),
+    'importance_score': ('Importance', 'eg.importance_score', 0.8),
+    'notes': ('Notes', 'eg.notes', 2.0),
+}
+# Fields that live on event_guests and need an event
+EVENT_FIELDS = ('rsvp_status', 'check_in_status', 'importance_score', 'notes')
+DEFAULT_FIELDS = ('first_name', 'last_name', 'email', 'company', 'job_title', 'rsvp_status', 'importance_score')
+FORMATS = ('csv', 'xlsx', 'pdf')
+FETCH_SIZE = 2000
+
+
+class ExportError(Exception):
+    pass
+
+
+@dataclass
+class ExportFilter:
+    """Guests must match every given criterion; tags must all be present."""
+    statuses: tuple = ()
+    check_in: tuple = ()
+    min_importance: float = None
+    tags: tuple = ()
+
+
+@dataclass
+class ExportJob:
+    """One output file; picklable so it can run in a worker process."""
+    output: str
+    format: str = 'csv'
+    fields: tuple = DEFAULT_FIELDS
+    filters: ExportFilter = field(default_factory=ExportFilter)
+    dsn: str = None
+    organization_id: str = None
+    event_id: str = None
+    source: str = None      # guest file to export instead of the database
+    title: str = ''
+    fetch_size: int = FETCH_SIZE
+
+
+@dataclass
+class ExportStats:
+    output: str = ''
+    rows: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    seconds: float = 0.0
+
+
+def check_fields(fields, event=True):
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ExportError(f"unknown field(s) {', '.join(unknown)}; choose from {', '.join(FIELDS)}")
+    if not fields:
+        raise ExportError('no fields selected')
+    if not event:
+        needs_event = [name for name in fields if name in EVENT_FIELDS]
+        if needs_event:
+            raise ExportError(f"event field(s) {', '.join(needs_event)} need an event_id")
+
+
+def build_query(fields, organization_id=None, event_id=None, filters=ExportFilter()):
+    """Return (sql, params) selecting `fields` for one event or organization."""
+    check_fields(fields, event=event_id is not None)
+    if event_id is None and (filters.statuses or filters.check_in or filters.min_importance is not None):
+        raise ExportError('status and importance filters need an event')
+    columns = ', '.join(FIELDS[name][1] for name in fields)
+    conditions, params = [], []
+    if event_id is not None:
+        sql = f'SELECT {columns} FROM event_guests eg JOIN guests g ON g.id = eg.guest_id'
+        conditions.append('eg.event_id = %s')
+        params.append(event_id)
+    else:
+        sql = f'SELECT {columns} FROM guests g'
+    if organization_id is not None:
+        conditions.append('g.organization_id = %s')
+        params.append(organization_id)
+    if filters.statuses:
+        conditions.append('eg.rsvp_status = ANY(%s)')
+        params.append(list(filters.statuses))
+    if filters.check_in:
+        conditions.append('eg.check_in_status = ANY(%s)')
+        params.append(list(filters.check_in))
+    if filters.min_importance is not None:
+        conditions.append('eg.importance_score >= %s')
+        params.append(filters.min_importance)
+    for tag in filters.tags:
+        conditions.append('EXISTS (SELECT 1 FROM guest_tags gt JOIN tags t ON t.id = gt.tag_id '
+                          'WHERE gt.guest_id = g.id AND t.name = %s)')
+        params.append(tag)
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    return sql + ' ORDER BY g.last_name, g.first_name, g.id', params
+
+
+def postgres_rows(connection, sql, params, fetch_size=FETCH_SIZE):
+    """Yield result rows through a server-side cursor, `fetch_size` at a time."""
+    cursor = connection.cursor(name='guest_export')
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(sql, params)
+        yield from cursor
+    finally:
+        cursor.close()
+
+
+def event_metadata(connection, event_id):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT name, date, location, status FROM events WHERE id = %s', (event_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        raise ExportError(f'event {event_id} not found')
+    return dict(zip(('Event', 'Date', 'Location', 'Status'), row))
+
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def file_rows(path, fields, filters=ExportFilter()):
+    """Yield the `fields` of each matching row of a guest file, filtering in Python."""
+    check_fields(fields)
+    rows = read_table(path)
+    header = next(rows, None)
+    if not header:
+        raise ExportError(f'{path} is empty')
+    columns = match_columns(header)
+    # Only there without first/last name columns: split it as the importer does
+    full_name = columns.pop('full_name', None)
+    for index, name in enumerate(header):
+        columns.setdefault(normalize_header(name).replace(' ', '_'), index)
+    indexes = [columns.get(name) for name in fields]
+    name_parts = []
+    if full_name is not None:
+        name_parts = [(position, ('first_name', 'last_name').index(name))
+                      for position, name in enumerate(fields) if name in ('first_name', 'last_name')]
+    score_position = fields.index('importance_score') if 'importance_score' in fields else None
+
+    def value(row, name):
+        index = columns.get(name)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for row in rows:
+        if filters.statuses and value(row, 'rsvp_status') not in filters.statuses:
+            continue
+        if filters.check_in and value(row, 'check_in_status') not in filters.check_in:
+            continue
+        score = _number(value(row, 'importance_score')) if 'importance_score' in columns else None
+        if filters.min_importance is not None and (score is None or score < filters.min_importance):
+            continue
+        if filters.tags:
+            tags = {tag.strip() for tag in value(row, 'tags').split(',')}
+            if not tags.issuperset(filters.tags):
+                continue
+        values = [row[index].strip() if index is not None and index < len(row) else '' for index in indexes]
+        if name_parts:
+            parts = split_full_name(row[full_name] if full_name < len(row) else '')
+            for position, part in name_parts:
+                values[position] = parts[part]
+        if score is not None and score_position is not None:
+            values[score_position] = score
+        yield values
+
+
+class CsvWriter:
+    """Single-sheet writer; a second sheet (the summary) is skipped."""
+
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._sheets = 0
+
+    def open_sheet(self, name, columns, widths=None):
+        self._sheets += 1
+        if self._sheets == 1:
+            self._writer.writerow(columns)
+
+    def write_row(self, values):
+        if self._sheets == 1:
+            self._writer.writerow(['' if value is None else value for value in values])
+
+    def close(self):
+        self._file.close()
+
+
+def open_writer(format, path, title=''):
+    if format == 'csv':
+        return CsvWriter(path)
+    if format == 'xlsx':
+        return XlsxWriter(path)
+    if format == 'pdf':
+        return PdfWriter(path, title=title)
+    raise ExportError(f"unknown format {format!r}; choose from {', '.join(FORMATS)}")
+
+
+def write_export(rows, writer, fields, metadata=None):
+    """Stream `rows` into `writer` as a Guests sheet, then a Summary sheet."""
+    stats = ExportStats()
+    status = fields.index('rsvp_status') if 'rsvp_status' in fields else None
+    writer.open_sheet('Guests', [FIELDS[name][0] for name in fields], [FIELDS[name][2] for name in fields])
+    for row in rows:
+        writer.write_row(row)
+        stats.rows += 1
+        if status is not None:
+            stats.statuses[row[status] or 'pending'] += 1
+    writer.open_sheet('Summary', ['Item', 'Value'], [1.5, 3.0])
+    for key, value in (metadata or {}).items():
+        writer.write_row([key, '' if value is None else str(value)])
+    writer.write_row(['Guests exported', stats.rows])
+    for name, count in sorted(stats.statuses.items()):
+        writer.write_row([f'RSVP: {name}', count])
+    return stats
+
+
+def run_export(job):
+    """Run one ExportJob; the file is written beside the target and renamed into place."""
+    started = time.perf_counter()
+    fields = list(job.fields)
+    check_fields(fields, event=bool(job.event_id or job.source))
+    tmp_path = job.output + '.tmp'
+    writer = open_writer(job.format, tmp_path, title=job.title or 'Guest list')
+    connection = None
+    try:
+        metadata = {'Exported at': time.strftime('%Y-%m-%d %H:%M')}
+        if job.source:
+            metadata['Source'] = os.path.basename(job.source)
+            rows = file_rows(job.source, fields, job.filters)
+        else:
+            connection = connect(job.dsn)
+            if job.event_id:
+                metadata.update(event_metadata(connection, job.event_id))
+            sql, params = build_query(fields, job.organization_id, job.event_id, job.filters)
+            rows = postgres_rows(connection, sql, params, job.fetch_size)
+        stats = write_export(rows, writer, fields, metadata)
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.unlink(tmp_path)
+        raise
+    finally:
+        if connection is not None:
+            connection.close()
+    os.replace(tmp_path, job.output)
+    stats.output = job.output
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def export_all(jobs, workers=None):
+    """Run `jobs` (one per event) in a process pool; yields ExportStats in job order."""
+    if len(jobs) == 1:
+        yield run_export(jobs[0])
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(run_export, jobs)
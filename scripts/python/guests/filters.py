@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+"""Saved-filter compiler (section 2.13): filter_criteria JSONB -> parameterized SQL.
+
+Criteria, as stored in saved_filters.filter_criteria:
+
+    {
+      "match": "all",                          # "all" (AND) or "any" (OR)
+      "event_id": "<uuid>",                    # optional: search within one event
+      "conditions": [
+        {"field": "rsvp_status", "op": "in", "value": ["confirmed", "pending"]},
+        {"field": "importance_score", "op": "between", "value": [70, 100]},
+        {"field": "created_at", "op": "within_days", "value": 30},
+        {"field": "tags", "op": "all", "value": ["VIP", "Press"]},
+        {"field": "segments", "op": "none", "value": ["<segment uuid>"]},
+        {"field": "custom.dietary", "op": "eq", "value": "vegan"},
+        {"field": "search", "op": "contains", "value": "acme"},
+        {"match": "any", "conditions": [...]}
+      ]
+    }
+
+Values are always bound as parameters, never spliced into the SQL. Tags,
+segments and per-guest tables (guest_metadata, or event_guests outside
+an event) become correlated EXISTS subqueries, so a guest with many tags
+is never multiplied into duplicate rows. Within an AND group, predicates
+an index can serve come first, then the rest by cost / (1 - selectivity)
+so cheap, selective checks run before expensive ones; selectivity comes
+from pg_stats when available. The plan's guests table has no custom
+fields, so "custom.*" conditions are rejected unless the compiler is
+given the name of a JSONB column on guests to match them in, by
+containment (@>), which a GIN index can serve.
+
+FilterCache keeps compiled filters per saved filter id and reuses them
+while updated_at is unchanged.
+"""
+
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+ALIASES = {'guests': 'g', 'event_guests': 'eg'}
+SELECT_COLUMNS = ('g.id', 'g.first_name', 'g.last_name', 'g.email', 'g.company', 'g.job_title')
+EVENT_COLUMNS = ('eg.rsvp_status', 'eg.check_in_status', 'eg.importance_score')
+SEARCH_COLUMNS = ('g.first_name', 'g.last_name', 'g.email', 'g.company', 'g.job_title')
+MAX_DEPTH = 8
+
+
+@dataclass(frozen=True)
+class Field:
+    table: str
+    column: str
+    type: str       # text, number, timestamp, boolean
+
+
+FIELDS = {
+    'first_name': Field('guests', 'first_name', 'text'),
+    'last_name': Field('guests', 'last_name', 'text'),
+    'email': Field('guests', 'email', 'text'),
+    'company': Field('guests', 'company', 'text'),
+    'job_title': Field('guests', 'job_title', 'text'),
+    'phone': Field('guests', 'phone', 'text'),
+    'created_at': Field('guests', 'created_at', 'timestamp'),
+    'updated_at': Field('guests', 'updated_at', 'timestamp'),
+    'rsvp_status': Field('event_guests', 'rsvp_status', 'text'),
+    'check_in_status': Field('event_guests', 'check_in_status', 'text'),
+    'importance_score': Field('event_guests', 'importance_score', 'number'),
+    'added_at': Field('event_guests', 'created_at', 'timestamp'),
+    'vip_status': Field('guest_metadata', 'vip_status', 'boolean'),
+    'industry': Field('guest_metadata', 'industry', 'text'),
+    'company_size': Field('guest_metadata', 'company_size', 'number'),
+}
+# Outside an event, importance is the guest's cached score rather than a per-event one
+ORGANIZATION_FIELDS = {'importance_score': Field('guest_metadata', 'importance_score', 'number')}
+
+COMPARISONS = {'eq': '=', 'ne': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+OPERATORS = {
+    'text': ('eq', 'ne', 'in', 'not_in', 'contains', 'starts_with', 'is_null', 'not_null'),
+    'number': ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'between', 'in', 'not_in', 'is_null', 'not_null'),
+    'timestamp': ('gt', 'gte', 'lt', 'lte', 'between', 'within_days', 'is_null', 'not_null'),
+    'boolean': ('eq', 'ne', 'is_null', 'not_null'),
+}
+# Operators a b-tree index on the column can serve
+INDEXABLE = ('eq', 'in', 'gt', 'gte', 'lt', 'lte', 'between', 'within_days', 'is_null')
+# Fraction of rows a predicate is expected to keep when pg_stats has nothing better
+DEFAULT_SELECTIVITY = {'eq': 0.05, 'ne': 0.95, 'in': 0.05, 'not_in': 0.95, 'gt': 0.33, 'gte': 0.33,
+                       'lt': 0.33, 'lte': 0.33, 'between': 0.25, 'within_days': 0.2, 'is_null': 0.1,
+                       'not_null': 0.9, 'contains': 0.1, 'starts_with': 0.05}
+TAG_SELECTIVITY = 0.05
+SEGMENT_SELECTIVITY = 0.1
+# Relative evaluation cost: a column test is 1, a subquery probe through an index more
+COLUMN_COST = 1.0
+EXISTS_COST = 4.0
+UNINDEXED_EXISTS_COST = 50.0
+# Leading index columns in the plan's schema (see indexed_columns() to derive them)
+DEFAULT_INDEXED = frozenset({
+    ('guests', 'id'), ('guests', 'organization_id'), ('guests', 'email'),
+    ('event_guests', 'event_id'), ('event_guests', 'guest_id'),
+    ('guest_metadata', 'guest_id'), ('guest_tags', 'guest_id'), ('guest_tags', 'tag_id'),
+    ('tags', 'organization_id'), ('segment_guests', 'segment_id'), ('segment_guests', 'guest_id'),
+})
+
+
+class FilterError(Exception):
+    pass
+
+
+@dataclass
+class Predicate:
+    sql: str
+    params: list
+    indexed: bool           # an index on the column can serve it
+    selectivity: float      # expected fraction of rows kept
+    cost: float = COLUMN_COST
+
+    @property
+    def order(self):
+        return not self.indexed, self.cost / max(1e-6, 1 - self.selectivity)
+
+
+@dataclass
+class CompiledFilter:
+    sql: str
+    params: list
+    predicates: list = field(default_factory=list)
+
+    def query(self, limit=None):
+        """(sql, params), optionally with a LIMIT."""
+        if limit is None:
+            return self.sql, list(self.params)
+        return f'{self.sql} LIMIT %s', list(self.params) + [limit]
+
+
+def like_pattern(text, prefix=False):
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%' if prefix else f'%{escaped}%'
+
+
+def indexed_columns(schema):
+    """(table, leading column) of every b-tree index in a plan_tools.schema.Schema."""
+    return frozenset((name, columns[0]) for name in schema.tables
+                     for columns in schema.table_indexes(name) if columns and columns[0])
+
+
+def load_indexed_columns(connection):
+    """(table, leading column) of every index in the connection's current schema."""
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT c.relname, a.attname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE n.nspname = current_schema()""")
+    rows = cursor.fetchall()
+    cursor.close()
+    return frozenset((table, column) for table, column in rows)
+
+
+def load_column_stats(connection):
+    """{(table, column): equality selectivity} from pg_stats (run ANALYZE first)."""
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT s.tablename, s.attname, s.n_distinct, c.reltuples
+        FROM pg_stats s
+        JOIN pg_class c ON c.relname = s.tablename
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = s.schemaname
+        WHERE s.schemaname = current_schema()""")
+    stats = {}
+    for table, column, n_distinct, rows in cursor.fetchall():
+        # Negative n_distinct is a fraction of the row count
+        distinct = n_distinct if n_distinct > 0 else -n_distinct * max(rows, 1)
+        if distinct:
+            stats[table, column] = 1.0 / distinct
+    cursor.close()
+    return stats
+
+
+class FilterCompiler:
+    def __init__(self, indexed=DEFAULT_INDEXED, stats=None, reorder=True, custom_fields=None):
+        self.indexed = indexed
+        self.stats = stats or {}
+        # reorder=False keeps the stored order (for benchmarking the ordering)
+        self.reorder = reorder
+        # JSONB column on guests holding custom fields, where the schema has one
+        self.custom_fields = custom_fields
+
+    def compile(self, criteria, organization_id):
+        """Return a CompiledFilter selecting the organization's guests matching `criteria`."""
+        if isinstance(criteria, str):
+            criteria = json.loads(criteria)
+        if not isinstance(criteria, dict):
+            raise FilterError('filter_criteria must be an object')
+        event_id = criteria.get('event_id')
+        if event_id is not None and (not isinstance(event_id, str) or not event_id):
+            raise FilterError(f'event_id must be a non-empty string, not {event_id!r}')
+        # One test decides both the join and which table event fields compile against
+        in_event = event_id is not None
+        columns = SELECT_COLUMNS + (EVENT_COLUMNS if in_event else ())
+        sql = f"SELECT {', '.join(columns)} FROM guests g"
+        scope = ['g.organization_id = %s']
+        params = [organization_id]
+        if in_event:
+            sql += ' JOIN event_guests eg ON eg.guest_id = g.id'
+            scope.append('eg.event_id = %s')
+            params.append(event_id)
+        group = self._group(criteria, in_event, 'criteria', 0)
+        predicates = []
+        if group is not None:
+            # A top-level AND is flattened so its parts are ordered as one list
+            predicates = group if isinstance(group, list) else [group]
+        where = scope + [predicate.sql for predicate in predicates]
+        for predicate in predicates:
+            params += predicate.params
+        sql += ' WHERE ' + ' AND '.join(where) + ' ORDER BY g.last_name, g.first_name, g.id'
+        return CompiledFilter(sql, params, predicates)
+
+    def _group(self, group, in_event, path, depth):
+        """A list of AND-ed predicates for "all", one OR predicate for "any", None if empty."""
+        if depth > MAX_DEPTH:
+            raise FilterError(f'{path}: groups are nested too deeply')
+        match = group.get('match', 'all')
+        if match not in ('all', 'any'):
+            raise FilterError(f"{path}: match must be 'all' or 'any', not {match!r}")
+        conditions = group.get('conditions', [])
+        if not isinstance(conditions, list):
+            raise FilterError(f'{path}.conditions must be a list')
+        predicates = []
+        for index, condition in enumerate(conditions):
+            where = f'{path}.conditions[{index}]'
+            if not isinstance(condition, dict):
+                raise FilterError(f'{where}: expected an object')
+            if 'conditions' in condition:
+                nested = self._group(condition, in_event, where, depth + 1)
+                if isinstance(nested, list):
+                    predicates += nested if match == 'all' else [self._combine(nested, 'AND')]
+                elif nested is not None:
+                    predicates.append(nested)
+            else:
+                found = self._condition(condition, in_event, where)
+                predicates += found if match == 'all' else [self._combine(found, 'AND')]
+        if not predicates:
+            return None
+        if match == 'all':
+            if self.reorder:
+                predicates.sort(key=lambda predicate: predicate.order)
+            return predicates
+        return self._combine(predicates, 'OR')
+
+    def _combine(self, predicates, operator):
+        if len(predicates) == 1:
+            return predicates[0]
+        if self.reorder and operator == 'AND':
+            predicates = sorted(predicates, key=lambda predicate: predicate.order)
+        params = [param for predicate in predicates for param in predicate.params]
+        cost = sum(predicate.cost for predicate in predicates)
+        if operator == 'AND':
+            selectivity = 1.0
+            for predicate in predicates:
+                selectivity *= predicate.selectivity
+            indexed = any(predicate.indexed for predicate in predicates)
+        else:
+            remaining = 1.0
+            for predicate in predicates:
+                remaining *= 1 - predicate.selectivity
+            selectivity = 1 - remaining
+            # A BitmapOr needs an index on every branch
+            indexed = all(predicate.indexed for predicate in predicates)
+        sql = '(' + f' {operator} '.join(predicate.sql for predicate in predicates) + ')'
+        return Predicate(sql, params, indexed, selectivity, cost)
+
+    def _condition(self, condition, in_event, path):
+        name = condition.get('field')
+        op = condition.get('op')
+        value = condition.get('value')
+        if name == 'tags':
+            return self._tags(op, self._names(value, path), path)
+        if name == 'segments':
+            return [self._segments(op, self._names(value, path), path)]
+        if name == 'search':
+            if op != 'contains' or not isinstance(value, str) or not value.strip():
+                raise FilterError(f"{path}: search takes op 'contains' and a non-empty string")
+            pattern = like_pattern(value.strip())
+            sql = '(' + ' OR '.join(f'{column} ILIKE %s' for column in SEARCH_COLUMNS) + ')'
+            return [Predicate(sql, [pattern] * len(SEARCH_COLUMNS), False, DEFAULT_SELECTIVITY['contains'],
+                              COLUMN_COST * len(SEARCH_COLUMNS))]
+        if isinstance(name, str) and name.startswith('custom.'):
+            return [self._custom(name[len('custom.'):], op, value, path)]
+        spec = (None if in_event else ORGANIZATION_FIELDS.get(name)) or FIELDS.get(name)
+        if spec is None:
+            raise FilterError(f'{path}: unknown field {name!r}')
+        if op not in OPERATORS[spec.type]:
+            raise FilterError(f"{path}: {name} does not support {op!r}; use one of {', '.join(OPERATORS[spec.type])}")
+        direct = spec.table == 'guests' or (spec.table == 'event_guests' and in_event)
+        alias = ALIASES[spec.table] if direct else 'x'
+        test, params = self._comparison(f'{alias}.{spec.column}', spec.type, op, value, path)
+        selectivity = self._selectivity(spec, op, value)
+        if direct:
+            indexed = op in INDEXABLE and (spec.table, spec.column) in self.indexed
+            return [Predicate(test, params, indexed, selectivity)]
+        # Per-guest rows in another table, probed through their guest_id index
+        sql = f'EXISTS (SELECT 1 FROM {spec.table} x WHERE x.guest_id = g.id AND {test})'
+        return [Predicate(sql, params, False, selectivity, self._probe_cost(spec.table))]
+
+    def _probe_cost(self, table):
+        return EXISTS_COST if (table, 'guest_id') in self.indexed else UNINDEXED_EXISTS_COST
+
+    def _selectivity(self, spec, op, value):
+        equality = self.stats.get((spec.table, spec.column))
+        if equality is not None:
+            if op == 'eq':
+                return equality
+            if op == 'in':
+                return min(1.0, equality * len(value))
+            if op == 'ne':
+                return 1 - equality
+            if op == 'not_in':
+                return max(0.0, 1 - equality * len(value))
+        if op == 'in':
+            return min(1.0, DEFAULT_SELECTIVITY['eq'] * len(value))
+        if op == 'not_in':
+            return max(0.0, 1 - DEFAULT_SELECTIVITY['eq'] * len(value))
+        return DEFAULT_SELECTIVITY[op]
+
+    def _comparison(self, column, type, op, value, path):
+        if op == 'is_null':
+            return f'{column} IS NULL', []
+        if op == 'not_null':
+            return f'{column} IS NOT NULL', []
+        if op in ('in', 'not_in'):
+            if not isinstance(value, list) or not value:
+                raise FilterError(f'{path}: {op} needs a non-empty list')
+            values = [self._value(item, type, path) for item in value]
+            return (f'{column} = ANY(%s)' if op == 'in' else f'{column} <> ALL(%s)'), [values]
+        if op == 'between':
+            if not isinstance(value, list) or len(value) != 2:
+                raise FilterError(f'{path}: between needs [low, high]')
+            return f'{column} BETWEEN %s AND %s', [self._value(item, type, path) for item in value]
+        if op == 'within_days':
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise FilterError(f'{path}: within_days needs a number of days')
+            return f"{column} >= NOW() - %s * INTERVAL '1 day'", [value]
+        if op in ('contains', 'starts_with'):
+            if not isinstance(value, str):
+                raise FilterError(f'{path}: {op} needs a string')
+            return f'{column} ILIKE %s', [like_pattern(value, prefix=op == 'starts_with')]
+        return f'{column} {COMPARISONS[op]} %s', [self._value(value, type, path)]
+
+    def _value(self, value, type, path):
+        if type == 'number':
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise FilterError(f'{path}: expected a number, got {value!r}')
+            return value
+        if type == 'boolean':
+            if not isinstance(value, bool):
+                raise FilterError(f'{path}: expected true or false, got {value!r}')
+            return value
+        if type == 'timestamp':
+            try:
+                parsed = datetime.fromisoformat(value) if 'T' in str(value) or ' ' in str(value) \
+                    else date.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise FilterError(f'{path}: expected an ISO date, got {value!r}') from None
+            return parsed
+        if not isinstance(value, str):
+            raise FilterError(f'{path}: expected a string, got {value!r}')
+        return value
+
+    def _names(self, value, path):
+        if not isinstance(value, list) or not value or not all(isinstance(item, str) for item in value):
+            raise FilterError(f'{path}: expected a non-empty list of names or ids')
+        return value
+
+    def _tags(self, op, names, path):
+        tagged = ('EXISTS (SELECT 1 FROM guest_tags gt JOIN tags t ON t.id = gt.tag_id '
+                  'WHERE gt.guest_id = g.id AND t.name {test})')
+        cost = self._probe_cost('guest_tags')
+        if op == 'any':
+            return [Predicate(tagged.format(test='= ANY(%s)'), [names], False,
+                              min(1.0, TAG_SELECTIVITY * len(names)), cost)]
+        if op == 'all':
+            # One EXISTS per tag, so each is ordered on its own
+            return [Predicate(tagged.format(test='= %s'), [name], False, TAG_SELECTIVITY, cost) for name in names]
+        if op == 'none':
+            return [Predicate('NOT ' + tagged.format(test='= ANY(%s)'), [names], False,
+                              max(0.0, 1 - TAG_SELECTIVITY * len(names)), cost)]
+        raise FilterError(f"{path}: tags take op 'any', 'all' or 'none', not {op!r}")
+
+    def _segments(self, op, ids, path):
+        member = 'EXISTS (SELECT 1 FROM segment_guests sg WHERE sg.guest_id = g.id AND sg.segment_id = ANY(%s))'
+        cost = self._probe_cost('segment_guests')
+        if op in ('any', 'in'):
+            return Predicate(member, [ids], False, min(1.0, SEGMENT_SELECTIVITY * len(ids)), cost)
+        if op in ('none', 'not_in'):
+            return Predicate('NOT ' + member, [ids], False, max(0.0, 1 - SEGMENT_SELECTIVITY * len(ids)), cost)
+        raise FilterError(f"{path}: segments take op 'any' or 'none', not {op!r}")
+
+    def _custom(self, name, op, value, path):
+        if not self.custom_fields:
+            raise FilterError(f'{path}: guests have no custom fields column to filter on')
+        if not name:
+            raise FilterError(f'{path}: custom field name is empty')
+        column = f'g.{self.custom_fields}'
+        indexed = ('guests', self.custom_fields) in self.indexed
+        if op == 'eq':
+            if isinstance(value, (dict, list)):
+                raise FilterError(f'{path}: custom fields compare scalar values')
+            return Predicate(f'{column} @> %s::jsonb', [json.dumps({name: value})], indexed,
+                             DEFAULT_SELECTIVITY['eq'])
+        if op == 'not_null':
+            return Predicate(f'{column} ? %s', [name], indexed, DEFAULT_SELECTIVITY['not_null'])
+        if op in ('contains', 'ne', 'in'):
+            test, params = self._comparison(f'{column} ->> %s', 'text', op, value, path)
+            return Predicate(test, [name] + params, False, self._selectivity(Field('guests', '', 'text'), op, value))
+        raise FilterError(f"{path}: custom fields take op 'eq', 'ne', 'in', 'contains' or 'not_null'")
+
+
+class FilterCache:
+    """Compiled saved filters by id, reused while updated_at is unchanged; LRU past `max_entries`."""
+
+    def __init__(self, compiler=None, max_entries=1024):
+        self.compiler = compiler or FilterCompiler()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, saved_filter):
+        """`saved_filter` is a saved_filters row: id, organization_id, filter_criteria, updated_at."""
+        key = saved_filter['id']
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == saved_filter['updated_at']:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        compiled = self.compiler.compile(saved_filter['filter_criteria'], saved_filter['organization_id'])
+        self._entries[key] = (saved_filter['updated_at'], compiled)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return compiled
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""Streaming guest import (section 1.4a): read, map, validate, load in chunks.
+
+Every stage is a generator, so a file is never held in memory: rows are
+read one at a time from CSV/TSV (encoding and delimiter sniffed from the
+first block) or .xlsx (guests.xlsx), mapped onto guest fields by header,
+validated, and handed to a sink in fixed-size chunks. Invalid rows go to
+a rejects file with the reason instead of stopping the import.
+
+Sinks:
+
+  CopySink  - PostgreSQL COPY into guests (and event_guests when an event
+              is given) through psycopg 3 or psycopg2, in one transaction
+  CsvSink   - the same rows as a COPY-ready CSV, for dry runs or psql \\copy
+"""
+
+import csv
+import io
+import os
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from itertools import islice
+
+from guests import xlsx
+from guests.records import match_columns, normalize_phone, split_full_name
+
+GUEST_COLUMNS = ('id', 'organization_id', 'first_name', 'last_name', 'email', 'company', 'job_title', 'phone')
+# VARCHAR sizes of the guests table
+FIELD_LIMITS = {'first_name': 100, 'last_name': 100, 'email': 255, 'company': 255, 'job_title': 255, 'phone': 50}
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s.]+$')
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = ',\t;|'
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class GuestImportError(Exception):
+    pass
+
+
+@dataclass
+class ImportStats:
+    """Counters matching the import_history columns."""
+    total_rows: int = 0
+    imported_rows: int = 0
+    failed_rows: int = 0
+    columns: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def sniff_encoding(sample):
+    """UTF-8 (with or without BOM) if the sample decodes as such, else Windows-1252."""
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A character cut off by the end of the sample is still UTF-8
+        if e.start < len(sample) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def sniff_delimiter(text):
+    header = text.split('\n', 1)[0]
+    counts = {delimiter: header.count(delimiter) for delimiter in DELIMITERS}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else ','
+
+
+def read_csv(path):
+    with open(path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    encoding = sniff_encoding(sample)
+    delimiter = sniff_delimiter(sample.decode(encoding, errors='replace'))
+    with open(path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+def read_table(path):
+    """Yield the rows of a CSV, TSV or .xlsx file, header first."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return xlsx.read_rows(path)
+    if extension == '.xls':
+        raise GuestImportError('.xls (Excel 97-2003) is not supported; save the sheet as .xlsx or CSV')
+    return read_csv(path)
+
+
+def validate(row, columns):
+    """Return (guest field values, None) for a valid row or (None, reason)."""
+    values = {name: row[index].strip() if index < len(row) else '' for name, index in columns.items()}
+    if 'full_name' in values:
+        values['first_name'], values['last_name'] = split_full_name(values.pop('full_name'))
+    if not values.get('first_name') and not values.get('last_name'):
+        return None, 'name is required'
+    email = values.get('email', '')
+    if not email:
+        return None, 'email is required'
+    if not EMAIL_RE.match(email):
+        return None, f'invalid email {email!r}'
+    phone = values.get('phone', '')
+    if phone and (not normalize_phone(phone) or sum(char.isdigit() for char in phone) > 15):
+        return None, f'invalid phone {phone!r}'
+    for name, limit in FIELD_LIMITS.items():
+        if len(values.get(name, '')) > limit:
+            return None, f'{name} is longer than {limit} characters'
+    return values, None
+
+
+class RejectWriter:
+    """Writes rejected rows (original columns + row number + reason); opened on first use."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self._file = None
+        self._writer = None
+
+    def write(self, number, row, reason):
+        if self.path is None:
+            return
+        if self._writer is None:
+            self._file = open(self.path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(list(self.header) + ['_row', '_error'])
+        self._writer.writerow(list(row) + [number, reason])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def guest_rows(rows, columns, organization_id, stats, rejects):
+    """Yield guests-table tuples for the valid rows; rejected rows go to `rejects`."""
+    for number, row in enumerate(rows, start=2):
+        if not any(value.strip() for value in row):
+            continue
+        stats.total_rows += 1
+        values, reason = validate(row, columns)
+        if reason:
+            stats.failed_rows += 1
+            rejects.write(number, row, reason)
+            continue
+        yield (str(uuid.uuid4()), organization_id, values.get('first_name', ''), values.get('last_name', ''),
+               values['email'], values.get('company', ''), values.get('job_title', ''), values.get('phone', ''))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_file(path, sink, organization_id='', rejects_path=None, chunk_size=5000, progress=None):
+    """Stream `path` into `sink`; returns ImportStats. The sink is rolled back on errors."""
+    started = time.perf_counter()
+    rows = read_table(path)
+    header = next(rows, None)
+    if not header:
+        raise GuestImportError(f'{path} is empty')
+    columns = {name: index for name, index in match_columns(header).items()
+               if name not in ('id', 'organization_id')}
+    if 'email' not in columns or not {'first_name', 'last_name', 'full_name'} & set(columns):
+        raise GuestImportError(f"could not find email and name columns in header {header!r}")
+    stats = ImportStats(columns={name: header[index] for name, index in columns.items()})
+    rejects = RejectWriter(rejects_path, header)
+    try:
+        for chunk in chunked(guest_rows(rows, columns, organization_id, stats, rejects), chunk_size):
+            sink.write(chunk)
+            stats.imported_rows += len(chunk)
+            if progress:
+                progress(stats)
+        sink.commit()
+    except BaseException:
+        sink.rollback()
+        raise
+    finally:
+        rejects.close()
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def copy_text(rows):
+    """Rows in COPY text format; empty strings become NULL."""
+    return ''.join('\t'.join(value.translate(COPY_ESCAPES) if value else '\\N' for value in row) + '\n'
+                   for row in rows)
+
+
+def driver_errors():
+    """Base error classes of the Postgres drivers loaded so far (neither derives from OSError)."""
+    return tuple(sys.modules[name].Error for name in ('psycopg', 'psycopg2') if name in sys.modules)
+
+
+def connect(dsn):
+    try:
+        import psycopg
+    except ImportError:
+        try:
+            import psycopg2 as psycopg
+        except ImportError:
+            raise GuestImportError('loading into Postgres needs psycopg ("pip install psycopg[binary]") '
+                                   'or psycopg2') from None
+    try:
+        return psycopg.connect(dsn)
+    except psycopg.Error as e:
+        raise GuestImportError(f'cannot connect to Postgres: {e}'.strip()) from None
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY string rows into `table` through psycopg 3 or psycopg2."""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    data = copy_text(rows)
+    if hasattr(cursor, 'copy'):
+        # psycopg 3
+        with cursor.copy(statement) as copy:
+            copy.write(data)
+    else:
+        cursor.copy_expert(statement, io.StringIO(data))
+
+
+class CopySink:
+    """COPYs chunks into guests (and event_guests) in one transaction; driver errors become GuestImportError."""
+
+    def __init__(self, connection, event_id=None):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.event_id = event_id
+        self._errors = driver_errors()
+
+    def write(self, rows):
+        try:
+            copy_rows(self.cursor, 'guests', GUEST_COLUMNS, rows)
+            if self.event_id:
+                copy_rows(self.cursor, 'event_guests', ('event_id', 'guest_id'),
+                          [(self.event_id, row[0]) for row in rows])
+        except self._errors as e:
+            raise GuestImportError(f'loading guests failed: {e}'.strip()) from None
+
+    def commit(self):
+        try:
+            self.connection.commit()
+        except self._errors as e:
+            raise GuestImportError(f'committing the import failed: {e}'.strip()) from None
+
+    def rollback(self):
+        try:
+            self.connection.rollback()
+        except self._errors:
+            pass    # the connection is gone; the server drops the transaction, and the first error is reported
+
+
+class CsvSink:
+    """Writes to a temp file and renames it into place on commit."""
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        self._file = open(self._tmp_path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(GUEST_COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def rollback(self):
+        self._file.close()
+        os.unlink(self._tmp_path)
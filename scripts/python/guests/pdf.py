@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Incremental PDF table reports with the standard library.
+
+Each page is written to the file as soon as it fills: its deflated
+content stream and page object go straight out, and only their byte
+offsets are kept for the cross-reference table. The page tree is
+written last. Text uses the standard Helvetica fonts with WinAnsi
+encoding, so nothing is embedded; characters outside Windows-1252 print
+as '?'.
+"""
+
+import time
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595      # A4 landscape, in points
+MARGIN = 36
+TITLE_SIZE = 14
+FONT_SIZE = 8
+ROW_HEIGHT = 12
+# Average Helvetica advance width as a fraction of the font size
+CHAR_WIDTH = 0.5
+# Literal-string escaping in one pass; control characters print as spaces
+PDF_TEXT = str.maketrans({'\\': '\\\\', '(': '\\(', ')': '\\)', **{code: ' ' for code in range(32)}})
+
+CATALOG, PAGES, FONT, BOLD_FONT, INFO = 1, 2, 3, 4, 5
+
+
+def pdf_string(text):
+    """`text` as a PDF literal string; page content is encoded as WinAnsi."""
+    return f'({text.translate(PDF_TEXT)})'
+
+
+def fit_limit(width, size=FONT_SIZE):
+    """Roughly how many characters fit in `width` points."""
+    return max(1, int(width / (size * CHAR_WIDTH)))
+
+
+def fit(text, limit):
+    """Cut `text` to `limit` characters, marking the cut with an ellipsis."""
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+class PdfWriter:
+    """Table report: a title line, a repeated header row and numbered pages.
+
+    open_sheet() starts a new section on a new page; rows are laid out in
+    fixed-width columns and cut to fit.
+    """
+
+    def __init__(self, path, title=''):
+        self.title = title
+        self._file = open(path, 'wb')
+        self._offsets = [0] * (INFO + 1)
+        self._pages = []
+        self._content = None
+        self._section = ''
+        self._columns = []
+        self._moves = []
+        self._limits = []
+        self._y = 0
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        self._object(BOLD_FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold '
+                                b'/Encoding /WinAnsiEncoding >>')
+        created = time.strftime('D:%Y%m%d%H%M%S')
+        info = f'<< /Title {pdf_string(title)} /Producer (scripts/python/export_guests.py) /CreationDate ({created}) >>'
+        self._object(INFO, info.encode('cp1252', errors='replace'))
+
+    def _write(self, data):
+        self._file.write(data)
+
+    def _object(self, number, body):
+        self._offsets[number] = self._file.tell()
+        self._write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def _new_object(self):
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def _text(self, x, y, text, bold=False, size=FONT_SIZE):
+        self._content.append(f'BT /F{2 if bold else 1} {size} Tf {x:.1f} {y:.1f} Td {pdf_string(text)} Tj ET')
+
+    def _start_page(self):
+        self._content = []
+        top = PAGE_HEIGHT - MARGIN
+        heading = ' - '.join(part for part in (self.title, self._section) if part)
+        self._text(MARGIN, top - TITLE_SIZE, fit(heading, fit_limit(PAGE_WIDTH - 2 * MARGIN, TITLE_SIZE)),
+                   bold=True, size=TITLE_SIZE)
+        self._text(PAGE_WIDTH - MARGIN - 40, MARGIN - 14, f'Page {len(self._pages) + 1}')
+        self._y = top - TITLE_SIZE - 2 * ROW_HEIGHT
+        if self._columns:
+            self._row(self._columns, bold=True)
+            line_y = self._y + ROW_HEIGHT - 3
+            self._content.append(f'0.5 w {MARGIN} {line_y:.1f} m {PAGE_WIDTH - MARGIN} {line_y:.1f} l S')
+
+    def _finish_page(self):
+        if self._content is None:
+            return
+        data = zlib.compress('\n'.join(self._content).encode('cp1252', errors='replace'))
+        contents = self._new_object()
+        self._object(contents, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(data) + data
+                     + b'\nendstream')
+        page = self._new_object()
+        self._object(page, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+                           b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>'
+                     % (PAGES, PAGE_WIDTH, PAGE_HEIGHT, FONT, BOLD_FONT, contents))
+        self._pages.append(page)
+        self._content = None
+
+    def _row(self, values, bold=False):
+        # One text object per row; each cell moves right by the previous column's width
+        parts = [f'BT /F{2 if bold else 1} {FONT_SIZE} Tf {MARGIN} {self._y:.1f} Td']
+        for move, limit, value in zip(self._moves, self._limits, values):
+            if value is None or value == '':
+                parts.append(move)
+            else:
+                text = str(value)
+                if len(text) > limit:
+                    text = text[:limit - 1] + '…'
+                if not text.isprintable() or '(' in text or ')' in text or '\\' in text:
+                    text = text.translate(PDF_TEXT)
+                parts.append(f'{move}({text}) Tj')
+        parts.append('ET')
+        self._content.append(' '.join(parts))
+        self._y -= ROW_HEIGHT
+
+    def open_sheet(self, name, columns, widths=None):
+        """Start a section; `widths` are relative column widths (default equal)."""
+        self._finish_page()
+        self._section = name
+        self._columns = list(columns)
+        widths = list(widths or [1.0] * len(columns))
+        scale = (PAGE_WIDTH - 2 * MARGIN) / (sum(widths) or 1)
+        self._moves = [''] + [f'{width * scale:.1f} 0 Td' for width in widths[:-1]]
+        self._limits = [fit_limit(width * scale - 4) for width in widths]
+        self._start_page()
+
+    def write_row(self, values):
+        if self._content is None:
+            self._start_page()
+        elif self._y < MARGIN:
+            self._finish_page()
+            self._start_page()
+        self._row(values)
+
+    def close(self):
+        if self._content is None and not self._pages:
+            self._start_page()
+        self._finish_page()
+        self._object(CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES)
+        kids = b' '.join(b'%d 0 R' % page for page in self._pages)
+        self._object(PAGES, b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(self._pages))
+        xref = self._file.tell()
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self._offsets))
+        self._write(b''.join(b'%010d 00000 n \n' % offset for offset in self._offsets[1:]))
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (len(self._offsets), CATALOG, INFO, xref))
+        self._file.close()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Guest records as they appear in exports and in the guests table."""
+
+import csv
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from guests.distance import levenshtein_batch, similarity
+
+FIELDS = ['id', 'organization_id', 'first_name', 'last_name', 'email', 'company', 'job_title', 'phone']
+
+# Header spellings seen in attendee exports, after normalize_header().
+# full_name is not a column of its own; it is split into first/last name.
+FIELD_ALIASES = {
+    'id': ('id', 'guest id', 'guestid', 'uuid'),
+    'organization_id': ('organization id', 'org id', 'organisation id'),
+    'first_name': ('first name', 'firstname', 'given name', 'first'),
+    'last_name': ('last name', 'lastname', 'surname', 'family name', 'last'),
+    'full_name': ('name', 'full name', 'guest name', 'attendee name', 'contact name', 'attendee'),
+    'email': ('email', 'e mail', 'email address', 'contact email', 'mail'),
+    'company': ('company', 'company name', 'organization', 'organisation', 'employer', 'business', 'account'),
+    'job_title': ('job title', 'title', 'position', 'role'),
+    'phone': ('phone', 'phone number', 'mobile', 'mobile phone', 'contact number', 'telephone', 'tel', 'cell'),
+}
+# Unknown headers this similar to an alias (1 - edit distance / length) still match
+FUZZY_HEADER_THRESHOLD = 0.7
+
+COMPANY_SUFFIXES = frozenset(['inc', 'incorporated', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co',
+                              'company', 'gmbh', 'ag', 'plc', 'sa', 'bv', 'pty', 'the'])
+GMAIL_DOMAINS = ('gmail.com', 'googlemail.com')
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+NON_DIGIT_RE = re.compile(r'[^0-9]+')
+
+
+@dataclass
+class Guest:
+    id: str
+    organization_id: str = ''
+    first_name: str = ''
+    last_name: str = ''
+    email: str = ''
+    company: str = ''
+    job_title: str = ''
+    phone: str = ''
+
+
+def normalize_header(name):
+    return ' '.join(NON_ALNUM_RE.split(name.strip().lower())).strip()
+
+
+def match_columns(header):
+    """Map guest field -> column index for the header names that can be recognised.
+
+    Exact alias matches win; the remaining columns are matched to the
+    closest alias if they are similar enough ("Emial Adress", "Compnay").
+    """
+    lookup = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+    lookup.update({normalize_header(field): field for field in FIELDS})
+    columns = {}
+    unmatched = []
+    for index, name in enumerate(header):
+        normalized = normalize_header(name)
+        field = lookup.get(normalized)
+        if field and field not in columns:
+            columns[field] = index
+        elif normalized and not field:
+            unmatched.append((index, normalized))
+    aliases = list(lookup)
+    for index, normalized in unmatched:
+        distances = levenshtein_batch(normalized, aliases)
+        score, alias = max((similarity(distance, normalized, alias), alias)
+                           for distance, alias in zip(distances, aliases))
+        field = lookup[alias]
+        if score >= FUZZY_HEADER_THRESHOLD and field not in columns:
+            columns[field] = index
+    if 'first_name' in columns or 'last_name' in columns:
+        columns.pop('full_name', None)
+    return columns
+
+
+def split_full_name(value):
+    """'Ada Lovelace' / 'Lovelace, Ada' -> ('Ada', 'Lovelace')."""
+    value = ' '.join(value.split())
+    if ',' in value:
+        last, _, first = value.partition(',')
+        return first.strip(), last.strip()
+    first, _, last = value.rpartition(' ')
+    return (first, last) if first else (last, '')
+
+
+def normalize_text(value):
+    """Lowercase ASCII words: accents folded, punctuation dropped."""
+    if value.isascii():
+        folded = value.lower()
+    else:
+        folded = unicodedata.normalize('NFKD', value)
+        folded = ''.join(char for char in folded if not unicodedata.combining(char)).lower()
+    return ' '.join(NON_ALNUM_RE.split(folded)).strip()
+
+
+def normalize_company(value):
+    return ' '.join(word for word in normalize_text(value).split() if word not in COMPANY_SUFFIXES)
+
+
+def normalize_email(value):
+    email = value.strip().lower()
+    local, at, domain = email.rpartition('@')
+    if not at or not local or '.' not in domain:
+        return ''
+    if domain in GMAIL_DOMAINS:
+        # Gmail ignores dots and +tags in the local part
+        local = local.split('+', 1)[0].replace('.', '')
+        domain = GMAIL_DOMAINS[0]
+    return f'{local}@{domain}'
+
+
+def normalize_phone(value):
+    """Compare on the last ten digits, so +1 / 001 / no prefix all match; '' if too short."""
+    digits = NON_DIGIT_RE.sub('', value)
+    if digits.startswith('00'):
+        digits = digits[2:]
+    return digits[-10:] if len(digits) >= 7 else ''
+
+
+def read_guests(path, organization_id=''):
+    """Yield Guest records from a CSV export; rows without an id get 'row-<n>'."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = match_columns(header)
+        for number, row in enumerate(reader, start=2):
+            values = {field: row[index].strip() for field, index in columns.items() if index < len(row)}
+            if 'full_name' in values:
+                values['first_name'], values['last_name'] = split_full_name(values.pop('full_name'))
+            values.setdefault('id', f'row-{number}')
+            values['id'] = values['id'] or f'row-{number}'
+            values['organization_id'] = values.get('organization_id') or organization_id
+            yield Guest(**values)
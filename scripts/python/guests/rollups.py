@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""Cross-event guest history rollups (section 2.12), maintained as changes arrive.
+
+GuestRollups folds event_guests rows into per-guest and per-organization
+aggregates: invitations, RSVP outcomes, check-ins, first/last event, and
+the importance trend (least-squares slope of score over event date).
+Each fold subtracts the row's previous contribution and adds the new
+one, so an upsert or delete costs a few array updates however long the
+history is, and dashboard queries read one slot per guest or
+organization.
+
+Aggregates live in typed arrays indexed by guest, organization and event
+ordinals (columnar, 8 bytes or less per value). Scores are held in
+hundredths and dates in days, so all sums are exact integers and an
+incrementally maintained rollup is identical to a full rebuild. The last
+state of every row is kept too, in the same form, since that is what a
+later change has to subtract.
+"""
+
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import date, datetime
+
+MAGIC = b'GROLLUP\x00'
+VERSION = 1
+FILE_HEADER = struct.Struct('<8sII')     # magic, version, directory length
+NO_DATE = -(1 << 31)
+NO_SCORE = -1
+FREE = 255                               # status of an unused row slot
+RSVP_STATUSES = ('pending', 'confirmed', 'declined', 'maybe')
+OTHER_STATUS = len(RSVP_STATUSES)        # anything else counts as a response
+ATTENDED_STATUSES = ('checked_in', 'attended')
+EPOCH = date(1970, 1, 1).toordinal()
+
+# Counters kept per guest and summed per organization
+# (rated/score_total: rows with a score; the trend_ sums: rows with a score and an event date)
+COUNTS = ('invited', 'pending', 'confirmed', 'declined', 'attended', 'confirmed_attended', 'rated', 'score_total',
+          'trend_rows', 'trend_days', 'trend_scores', 'trend_day_scores', 'trend_day_days')
+ROW_COLUMNS = (('row_guest', 'I'), ('row_event', 'I'), ('row_status', 'B'), ('row_attended', 'B'),
+               ('row_score', 'i'), ('row_day', 'i'), ('row_next', 'i'))
+
+
+class RollupError(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def parse_day(value):
+    """Days since 1970-01-01 for a date, datetime or ISO string; NO_DATE when empty."""
+    if value in (None, ''):
+        return NO_DATE
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        try:
+            value = datetime.fromisoformat(str(value).replace('Z', '+00:00')).date()
+        except ValueError:
+            raise RollupError(f'invalid event date {value!r}') from None
+    return value.toordinal() - EPOCH
+
+
+def format_day(day):
+    return None if day == NO_DATE else date.fromordinal(day + EPOCH).isoformat()
+
+
+def parse_score(value):
+    """importance_score DECIMAL(5,2) in hundredths; NO_SCORE when empty."""
+    if value in (None, ''):
+        return NO_SCORE
+    try:
+        score = round(float(value) * 100)
+    except (TypeError, ValueError):
+        raise RollupError(f'invalid importance score {value!r}') from None
+    if not 0 <= score <= 99999:
+        raise RollupError(f'importance score {value!r} is out of range')
+    return score
+
+
+def ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+@dataclass
+class EventGuest:
+    """The state of one event_guests row (joined with its event's organization and date)."""
+    event_id: str
+    guest_id: str
+    organization_id: str = ''
+    rsvp_status: str = 'pending'
+    check_in_status: str = 'not_checked_in'
+    importance_score: object = None
+    event_date: object = None
+
+    @classmethod
+    def from_row(cls, row):
+        missing = [name for name in ('event_id', 'guest_id') if not row.get(name)]
+        if missing:
+            raise RollupError(f"row without {' and '.join(missing)}: {row!r}"[:200])
+        return cls(row['event_id'], row['guest_id'], row.get('organization_id') or '',
+                   row.get('rsvp_status') or 'pending', row.get('check_in_status') or 'not_checked_in',
+                   row.get('importance_score'), row.get('event_date'))
+
+
+class Ordinals:
+    """Dense ordinals for ids, in first-seen order."""
+
+    def __init__(self, ids=()):
+        self.ids = list(ids)
+        self.index = {value: ordinal for ordinal, value in enumerate(self.ids)}
+
+    def get(self, value):
+        return self.index.get(value)
+
+    def add(self, value):
+        ordinal = self.index.get(value)
+        if ordinal is None:
+            ordinal = self.index[value] = len(self.ids)
+            self.ids.append(value)
+        return ordinal
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class GuestRollups:
+    def __init__(self):
+        self.guests = Ordinals()
+        self.organizations = Ordinals()
+        self.events = Ordinals()
+        # Per guest
+        self.guest_org = array('I')
+        self.guest_head = array('i')        # first row slot of the guest, -1 if none
+        self.first_day = array('i')
+        self.last_day = array('i')
+        self.guest_counts = {name: array('q') for name in COUNTS}
+        # Per organization
+        self.org_guests = array('q')        # guests with at least one invitation
+        self.org_returning = array('q')     # guests with two or more
+        self.org_events = array('q')        # events with at least one guest
+        self.org_counts = {name: array('q') for name in COUNTS}
+        # Per event
+        self.event_org = array('I')
+        self.event_rows = array('q')
+        # Per event_guests row: its last folded state
+        for name, typecode in ROW_COLUMNS:
+            setattr(self, name, array(typecode))
+        self._rows = None                   # (guest, event) -> row slot, built on first use
+        self._free = None                   # unused row slots
+        self._bind_counts()
+
+    def _bind_counts(self):
+        self._count_columns = [(self.guest_counts[name], self.org_counts[name]) for name in COUNTS]
+
+    # -- ordinals
+
+    def _guest(self, guest_id, org):
+        ordinal = self.guests.add(guest_id)
+        if ordinal == len(self.guest_org):
+            self.guest_org.append(org)
+            self.guest_head.append(-1)
+            self.first_day.append(NO_DATE)
+            self.last_day.append(NO_DATE)
+            for column in self.guest_counts.values():
+                column.append(0)
+        return ordinal
+
+    def _organization(self, organization_id):
+        ordinal = self.organizations.add(organization_id)
+        if ordinal == len(self.org_guests):
+            for column in (self.org_guests, self.org_returning, self.org_events, *self.org_counts.values()):
+                column.append(0)
+        return ordinal
+
+    def _event(self, event_id, org):
+        ordinal = self.events.add(event_id)
+        if ordinal == len(self.event_org):
+            self.event_org.append(org)
+            self.event_rows.append(0)
+        return ordinal
+
+    def _row_map(self):
+        if self._rows is None:
+            self._rows = {}
+            self._free = []
+            for slot, status in enumerate(self.row_status):
+                if status == FREE:
+                    self._free.append(slot)
+                else:
+                    self._rows[self.row_guest[slot], self.row_event[slot]] = slot
+        return self._rows
+
+    # -- folding
+
+    def _apply(self, slot, sign):
+        """Add (sign 1) or subtract (sign -1) one row's contribution to its guest, organization and event."""
+        guest, event = self.row_guest[slot], self.row_event[slot]
+        org = self.guest_org[guest]
+        status, attended = self.row_status[slot], self.row_attended[slot]
+        score, day = self.row_score[slot], self.row_day[slot]
+        # In COUNTS order; the trailing score and trend terms are left off when they do not apply
+        deltas = (1, status == 0, status == 1, status == 2, attended, attended and status == 1)
+        if score != NO_SCORE:
+            deltas += (1, score)
+            if day != NO_DATE:
+                deltas += (1, day, score, day * score, day * day)
+        for (guest_column, org_column), value in zip(self._count_columns, deltas):
+            if value:
+                guest_column[guest] += sign * value
+                org_column[org] += sign * value
+
+        invited = self.guest_counts['invited'][guest]
+        if sign > 0 and invited in (1, 2):
+            (self.org_guests if invited == 1 else self.org_returning)[org] += 1
+        elif sign < 0 and invited in (0, 1):
+            (self.org_guests if invited == 0 else self.org_returning)[org] -= 1
+        self.event_rows[event] += sign
+        if self.event_rows[event] == (1 if sign > 0 else 0):
+            self.org_events[self.event_org[event]] += sign
+
+    def _refresh_days(self, guest):
+        first = last = NO_DATE
+        slot = self.guest_head[guest]
+        while slot != -1:
+            day = self.row_day[slot]
+            if day != NO_DATE:
+                first = day if first == NO_DATE else min(first, day)
+                last = max(last, day)
+            slot = self.row_next[slot]
+        self.first_day[guest], self.last_day[guest] = first, last
+
+    def fold(self, change):
+        """Apply the new state of one event_guests row (an EventGuest or a mapping)."""
+        if not isinstance(change, EventGuest):
+            change = EventGuest.from_row(change)
+        status = change.rsvp_status.strip().lower()
+        status = RSVP_STATUSES.index(status) if status in RSVP_STATUSES else OTHER_STATUS
+        attended = change.check_in_status.strip().lower() in ATTENDED_STATUSES
+        score, day = parse_score(change.importance_score), parse_day(change.event_date)
+
+        known = self.guests.get(change.guest_id)
+        if known is None and not change.organization_id:
+            raise RollupError(f'first row for guest {change.guest_id} has no organization_id')
+        org = self._organization(change.organization_id) if known is None else self.guest_org[known]
+        guest = self._guest(change.guest_id, org)
+        event = self._event(change.event_id, org)
+        rows = self._row_map()
+        slot = rows.get((guest, event))
+        if slot is None:
+            slot = self._new_row(guest, event)
+            refresh = False
+        else:
+            old_day = self.row_day[slot]
+            self._apply(slot, -1)
+            refresh = old_day != day and old_day in (self.first_day[guest], self.last_day[guest])
+        self.row_status[slot], self.row_attended[slot] = status, attended
+        self.row_score[slot], self.row_day[slot] = score, day
+        self._apply(slot, 1)
+        if refresh:
+            self._refresh_days(guest)
+        elif day != NO_DATE:
+            if self.first_day[guest] == NO_DATE or day < self.first_day[guest]:
+                self.first_day[guest] = day
+            if day > self.last_day[guest]:
+                self.last_day[guest] = day
+
+    def _new_row(self, guest, event):
+        if self._free:
+            slot = self._free.pop()
+            self.row_guest[slot], self.row_event[slot] = guest, event
+        else:
+            slot = len(self.row_guest)
+            for name, _ in ROW_COLUMNS:
+                getattr(self, name).append(0)
+            self.row_guest[slot], self.row_event[slot] = guest, event
+        self.row_next[slot] = self.guest_head[guest]
+        self.guest_head[guest] = slot
+        self._rows[guest, event] = slot
+        return slot
+
+    def remove(self, event_id, guest_id):
+        """Fold the deletion of an event_guests row; unknown rows are ignored."""
+        guest, event = self.guests.get(guest_id), self.events.get(event_id)
+        slot = self._row_map().get((guest, event))
+        if slot is None:
+            return False
+        self._apply(slot, -1)
+        del self._rows[guest, event]
+        # Unlink from the guest's rows
+        previous, current = -1, self.guest_head[guest]
+        while current != slot:
+            previous, current = current, self.row_next[current]
+        if previous == -1:
+            self.guest_head[guest] = self.row_next[slot]
+        else:
+            self.row_next[previous] = self.row_next[slot]
+        day = self.row_day[slot]
+        self.row_status[slot], self.row_next[slot] = FREE, -1
+        self._free.append(slot)
+        if day != NO_DATE and day in (self.first_day[guest], self.last_day[guest]):
+            self._refresh_days(guest)
+        return True
+
+    def apply(self, change):
+        """A change record: {"op": "upsert" | "delete", ...event_guests columns}."""
+        op = change.get('op', 'upsert')
+        if op == 'delete':
+            return self.remove(change.get('event_id'), change.get('guest_id'))
+        if op not in ('upsert', 'insert', 'update'):
+            raise RollupError(f'unknown change op {op!r}')
+        self.fold(change)
+        return True
+
+    @classmethod
+    def rebuild(cls, rows):
+        """Fold a full event_guests export into fresh rollups (backfills, or checking incremental state)."""
+        rollups = cls()
+        for row in rows:
+            rollups.fold(row)
+        return rollups
+
+    # -- queries
+
+    @staticmethod
+    def _summary(counts, index):
+        invited = counts['invited'][index]
+        pending, confirmed = counts['pending'][index], counts['confirmed'][index]
+        rated, points = counts['trend_rows'][index], counts['trend_scores'][index]
+        trend = None
+        if rated >= 2:
+            days = counts['trend_days'][index]
+            denominator = rated * counts['trend_day_days'][index] - days * days
+            if denominator:
+                # Least-squares slope in hundredths per day -> points per 30 days
+                slope = (rated * counts['trend_day_scores'][index] - days * points) / denominator
+                trend = round(slope * 30 / 100, 3)
+        return {
+            'invitations': invited,
+            'confirmed': confirmed,
+            'declined': counts['declined'][index],
+            'pending': pending,
+            'attended': counts['attended'][index],
+            'rsvp_rate': ratio(invited - pending, invited),
+            'confirmation_rate': ratio(confirmed, invited),
+            'attendance_rate': ratio(counts['attended'][index], invited),
+            'show_rate': ratio(counts['confirmed_attended'][index], confirmed),
+            'mean_importance': round(counts['score_total'][index] / counts['rated'][index] / 100, 2)
+            if counts['rated'][index] else None,
+            'importance_trend_per_30_days': trend,
+        }
+
+    def guest(self, guest_id):
+        """History summary for one guest, or None if it has no rows."""
+        guest = self.guests.get(guest_id)
+        if guest is None or not self.guest_counts['invited'][guest]:
+            return None
+        summary = {'guest_id': guest_id, 'organization_id': self.organizations.ids[self.guest_org[guest]]}
+        summary.update(self._summary(self.guest_counts, guest))
+        summary['first_event'] = format_day(self.first_day[guest])
+        summary['last_event'] = format_day(self.last_day[guest])
+        return summary
+
+    def organization(self, organization_id):
+        org = self.organizations.get(organization_id)
+        if org is None:
+            return None
+        summary = {'organization_id': organization_id, 'guests': self.org_guests[org],
+                   'returning_guests': self.org_returning[org],
+                   'retention_rate': ratio(self.org_returning[org], self.org_guests[org]),
+                   'events': self.org_events[org]}
+        summary.update(self._summary(self.org_counts, org))
+        return summary
+
+    def top_guests(self, organization_id, limit=10, by='attended'):
+        """The organization's guests with the highest `by` count (most frequent guests, by default)."""
+        if by not in COUNTS:
+            raise RollupError(f"unknown metric {by!r}; use one of {', '.join(COUNTS)}")
+        org = self.organizations.get(organization_id)
+        if org is None:
+            return []
+        column = self.guest_counts[by]
+        ranked = sorted((guest for guest, owner in enumerate(self.guest_org) if owner == org and column[guest]),
+                        key=lambda guest: -column[guest])
+        return [(self.guests.ids[guest], column[guest]) for guest in ranked[:limit]]
+
+    def columns(self):
+        """Every aggregate column by name (for comparing two rollups)."""
+        out = {'guest_org': self.guest_org, 'first_day': self.first_day, 'last_day': self.last_day,
+               'org_guests': self.org_guests, 'org_returning': self.org_returning, 'org_events': self.org_events,
+               'event_rows': self.event_rows}
+        out.update({f'guest_{name}': column for name, column in self.guest_counts.items()})
+        out.update({f'org_{name}': column for name, column in self.org_counts.items()})
+        return out
+
+    # -- snapshots
+
+    def _arrays(self):
+        out = dict(self.columns())
+        out.update({'guest_head': self.guest_head, 'event_org': self.event_org})
+        out.update({name: getattr(self, name) for name, _ in ROW_COLUMNS})
+        return out
+
+    def save(self, path):
+        """Write the rollups (and row state) atomically as raw little-endian columns."""
+        arrays = self._arrays()
+        offset = 0
+        layout = {}
+        for name, column in arrays.items():
+            layout[name] = [column.typecode, offset, len(column)]
+            offset += len(column) * column.itemsize
+        directory = {'guests': self.guests.ids, 'organizations': self.organizations.ids,
+                     'events': self.events.ids, 'columns': layout, 'byteorder': 'little'}
+        header = json.dumps(directory, separators=(',', ':')).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, len(header)))
+                f.write(header)
+                for column in arrays.values():
+                    if sys.byteorder != 'little':
+                        column = array(column.typecode, column)
+                        column.byteswap()
+                    column.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            magic, version, length = FILE_HEADER.unpack_from(data, 0)
+            if magic != MAGIC:
+                raise RollupError(f'{path} is not a rollup snapshot')
+            if version != VERSION:
+                raise RollupError(f'{path} has rollup format {version}; rebuild it')
+            directory = json.loads(data[FILE_HEADER.size:FILE_HEADER.size + length].decode('utf-8'))
+            base = FILE_HEADER.size + length
+            rollups = cls()
+            rollups.guests = Ordinals(directory['guests'])
+            rollups.organizations = Ordinals(directory['organizations'])
+            rollups.events = Ordinals(directory['events'])
+            columns = {}
+            for name, (typecode, offset, count) in directory['columns'].items():
+                column = array(typecode)
+                column.frombytes(data[base + offset:base + offset + count * column.itemsize])
+                if len(column) != count:
+                    raise RollupError(f'{path} is truncated')
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                columns[name] = column
+        except (struct.error, ValueError, KeyError, TypeError) as e:
+            raise RollupError(f'{path} is damaged: {e}') from None
+        for name, column in columns.items():
+            if name.startswith('guest_') and name[len('guest_'):] in COUNTS:
+                rollups.guest_counts[name[len('guest_'):]] = column
+            elif name.startswith('org_') and name[len('org_'):] in COUNTS:
+                rollups.org_counts[name[len('org_'):]] = column
+            else:
+                setattr(rollups, name, column)
+        rollups._bind_counts()
+        return rollups
+
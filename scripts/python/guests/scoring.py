@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""Batch importance scoring with a content-hash cache (sections 2.2 and 2.3).
+
+A guest's cache key is the sha256 of the fields the model sees, the
+event context and PROMPT_VERSION (guest_metadata.importance_data_hash),
+so a score is reused until the guest, the event or the prompt changes.
+ScoreCache keeps scores in memory with LRU and TTL eviction and journals
+new scores to a JSON-lines file as they arrive. That journal is the
+checkpoint: an interrupted run loses at most `checkpoint_every` scores,
+and re-running the batch resumes where it stopped.
+
+BatchScorer sends only the cache misses to the backend, with one call
+per distinct hash. Calls run at bounded concurrency behind a token
+bucket (requests, and optionally prompt tokens, per minute) and are
+retried with exponential backoff and jitter; a Retry-After from the API
+pauses the whole bucket. Backends implement `async score(fields,
+context)`: OpenAIBackend talks to the chat completions API with urllib,
+and StubBackend scores locally for tests and dry runs.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from guests.importer import read_table
+from guests.records import match_columns, normalize_header, split_full_name
+
+# Bump when the prompt or response schema changes, to invalidate cached scores
+PROMPT_VERSION = 1
+SCORING_FIELDS = ('first_name', 'last_name', 'email', 'company', 'job_title', 'notes', 'tags', 'vip_status')
+FACTORS = ('jobTitle', 'companySize', 'industryInfluence', 'relationship', 'eventContext')
+DEFAULT_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache',
+                             'importance-scores.jsonl')
+DEFAULT_TTL = 30 * 24 * 3600
+
+SYSTEM_PROMPT = """You rate how important a guest is to an event organizer, from 0 to 100.
+Weigh job title and seniority, company size and standing, industry influence,
+the guest's relationship to the organizer (from the notes), tags, VIP status
+and the event context. VIP guests score at least 80. Give each factor a
+0-100 rating and explain the overall score in one or two sentences."""
+
+RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'score': {'type': 'number'},
+        'reasoning': {'type': 'string'},
+        'factors': {'type': 'object', 'properties': {name: {'type': 'number'} for name in FACTORS},
+                    'required': list(FACTORS), 'additionalProperties': False},
+    },
+    'required': ['score', 'reasoning', 'factors'],
+    'additionalProperties': False,
+}
+
+
+class ScoringError(Exception):
+    pass
+
+
+class RetryableError(ScoringError):
+    """Rate limits, server errors and timeouts; `retry_after` is in seconds."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Score:
+    """One guest_metadata scoring result."""
+    score: float
+    reasoning: str
+    factors: dict
+    calculated_at: float
+    data_hash: str = ''
+
+
+def data_hash(fields, context=''):
+    """importance_data_hash: sha256 of the scored fields, event context and prompt version."""
+    payload = {name: fields.get(name, '') for name in SCORING_FIELDS}
+    payload['_context'] = context
+    payload['_prompt'] = PROMPT_VERSION
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def user_prompt(fields, context=''):
+    lines = [f'{name}: {fields[name]}' for name in SCORING_FIELDS if fields.get(name)]
+    if context:
+        lines.append(f'event context: {context}')
+    return 'Guest:\n' + '\n'.join(lines)
+
+
+def parse_result(result):
+    """Validate a model response into (score, reasoning, factors)."""
+    try:
+        score = min(100.0, max(0.0, float(result['score'])))
+        factors = {name: min(100.0, max(0.0, float(value))) for name, value in result.get('factors', {}).items()}
+        return score, str(result.get('reasoning', '')), factors
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ScoringError(f'malformed scoring response {result!r}') from e
+
+
+def read_scoring_input(path):
+    """Yield (guest id, scoring fields) from a guest CSV/TSV/XLSX file."""
+    rows = read_table(path)
+    header = next(rows, None)
+    if not header:
+        raise ScoringError(f'{path} is empty')
+    columns = match_columns(header)
+    for index, name in enumerate(header):
+        columns.setdefault(normalize_header(name).replace(' ', '_'), index)
+    for number, row in enumerate(rows, start=2):
+        values = {name: row[index].strip() for name, index in columns.items() if index < len(row)}
+        if not any(values.values()):
+            continue
+        if 'full_name' in values and not (values.get('first_name') or values.get('last_name')):
+            values['first_name'], values['last_name'] = split_full_name(values['full_name'])
+        yield values.get('id') or f'row-{number}', {name: values.get(name, '') for name in SCORING_FIELDS}
+
+
+def _journal_line(score):
+    return json.dumps({'hash': score.data_hash, 'score': score.score, 'reasoning': score.reasoning,
+                       'factors': score.factors, 'calculated_at': score.calculated_at}, ensure_ascii=False) + '\n'
+
+
+def _seconds(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ScoreCache:
+    """Scores by data hash, evicted least-recently-used past `max_entries` or after `ttl` seconds."""
+
+    def __init__(self, path=DEFAULT_CACHE, max_entries=200_000, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._pending = []
+        self._journal_lines = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._journal_lines += 1
+                try:
+                    entry = json.loads(line)
+                    score = Score(entry['score'], entry['reasoning'], entry['factors'], entry['calculated_at'],
+                                  entry['hash'])
+                except (ValueError, KeyError, TypeError):
+                    # A line cut short by an interrupted write
+                    continue
+                self._entries[score.data_hash] = score
+                self._entries.move_to_end(score.data_hash)
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key, now=None):
+        score = self._entries.get(key)
+        if score is None:
+            return None
+        if self.ttl and (now or time.time()) - score.calculated_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return score
+
+    def put(self, score):
+        self._entries[score.data_hash] = score
+        self._entries.move_to_end(score.data_hash)
+        self._pending.append(score)
+        self._evict()
+
+    def checkpoint(self):
+        """Append scores added since the last checkpoint to the journal."""
+        if not self.path or not self._pending:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for score in self._pending:
+                f.write(_journal_line(score))
+        self._journal_lines += len(self._pending)
+        self._pending.clear()
+
+    def compact(self):
+        """Rewrite the journal with the live entries, in LRU order, once it is mostly stale."""
+        self.checkpoint()
+        if not self.path or self._journal_lines <= 2 * len(self._entries) + 1000:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for score in self._entries.values():
+                f.write(_journal_line(score))
+        os.replace(tmp_path, self.path)
+        self._journal_lines = len(self._entries)
+
+
+class TokenBucket:
+    """`rate` tokens per second with bursts up to `capacity`; waiters are served in order."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = None
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Hold every caller for `seconds` (a Retry-After from the API)."""
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+    async def acquire(self, tokens=1.0):
+        tokens = min(tokens, self.capacity)
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+@dataclass
+class BatchStats:
+    guests: int = 0
+    unique: int = 0
+    cached: int = 0
+    scored: int = 0
+    calls: int = 0
+    retries: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    errors: dict = field(default_factory=dict)
+
+
+class BatchScorer:
+    def __init__(self, backend, cache, concurrency=8, requests_per_minute=500, tokens_per_minute=None,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, checkpoint_every=50, progress=None):
+        self.backend = backend
+        self.cache = cache
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint_every = checkpoint_every
+        self.progress = progress
+
+    async def score(self, guests, context=''):
+        """Score (guest id, fields) pairs; returns ({guest id: Score or None}, BatchStats)."""
+        started = time.perf_counter()
+        stats = BatchStats()
+        members = {}        # data hash -> guest ids
+        inputs = {}         # data hash -> fields
+        for guest_id, fields in guests:
+            stats.guests += 1
+            key = data_hash(fields, context)
+            members.setdefault(key, []).append(guest_id)
+            inputs.setdefault(key, fields)
+        stats.unique = len(members)
+
+        scores = {}
+        queue = asyncio.Queue()
+        for key in members:
+            cached = self.cache.get(key)
+            if cached is not None:
+                scores[key] = cached
+                stats.cached += 1
+            else:
+                queue.put_nowait(key)
+
+        if not queue.empty():
+            self._requests = TokenBucket(self.requests_per_minute / 60, capacity=max(1, self.concurrency))
+            self._tokens = TokenBucket(self.tokens_per_minute / 60) if self.tokens_per_minute else None
+            workers = [asyncio.create_task(self._worker(queue, inputs, context, scores, stats))
+                       for _ in range(min(self.concurrency, queue.qsize()))]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                # Whatever finished is kept, so a re-run resumes from here
+                self.cache.checkpoint()
+
+        results = {guest_id: scores.get(key) for key, ids in members.items() for guest_id in ids}
+        stats.seconds = time.perf_counter() - started
+        return results, stats
+
+    async def _worker(self, queue, inputs, context, scores, stats):
+        while not queue.empty():
+            key = queue.get_nowait()
+            try:
+                score, reasoning, factors = await self._call(inputs[key], context, stats)
+            except ScoringError as e:
+                stats.failed += 1
+                stats.errors[key] = str(e)
+                continue
+            result = Score(score, reasoning, factors, time.time(), key)
+            scores[key] = result
+            self.cache.put(result)
+            stats.scored += 1
+            if stats.scored % self.checkpoint_every == 0:
+                self.cache.checkpoint()
+            if self.progress:
+                self.progress(stats, len(scores), len(inputs))
+
+    async def _call(self, fields, context, stats):
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire()
+            if self._tokens is not None:
+                # About four characters per token
+                await self._tokens.acquire((len(SYSTEM_PROMPT) + len(user_prompt(fields, context))) / 4)
+            stats.calls += 1
+            try:
+                return parse_result(await self.backend.score(fields, context))
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    raise
+                stats.retries += 1
+                if e.retry_after:
+                    delay = e.retry_after
+                    self._requests.pause(delay)
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+
+
+class StubBackend:
+    """Deterministic local scores from the job title and VIP flag; for tests and dry runs."""
+
+    SENIORITY = (('chief', 90), ('ceo', 90), ('founder', 85), ('president', 85), ('vp', 75), ('vice', 75),
+                 ('director', 65), ('head', 65), ('manager', 50), ('lead', 45))
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    async def score(self, fields, context=''):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise RetryableError('stub rate limit')
+        title = fields.get('job_title', '').lower()
+        seniority = next((value for word, value in self.SENIORITY if word in title), 30)
+        vip = fields.get('vip_status', '').lower() in ('1', 'true', 'yes', 'vip')
+        score = max(seniority, 80) if vip else seniority
+        return {'score': score, 'reasoning': f'Stub score from job title {fields.get("job_title", "")!r}.',
+                'factors': {'jobTitle': seniority, 'companySize': 50, 'industryInfluence': 50,
+                            'relationship': 90 if vip else 50, 'eventContext': 50}}
+
+
+class OpenAIBackend:
+    """Chat completions with a JSON schema response, over urllib in worker threads."""
+
+    URL = 'https://api.openai.com/v1/chat/completions'
+
+    def __init__(self, api_key=None, model='gpt-4o-mini', url=URL, timeout=60.0, max_connections=16):
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
+        if not self.api_key:
+            raise ScoringError('OPENAI_API_KEY is not set')
+        self.model = model
+        self.url = url
+        self.timeout = timeout
+        # Sized for the scorer's concurrency; the default executor is min(32, cpus + 4)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections)
+
+    async def score(self, fields, context=''):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._request, user_prompt(fields, context))
+
+    def _request(self, prompt):
+        body = {
+            'model': self.model,
+            'temperature': 0,
+            'messages': [{'role': 'system', 'content': SYSTEM_PROMPT}, {'role': 'user', 'content': prompt}],
+            'response_format': {'type': 'json_schema',
+                                'json_schema': {'name': 'importance', 'strict': True, 'schema': RESPONSE_SCHEMA}},
+        }
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode('utf-8'), headers={
+            'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise RetryableError(f'HTTP {e.code}', retry_after=_seconds(e.headers.get('Retry-After'))) from None
+            raise ScoringError(f'HTTP {e.code}: {e.read()[:200].decode("utf-8", "replace")}') from None
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise RetryableError(str(e)) from None
+        try:
+            return json.loads(payload['choices'][0]['message']['content'])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise ScoringError(f'unexpected response {str(payload)[:200]}') from e
+
+    def close(self):
+        self._executor.shutdown(wait=False)
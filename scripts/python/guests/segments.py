@@ -0,0 +1,586 @@
+# -*- coding: utf-8 -*-
+"""Tag and segment membership as compressed bitmaps (section 2.9).
+
+Each guest of an organization gets a dense ordinal, and SegmentIndex
+keeps one bitmap of ordinals per tag, per static segment (segment_guests)
+and per dynamic segment (segments.criteria). Segment expressions are
+evaluated with bitmap AND / OR / AND NOT instead of row by row:
+
+    VIP AND speaker AND NOT checked-in
+    (VIP OR "board member") AND NOT segment:declined
+
+NOT binds tightest, then AND, then OR; names are tag names unless
+prefixed with segment:. Dynamic segments may also be defined with the
+tags/segments conditions of saved-filter criteria (see guests.filters).
+
+Tag and static segment changes update the bitmaps in place, and each
+dynamic segment that refers to a changed tag or segment is re-checked for
+that one guest only. save() writes a snapshot that open() maps back in
+without decoding it: bitmaps are read from the map as queries touch them.
+Ordinals of removed guests are not reused; rebuild to compact.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+
+from guests.bitmap import Bitmap
+from guests.filters import MAX_DEPTH
+
+MAGIC = b'GSEGIDX\x00'
+VERSION = 1
+FILE_HEADER = struct.Struct('<8sII')     # magic, version, directory length
+TOKEN_RE = re.compile(r'\s*(?:([()])|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+KEYWORDS = ('AND', 'OR', 'NOT')
+
+
+class SegmentError(Exception):
+    pass
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if not match:
+            raise SegmentError(f'unexpected {text[position:].strip()[:20]!r} in expression')
+        paren, quoted, word = match.groups()
+        if paren:
+            tokens.append(paren)
+        elif quoted is not None:
+            tokens.append(('name', re.sub(r'\\(.)', r'\1', quoted)))
+        elif word.upper() in KEYWORDS:
+            tokens.append(word.upper())
+        else:
+            tokens.append(('name', word))
+        position = match.end()
+    return tokens
+
+
+def parse_expression(text):
+    """Parse a segment expression into nested tuples: (tag|segment, name), (not, node), (and|or, nodes)."""
+    tokens = tokenize(text)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def either(depth):
+        nodes = [both(depth)]
+        while peek() == 'OR':
+            take()
+            nodes.append(both(depth))
+        return nodes[0] if len(nodes) == 1 else ('or', tuple(nodes))
+
+    def both(depth):
+        nodes = [negation(depth)]
+        while peek() == 'AND':
+            take()
+            nodes.append(negation(depth))
+        return nodes[0] if len(nodes) == 1 else ('and', tuple(nodes))
+
+    def negation(depth):
+        if peek() == 'NOT':
+            take()
+            return ('not', negation(depth))
+        return atom(depth)
+
+    def atom(depth):
+        token = take() if peek() is not None else None
+        if token == '(':
+            if depth >= MAX_DEPTH:
+                raise SegmentError('expression is nested too deeply')
+            node = either(depth + 1)
+            if peek() != ')':
+                raise SegmentError('missing ) in expression')
+            take()
+            return node
+        if not isinstance(token, tuple):
+            raise SegmentError(f'expected a tag or segment name, got {token or "end of expression"!r}')
+        name = token[1]
+        for kind in ('segment', 'tag'):
+            if name.startswith(kind + ':'):
+                name = name[len(kind) + 1:]
+                if not name and isinstance(peek(), tuple):
+                    name = take()[1]       # segment:"Board members"
+                if not name:
+                    raise SegmentError(f'{kind}: needs a name')
+                return (kind, name)
+        return ('tag', name)
+
+    if not tokens:
+        raise SegmentError('empty expression')
+    node = either(0)
+    if position < len(tokens):
+        token = tokens[position]
+        raise SegmentError(f'unexpected {token if isinstance(token, str) else token[1]!r} in expression')
+    return node
+
+
+def criteria_expression(criteria, path='criteria', depth=0):
+    """The tags/segments conditions of saved-filter criteria as an expression tree."""
+    if isinstance(criteria, str):
+        criteria = json.loads(criteria)
+    if not isinstance(criteria, dict):
+        raise SegmentError(f'{path}: expected an object')
+    if depth > MAX_DEPTH:
+        raise SegmentError(f'{path}: groups are nested too deeply')
+    match = criteria.get('match', 'all')
+    if match not in ('all', 'any'):
+        raise SegmentError(f"{path}: match must be 'all' or 'any', not {match!r}")
+    nodes = []
+    for index, condition in enumerate(criteria.get('conditions', [])):
+        where = f'{path}.conditions[{index}]'
+        if isinstance(condition, dict) and 'conditions' in condition:
+            nodes.append(criteria_expression(condition, where, depth + 1))
+            continue
+        if not isinstance(condition, dict):
+            raise SegmentError(f'{where}: expected an object')
+        name, op, value = condition.get('field'), condition.get('op'), condition.get('value')
+        if name not in ('tags', 'segments'):
+            raise SegmentError(f'{where}: {name!r} is not held in the segment index; use guests.filters for it')
+        if not isinstance(value, list) or not value or not all(isinstance(item, str) for item in value):
+            raise SegmentError(f'{where}: expected a non-empty list of names or ids')
+        leaves = tuple((name[:-1], item) for item in value)
+        if op == 'all' and name == 'tags':
+            nodes.append(('and', leaves))
+        elif op in ('any', 'in'):
+            nodes.append(('or', leaves))
+        elif op in ('none', 'not_in'):
+            nodes.append(('not', ('or', leaves)))
+        else:
+            raise SegmentError(f'{where}: {name} do not support op {op!r}')
+    return ('and' if match == 'all' else 'or', tuple(nodes))
+
+
+def references(node):
+    """The (tag|segment, name) leaves an expression reads."""
+    if node[0] in ('tag', 'segment'):
+        return {node}
+    if node[0] == 'not':
+        return references(node[1])
+    return set().union(*(references(child) for child in node[1]))
+
+
+def expression_tree(expression):
+    if isinstance(expression, str):
+        return parse_expression(expression)
+    if isinstance(expression, dict):
+        return criteria_expression(expression)
+    return expression
+
+
+class SegmentIndex:
+    def __init__(self):
+        self.live = Bitmap()        # ordinals of current guests
+        self.tags = {}              # tag name -> Bitmap
+        self.segments = {}          # segment id -> Bitmap (static and dynamic)
+        self.dynamic = {}           # segment id -> expression as given (text or criteria)
+        self._ids = []              # ordinal -> guest id ('' once removed)
+        self._ids_blob = None       # '\n'-joined ids from a snapshot, split on first use
+        self._ordinals = None       # guest id -> ordinal, built on first use
+        self._trees = {}            # dynamic segment id -> parsed expression
+        self._refs = {}             # dynamic segment id -> references()
+        self._map = None
+        self._file = None
+
+    # -- guests and ordinals
+
+    @property
+    def ids(self):
+        if self._ids_blob is not None:
+            self._ids = self._ids_blob.split('\n') if self._ids_blob else []
+            self._ids_blob = None
+        return self._ids
+
+    def _ordinal_map(self):
+        if self._ordinals is None:
+            self._ordinals = {guest_id: ordinal for ordinal, guest_id in enumerate(self.ids) if guest_id}
+        return self._ordinals
+
+    def ordinal(self, guest_id):
+        """The guest's ordinal, or None if it is not in the index."""
+        return self._ordinal_map().get(guest_id)
+
+    def add_guest(self, guest_id):
+        """Register a guest (no-op if known); returns its ordinal."""
+        ordinals = self._ordinal_map()
+        ordinal = ordinals.get(guest_id)
+        if ordinal is not None:
+            return ordinal
+        if not guest_id or '\n' in guest_id:
+            raise SegmentError(f'invalid guest id {guest_id!r}')
+        ordinal = ordinals[guest_id] = len(self.ids)
+        self._ids.append(guest_id)
+        self.live.add(ordinal)
+        # NOT terms see the new guest, so dynamic segments are checked for it
+        self._refresh(ordinal, {('guest', guest_id)}, everything=True)
+        return ordinal
+
+    def remove_guest(self, guest_id):
+        ordinal = self._ordinal_map().pop(guest_id, None)
+        if ordinal is None:
+            return
+        self.live.discard(ordinal)
+        for bitmap in list(self.tags.values()) + list(self.segments.values()):
+            bitmap.discard(ordinal)
+        self._ids[ordinal] = ''
+
+    def guest_ids(self, bitmap):
+        ids = self.ids
+        return [ids[ordinal] for ordinal in bitmap]
+
+    # -- tags
+
+    def tags_of(self, guest_id):
+        ordinal = self.ordinal(guest_id)
+        if ordinal is None:
+            return set()
+        return {name for name, bitmap in self.tags.items() if ordinal in bitmap}
+
+    def tag(self, guest_id, *names):
+        ordinal = self.add_guest(guest_id)
+        changed = set()
+        for name in names:
+            bitmap = self.tags.setdefault(name, Bitmap())
+            if ordinal not in bitmap:
+                bitmap.add(ordinal)
+                changed.add(('tag', name))
+        self._refresh(ordinal, changed)
+
+    def untag(self, guest_id, *names):
+        ordinal = self.ordinal(guest_id)
+        if ordinal is None:
+            return
+        changed = set()
+        for name in names:
+            bitmap = self.tags.get(name)
+            if bitmap is not None and ordinal in bitmap:
+                bitmap.discard(ordinal)
+                changed.add(('tag', name))
+        self._refresh(ordinal, changed)
+
+    def set_tags(self, guest_id, names):
+        """Make `names` the guest's complete tag set."""
+        current = self.tags_of(guest_id)
+        names = set(names)
+        self.untag(guest_id, *(current - names))
+        self.tag(guest_id, *(names - current))
+
+    def remove_tag(self, name):
+        """Delete a tag; dynamic segments using it are re-evaluated."""
+        if self.tags.pop(name, None) is not None:
+            self._reevaluate({('tag', name)})
+
+    # -- segments
+
+    def add_to_segment(self, segment_id, guest_ids):
+        self._static(segment_id)
+        bitmap = self.segments.setdefault(segment_id, Bitmap())
+        for guest_id in guest_ids:
+            ordinal = self.add_guest(guest_id)
+            if ordinal not in bitmap:
+                bitmap.add(ordinal)
+                self._refresh(ordinal, {('segment', segment_id)})
+
+    def remove_from_segment(self, segment_id, guest_ids):
+        self._static(segment_id)
+        bitmap = self.segments.get(segment_id)
+        for guest_id in guest_ids:
+            ordinal = self.ordinal(guest_id)
+            if bitmap is not None and ordinal is not None and ordinal in bitmap:
+                bitmap.discard(ordinal)
+                self._refresh(ordinal, {('segment', segment_id)})
+
+    def _static(self, segment_id):
+        if segment_id in self.dynamic:
+            raise SegmentError(f'segment {segment_id} is dynamic; its members follow its criteria')
+
+    def define_segment(self, segment_id, expression):
+        """Create or change a dynamic segment from an expression or saved-filter criteria."""
+        tree = expression_tree(expression)
+        refs = references(tree)
+        for kind, name in refs:
+            if kind == 'segment':
+                if name not in self.segments:
+                    raise SegmentError(f'unknown segment {name!r}')
+                if name == segment_id or segment_id in self._depends(name):
+                    raise SegmentError(f'segment {segment_id} would depend on itself through {name}')
+        self.dynamic[segment_id] = expression
+        self._trees[segment_id] = tree
+        self._refs[segment_id] = refs
+        self._sort_dynamic()
+        self.segments[segment_id] = self.evaluate(tree)
+        self._reevaluate({('segment', segment_id)})
+
+    def drop_segment(self, segment_id):
+        for other, refs in self._refs.items():
+            if ('segment', segment_id) in refs:
+                raise SegmentError(f'segment {other} still refers to {segment_id}')
+        self.segments.pop(segment_id, None)
+        self.dynamic.pop(segment_id, None)
+        self._trees.pop(segment_id, None)
+        self._refs.pop(segment_id, None)
+
+    def _sort_dynamic(self):
+        """Order dynamic segments so each comes after the segments it reads."""
+        order = []
+
+        def visit(segment_id):
+            if segment_id in order:
+                return
+            for kind, name in self._refs[segment_id]:
+                if kind == 'segment' and name in self._refs:
+                    visit(name)
+            order.append(segment_id)
+
+        for segment_id in list(self._refs):
+            visit(segment_id)
+        self.dynamic = {segment_id: self.dynamic[segment_id] for segment_id in order}
+        self._trees = {segment_id: self._trees[segment_id] for segment_id in order}
+        self._refs = {segment_id: self._refs[segment_id] for segment_id in order}
+
+    def _depends(self, segment_id):
+        """Segments `segment_id` reads, directly or through other dynamic segments."""
+        found = set()
+        pending = [segment_id]
+        while pending:
+            for kind, name in self._refs.get(pending.pop(), ()):
+                if kind == 'segment' and name not in found:
+                    found.add(name)
+                    pending.append(name)
+        return found
+
+    def _refresh(self, ordinal, changed, everything=False):
+        """Re-check dynamic segments reading anything in `changed` for one guest.
+
+        Dynamic segments are kept in dependency order, so one pass sees
+        every segment a dynamic segment reads already settled.
+        """
+        if not changed:
+            return
+        for segment_id, refs in self._refs.items():
+            if not everything and not refs & changed:
+                continue
+            bitmap = self.segments[segment_id]
+            member = self._matches(self._trees[segment_id], ordinal)
+            if member != (ordinal in bitmap):
+                (bitmap.add if member else bitmap.discard)(ordinal)
+                changed.add(('segment', segment_id))
+
+    def _reevaluate(self, changed):
+        """Rebuild the dynamic segments reading anything in `changed` (after a definition changed)."""
+        for segment_id, refs in self._refs.items():
+            if refs & changed:
+                self.segments[segment_id] = self.evaluate(self._trees[segment_id])
+                changed.add(('segment', segment_id))
+
+    # -- evaluation
+
+    def _leaf(self, node):
+        if node[0] == 'tag':
+            return self.tags.get(node[1]) or Bitmap()
+        bitmap = self.segments.get(node[1])
+        if bitmap is None:
+            raise SegmentError(f'unknown segment {node[1]!r}')
+        return bitmap
+
+    def _matches(self, node, ordinal):
+        kind = node[0]
+        if kind in ('tag', 'segment'):
+            return ordinal in self._leaf(node)
+        if kind == 'not':
+            return not self._matches(node[1], ordinal)
+        if kind == 'and':
+            return all(self._matches(child, ordinal) for child in node[1])
+        return any(self._matches(child, ordinal) for child in node[1])
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind in ('tag', 'segment'):
+            return self._leaf(node)
+        if kind == 'not':
+            return self.live - self._evaluate(node[1])
+        if kind == 'or':
+            result = Bitmap()
+            for child in node[1]:
+                result = result | self._evaluate(child)
+            return result
+        # AND: intersect the positive terms smallest first, then subtract the negated ones (AND NOT)
+        positives = sorted((self._evaluate(child) for child in node[1] if child[0] != 'not'), key=len)
+        result = self.live
+        for bitmap in positives:
+            if not result:
+                return result
+            result = result & bitmap if result is not self.live else bitmap
+        for child in node[1]:
+            if child[0] == 'not' and result:
+                result = result - self._evaluate(child[1])
+        return result
+
+    def evaluate(self, expression):
+        """Ordinals matching an expression (text, saved-filter criteria or parsed tree) as a new Bitmap."""
+        result = self._evaluate(expression_tree(expression))
+        if result is self.live or any(result is bitmap for bitmap in self.tags.values()) \
+                or any(result is bitmap for bitmap in self.segments.values()):
+            result = result.copy()
+        return result
+
+    def count(self, expression):
+        return len(self.evaluate(expression))
+
+    def members(self, expression, limit=None):
+        """Guest ids matching an expression, in ordinal order."""
+        bitmap = self.evaluate(expression)
+        ids = self.ids
+        out = []
+        for ordinal in bitmap:
+            if limit is not None and len(out) >= limit:
+                break
+            out.append(ids[ordinal])
+        return out
+
+    # -- building
+
+    @classmethod
+    def build(cls, guest_tags=(), segment_guests=(), guests=()):
+        """Bulk-load (guest_id, tag) and (segment_id, guest_id) rows; `guests` adds untagged guests."""
+        index = cls()
+        ordinals = index._ordinal_map()
+        ids = index._ids
+
+        def ordinal_of(guest_id):
+            ordinal = ordinals.get(guest_id)
+            if ordinal is None:
+                if not guest_id or '\n' in guest_id:
+                    raise SegmentError(f'invalid guest id {guest_id!r}')
+                ordinal = ordinals[guest_id] = len(ids)
+                ids.append(guest_id)
+            return ordinal
+
+        for guest_id in guests:
+            ordinal_of(guest_id)
+        tags = {}
+        for guest_id, name in guest_tags:
+            tags.setdefault(name, []).append(ordinal_of(guest_id))
+        segments = {}
+        for segment_id, guest_id in segment_guests:
+            segments.setdefault(segment_id, []).append(ordinal_of(guest_id))
+        index.live = Bitmap(range(len(ids)))
+        index.tags = {name: Bitmap(members) for name, members in tags.items()}
+        index.segments = {segment_id: Bitmap(members) for segment_id, members in segments.items()}
+        return index
+
+    # -- snapshots
+
+    def save(self, path):
+        """Write a snapshot atomically (temp file + rename)."""
+        blobs = []
+        offset = 0
+
+        def put(data):
+            nonlocal offset
+            blobs.append(data)
+            offset += len(data)
+            return offset - len(data)
+
+        ids = '\n'.join(self.ids).encode('utf-8')
+        directory = {
+            'ids': [put(ids), len(ids)],
+            'live': put(self.live.to_bytes()),
+            'tags': {name: put(bitmap.to_bytes()) for name, bitmap in self.tags.items()},
+            'segments': {segment_id: put(bitmap.to_bytes()) for segment_id, bitmap in self.segments.items()},
+            'dynamic': self.dynamic,
+        }
+        header = json.dumps(directory, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, len(header)))
+                f.write(header)
+                for blob in blobs:
+                    f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.name == 'nt' and self._file is not None and \
+                    os.path.abspath(self._file.name) == os.path.abspath(path):
+                # Windows cannot replace a mapped file: decode everything and let the map go
+                self.load()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def open(cls, path):
+        """Map a snapshot written by save(); bitmaps are decoded as queries reach them."""
+        index = cls()
+        f = open(path, 'rb')
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise SegmentError(f'{path} is empty') from None
+        try:
+            magic, version, length = FILE_HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC:
+                raise SegmentError(f'{path} is not a segment index')
+            if version != VERSION:
+                raise SegmentError(f'{path} has index format {version}; rebuild it')
+            directory = json.loads(mapped[FILE_HEADER.size:FILE_HEADER.size + length].decode('utf-8'))
+            base = FILE_HEADER.size + length
+            start, size = directory['ids']
+            index._ids_blob = mapped[base + start:base + start + size].decode('utf-8')
+            index.live = Bitmap.from_buffer(mapped, base + directory['live'])[0]
+            index.tags = {name: Bitmap.from_buffer(mapped, base + offset)[0]
+                          for name, offset in directory['tags'].items()}
+            index.segments = {segment_id: Bitmap.from_buffer(mapped, base + offset)[0]
+                              for segment_id, offset in directory['segments'].items()}
+            for segment_id, expression in directory['dynamic'].items():
+                tree = expression_tree(expression)
+                index.dynamic[segment_id] = expression
+                index._trees[segment_id] = tree
+                index._refs[segment_id] = references(tree)
+        except (struct.error, ValueError, KeyError, TypeError) as e:
+            mapped.close()
+            f.close()
+            raise SegmentError(f'{path} is damaged: {e}') from None
+        except BaseException:
+            mapped.close()
+            f.close()
+            raise
+        index._map, index._file = mapped, f
+        return index
+
+    def load(self):
+        """Decode the whole snapshot into memory and release the map."""
+        for bitmap in [self.live, *self.tags.values(), *self.segments.values()]:
+            bitmap.load()
+        self._ids = self.ids
+        self.close()
+
+    def close(self):
+        """Release the snapshot map; bitmaps not yet decoded become unreadable."""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
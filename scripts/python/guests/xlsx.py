@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Streaming .xlsx reading and writing with the standard library.
+
+An .xlsx file is a zip of XML parts. Rows are parsed from the first
+worksheet with iterparse and each row element is dropped once yielded,
+so memory is bounded by the shared-string table, not the sheet size.
+XlsxWriter streams each worksheet straight into its zip entry, one row
+at a time, with inline strings, so writing needs no shared-string table.
+"""
+
+import posixpath
+import re
+import zipfile
+from decimal import Decimal
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+CELL_REF_RE = re.compile(r'([A-Z]+)')
+# XML escaping in one pass; control characters are not allowed in XML 1.0 text
+XML_TEXT = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\ufffe': None, '\uffff': None,
+                          **{code: None for code in range(32) if code not in (9, 10, 13)}})
+SHEET_NAME_RE = re.compile(r'[\[\]:*?/\\]')
+
+
+def column_index(reference):
+    """'A1' -> 0, 'AB7' -> 27."""
+    index = 0
+    for letter in CELL_REF_RE.match(reference).group(1):
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def column_letter(index):
+    """0 -> 'A', 27 -> 'AB'."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _text(element):
+    return ''.join(node.text or '' for node in element.iter(f'{MAIN_NS}t'))
+
+
+def _shared_strings(archive):
+    try:
+        part = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    with part:
+        for _, element in iterparse(part):
+            if element.tag == f'{MAIN_NS}si':
+                strings.append(_text(element))
+                element.clear()
+    return strings
+
+
+def _first_sheet(archive):
+    """Path of the first worksheet in workbook order."""
+    try:
+        with archive.open('xl/workbook.xml') as part:
+            sheet = next(element for _, element in iterparse(part) if element.tag == f'{MAIN_NS}sheet')
+        relation = sheet.get(f'{REL_NS}id')
+        with archive.open('xl/_rels/workbook.xml.rels') as part:
+            for _, element in iterparse(part):
+                if element.tag == f'{PACKAGE_REL_NS}Relationship' and element.get('Id') == relation:
+                    target = element.get('Target')
+                    return target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+    except (KeyError, StopIteration):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _cell_value(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return _text(cell)
+    value = cell.find(f'{MAIN_NS}v')
+    if value is None or value.text is None:
+        return ''
+    if kind == 's':
+        return shared[int(value.text)]
+    if kind == 'b':
+        return 'TRUE' if value.text == '1' else 'FALSE'
+    text = value.text
+    # Whole numbers (phone numbers typed as numbers) come back without '.0'
+    if kind in (None, 'n') and text.endswith('.0'):
+        text = text[:-2]
+    return text
+
+
+def read_rows(path):
+    """Yield each row of the first worksheet as a list of strings."""
+    with zipfile.ZipFile(path) as archive:
+        shared = _shared_strings(archive)
+        with archive.open(_first_sheet(archive)) as part:
+            sheet_data = None
+            for event, element in iterparse(part, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == f'{MAIN_NS}sheetData':
+                        sheet_data = element
+                    continue
+                if element.tag != f'{MAIN_NS}row':
+                    continue
+                row = []
+                for cell in element.iter(f'{MAIN_NS}c'):
+                    reference = cell.get('r')
+                    if reference:
+                        row.extend([''] * (column_index(reference) - len(row)))
+                    row.append(_cell_value(cell, shared))
+                # Detach the parsed row so the tree never grows with the sheet
+                if sheet_data is not None:
+                    sheet_data.remove(element)
+                yield row
+
+
+CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                 '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                 '<Default Extension="xml" ContentType="application/xml"/>'
+                 '<Override PartName="/xl/workbook.xml" '
+                 'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                 '<Override PartName="/xl/styles.xml" '
+                 'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                 '{sheets}</Types>')
+SHEET_CONTENT_TYPE = ('<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+PACKAGE_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                'relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+STYLES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+          f'<styleSheet xmlns="{MAIN_NS[1:-1]}">'
+          '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+          '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+          '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+          '<fill><patternFill patternType="gray125"/></fill></fills>'
+          '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+          '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+          '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+          '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+          '</styleSheet>')
+SHEET_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               f'<worksheet xmlns="{MAIN_NS[1:-1]}"><sheetViews><sheetView workbookViewId="0">'
+               '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+               '</sheetView></sheetViews>')
+SHEET_END = '</sheetData></worksheet>'
+NUMBER_TYPES = (int, float, Decimal)
+# Rows buffered before each write to the zip entry
+FLUSH_ROWS = 500
+ATTRIBUTE_ESCAPES = {'"': '&quot;'}
+
+
+def sheet_name(name, taken):
+    """A valid, unique worksheet name (31 characters, no []:*?/\\)."""
+    base = SHEET_NAME_RE.sub(' ', name).strip()[:31] or 'Sheet'
+    candidate = base
+    suffix = 2
+    while candidate.lower() in taken:
+        candidate = f'{base[:31 - len(str(suffix)) - 1]} {suffix}'
+        suffix += 1
+    return candidate
+
+
+class XlsxWriter:
+    """Writes sheets one after another; rows go straight into the zip entry."""
+
+    def __init__(self, path):
+        self._archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._sheets = []
+        self._part = None
+        self._buffer = []
+        self._references = []
+        self._row = 0
+
+    def open_sheet(self, name, columns, widths=None):
+        """Start a new worksheet with a bold, frozen header row.
+
+        `widths` are relative column widths (1.0 is about 14 characters).
+        """
+        self._close_sheet()
+        self._sheets.append(sheet_name(name, {sheet.lower() for sheet in self._sheets}))
+        self._part = self._archive.open(f'xl/worksheets/sheet{len(self._sheets)}.xml', 'w', force_zip64=True)
+        cols = ''.join(f'<col min="{number}" max="{number}" width="{14 * width:g}" customWidth="1"/>'
+                       for number, width in enumerate(widths or (), start=1))
+        self._part.write(f'{SHEET_START}{f"<cols>{cols}</cols>" if cols else ""}<sheetData>'.encode('utf-8'))
+        self._row = 0
+        self._write(columns, style=1)
+
+    def write_row(self, values):
+        self._write(values)
+
+    def _write(self, values, style=0):
+        self._row += 1
+        row = self._row
+        styled = f' s="{style}"' if style else ''
+        while len(self._references) < len(values):
+            self._references.append(f'<c r="{column_letter(len(self._references))}')
+        cells = [f'<row r="{row}">']
+        for reference, value in zip(self._references, values):
+            if value is None or value == '':
+                continue
+            if isinstance(value, NUMBER_TYPES) and not isinstance(value, bool):
+                cells.append(f'{reference}{row}"{styled}><v>{value}</v></c>')
+            else:
+                text = str(value)
+                # Most values need no escaping; isprintable() is False for control characters
+                if not text.isprintable() or '&' in text or '<' in text or '>' in text:
+                    text = text.translate(XML_TEXT)
+                cells.append(f'{reference}{row}"{styled} t="inlineStr"><is><t xml:space="preserve">'
+                             f'{text}</t></is></c>')
+        cells.append('</row>')
+        self._buffer.append(''.join(cells))
+        if len(self._buffer) >= FLUSH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        self._part.write(''.join(self._buffer).encode('utf-8'))
+        self._buffer.clear()
+
+    def _close_sheet(self):
+        if self._part is not None:
+            self._buffer.append(SHEET_END)
+            self._flush()
+            self._part.close()
+            self._part = None
+
+    def close(self):
+        self._close_sheet()
+        if not self._sheets:
+            self.open_sheet('Sheet1', [])
+            self._close_sheet()
+        sheets = ''.join(f'<sheet name="{escape(name, ATTRIBUTE_ESCAPES)}" sheetId="{number}" r:id="rId{number}"/>'
+                         for number, name in enumerate(self._sheets, start=1))
+        relations = ''.join(f'<Relationship Id="rId{number}" Type="http://schemas.openxmlformats.org/'
+                            f'officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{number}.xml"/>'
+                            for number in range(1, len(self._sheets) + 1))
+        styles_id = len(self._sheets) + 1
+        self._archive.writestr('[Content_Types].xml', CONTENT_TYPES.format(sheets=''.join(
+            SHEET_CONTENT_TYPE.format(number=number) for number in range(1, len(self._sheets) + 1))))
+        self._archive.writestr('_rels/.rels', PACKAGE_RELS)
+        self._archive.writestr('xl/workbook.xml', '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                               f'<workbook xmlns="{MAIN_NS[1:-1]}" xmlns:r="{REL_NS[1:-1]}">'
+                               f'<sheets>{sheets}</sheets></workbook>')
+        self._archive.writestr('xl/_rels/workbook.xml.rels',
+                               '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                               f'<Relationships xmlns="{PACKAGE_REL_NS[1:-1]}">{relations}'
+                               f'<Relationship Id="rId{styles_id}" Type="http://schemas.openxmlformats.org/'
+                               'officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>')
+        self._archive.writestr('xl/styles.xml', STYLES)
+        self._archive.close()
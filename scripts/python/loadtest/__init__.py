@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""Open-loop load testing for the waitlist API and a local stand-in server."""
+
+from loadtest.runner import LoadReport, run_load
+from loadtest.workload import Workload, arrival_times
+
+__all__ = ['LoadReport', 'Workload', 'arrival_times', 'run_load']
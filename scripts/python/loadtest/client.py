@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Minimal asyncio HTTP/1.1 client with a keep-alive connection pool.
+
+Only what a JSON POST load test needs: Content-Length and chunked
+responses, keep-alive reuse, and http or https. Staying on asyncio
+streams keeps the generator dependency-free and lets one process keep
+thousands of requests in flight.
+"""
+
+import asyncio
+import ssl
+from urllib.parse import urlsplit
+
+
+class LoadTestError(Exception):
+    pass
+
+
+class HttpError(Exception):
+    """The connection failed or the response could not be read."""
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    def __init__(self, url, size=100, timeout=30.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise LoadTestError(f'expected an http(s) URL, got {url!r}')
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self.host_header = parts.netloc.rsplit('@', 1)[-1]
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.opened += 1
+        return Connection(reader, writer)
+
+    async def post_json(self, body):
+        """POST `body` (bytes) to the pool's URL; returns (status, response body).
+
+        A kept-alive connection the server has already closed is retried
+        once on a fresh connection; timeouts are never retried.
+        """
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            while True:
+                fresh = connection is None
+                try:
+                    if fresh:
+                        connection = await asyncio.wait_for(self._connect(), self.timeout)
+                    status, data, keep_alive = await asyncio.wait_for(self._exchange(connection, body),
+                                                                      self.timeout)
+                    break
+                except asyncio.TimeoutError:
+                    self._discard(connection)
+                    raise HttpError('timeout') from None
+                except (OSError, ValueError, asyncio.IncompleteReadError, HttpError) as e:
+                    self._discard(connection)
+                    connection = None
+                    if fresh:
+                        raise HttpError(str(e) if isinstance(e, HttpError) else type(e).__name__) from None
+                except BaseException:
+                    self._discard(connection)
+                    raise
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection.close()
+            return status, data
+
+    @staticmethod
+    def _discard(connection):
+        if connection is not None:
+            connection.close()
+
+    async def _exchange(self, connection, body):
+        head = (f'POST {self.path} HTTP/1.1\r\nHost: {self.host_header}\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+                f'Connection: keep-alive\r\n\r\n').encode('ascii')
+        connection.writer.write(head + body)
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise HttpError('connection closed')
+        try:
+            version, status = status_line.split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise HttpError('bad status line') from None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(chunks)
+        elif 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        else:
+            data = await reader.read()
+            return status, data, False
+        connection_header = headers.get('connection', '').lower()
+        keep_alive = connection_header != 'close' and (version != b'HTTP/1.0' or connection_header == 'keep-alive')
+        return status, data, keep_alive
+
+    def close(self):
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Open-loop load runs and their latency and error report.
+
+run_load() dispatches every request at its scheduled time whether or not
+earlier ones have answered. Latency is measured from the scheduled time,
+so time spent waiting for a free connection or for a lagging dispatcher
+counts against the server, as it would for real visitors. Requests that
+would exceed --max-inflight are dropped and reported, never delayed.
+
+Besides p50/p95/p99 per request kind and status/error counts, the report
+checks the UNIQUE constraint end to end: every email must have been
+accepted (201) exactly once across its new and duplicate requests.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from loadtest.client import ConnectionPool, HttpError
+from loadtest.workload import DUPLICATE, INVALID, NEW
+
+EXPECTED = {NEW: (201, 409), DUPLICATE: (201, 409), INVALID: (400,)}
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class Result:
+    kind: str
+    email: str
+    at: float           # scheduled send time
+    lag: float          # dispatch delay behind the schedule
+    latency: float      # response time measured from the scheduled send time
+    status: int = 0     # 0 when the request failed without a response
+    error: str = ''
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    rank = max(int(-(-p * len(ordered) // 100)), 1)
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'count': 0}
+    summary = {'count': len(ordered), 'mean': round(sum(ordered) / len(ordered) * 1000, 2)}
+    for p in PERCENTILES:
+        summary[f'p{p}'] = round(percentile(ordered, p) * 1000, 2)
+    summary['max'] = round(ordered[-1] * 1000, 2)
+    return summary
+
+
+@dataclass
+class LoadReport:
+    results: list = field(default_factory=list)
+    dropped: Counter = field(default_factory=Counter)     # kind -> requests over --max-inflight
+    elapsed: float = 0.0
+    duration: float = 0.0   # length of the schedule
+    scheduled: int = 0
+    connections: int = 0
+
+    def as_dict(self):
+        answered = [result for result in self.results if result.status]
+        statuses = {}
+        for result in self.results:
+            key = str(result.status) if result.status else f'error: {result.error}'
+            statuses.setdefault(result.kind, Counter())[key] += 1
+        unexpected = sum(1 for result in answered if result.status not in EXPECTED[result.kind])
+
+        accepted = Counter()
+        for result in self.results:
+            if result.email:
+                accepted[result.email] += result.status == 201
+        uniqueness = {'emails': len(accepted),
+                      'accepted_once': sum(1 for count in accepted.values() if count == 1),
+                      'accepted_more_than_once': sum(1 for count in accepted.values() if count > 1),
+                      'never_accepted': sum(1 for count in accepted.values() if count == 0)}
+
+        timeline = {}
+        for result in self.results:
+            bucket = timeline.setdefault(int(result.at), [0, 0, []])
+            bucket[0] += 1
+            if result.status:
+                bucket[2].append(result.latency)
+            else:
+                bucket[1] += 1
+        failed = sum(1 for result in self.results if not result.status)
+        return {
+            'scheduled': self.scheduled,
+            'sent': len(self.results),
+            'dropped': dict(self.dropped),
+            'elapsed_seconds': round(self.elapsed, 3),
+            'offered_rate': round(self.scheduled / self.duration, 2) if self.duration else None,
+            'answered_rate': round(len(answered) / self.elapsed, 2) if self.elapsed else None,
+            'connections_opened': self.connections,
+            'max_dispatch_lag_ms': round(max((result.lag for result in self.results), default=0) * 1000, 2),
+            'latency_ms': {'all': latency_summary([result.latency for result in answered]),
+                           **{kind: latency_summary([result.latency for result in answered if result.kind == kind])
+                              for kind in (NEW, DUPLICATE, INVALID)}},
+            'statuses': {kind: dict(counts) for kind, counts in statuses.items()},
+            'failed': failed,
+            'unexpected_status': unexpected,
+            'uniqueness': uniqueness,
+            'timeline': [{'second': second, 'sent': sent, 'failed': errors,
+                          'p95_ms': round(percentile(sorted(latencies), 95) * 1000, 2) if latencies else None}
+                         for second, (sent, errors, latencies) in sorted(timeline.items())],
+        }
+
+    def format_summary(self):
+        data = self.as_dict()
+        lines = [f"{data['sent']}/{data['scheduled']} requests in {data['elapsed_seconds']} s "
+                 f"(offered {data['offered_rate']}/s, answered {data['answered_rate']}/s, "
+                 f"{data['connections_opened']} connections, max dispatch lag {data['max_dispatch_lag_ms']} ms)"]
+        for kind, summary in data['latency_ms'].items():
+            if summary['count']:
+                lines.append(f"  {kind:<9} n={summary['count']:<7} p50={summary['p50']} ms  p95={summary['p95']} ms  "
+                             f"p99={summary['p99']} ms  max={summary['max']} ms")
+        for kind, counts in data['statuses'].items():
+            lines.append(f"  {kind:<9} " + ', '.join(f'{key}: {count}' for key, count in sorted(counts.items())))
+        if data['dropped']:
+            lines.append(f"  dropped over --max-inflight: {json.dumps(data['dropped'])}")
+        unique = data['uniqueness']
+        lines.append(f"  emails accepted once {unique['accepted_once']}/{unique['emails']}, "
+                     f"more than once {unique['accepted_more_than_once']}, never {unique['never_accepted']}; "
+                     f"unexpected statuses {data['unexpected_status']}, failed {data['failed']}")
+        return '\n'.join(lines)
+
+
+async def run_load(url, requests, duration=None, connections=256, max_inflight=10000, timeout=30.0, progress=None):
+    """Send `requests` (workload.Request, sorted by .at) open-loop and return a LoadReport."""
+    pool = ConnectionPool(url, size=connections, timeout=timeout)
+    report = LoadReport(scheduled=len(requests), duration=duration or (requests[-1].at if requests else 0.0))
+    loop = asyncio.get_running_loop()
+    inflight = set()
+
+    async def send(request, start):
+        dispatched = loop.time()
+        result = Result(request.kind, request.email, request.at, dispatched - start - request.at, 0.0)
+        try:
+            result.status, _ = await pool.post_json(request.body)
+        except HttpError as e:
+            result.error = str(e)
+        result.latency = loop.time() - start - request.at
+        report.results.append(result)
+
+    started = time.perf_counter()
+    start = loop.time()
+    next_progress = 1.0
+    try:
+        for request in requests:
+            delay = start + request.at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(inflight) >= max_inflight:
+                report.dropped[request.kind] += 1
+                continue
+            task = asyncio.create_task(send(request, start))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+            if progress and request.at >= next_progress:
+                progress(request.at, len(report.results), len(inflight))
+                next_progress += 1.0
+        if inflight:
+            await asyncio.gather(*inflight)
+    finally:
+        for task in inflight:
+            task.cancel()
+        pool.close()
+    report.elapsed = time.perf_counter() - started
+    report.connections = pool.opened
+    return report
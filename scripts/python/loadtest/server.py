@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in for POST /api/waitlist (app/api/waitlist/route.ts).
+
+Same validation, status codes and messages as the route: 400 for a
+missing or malformed email, 409 when the UNIQUE constraint on
+waitlist.email rejects a duplicate, 201 with the stored row otherwise.
+Storage is either in memory (with an optional simulated query latency)
+or a local Postgres through psycopg 3 or psycopg2, using the table from
+migrations/001_waitlist_table_simple.sql and a fixed pool of
+connections driven from worker threads.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from loadtest.client import LoadTestError
+from loadtest.workload import EMAIL_RE
+
+ROUTE = '/api/waitlist'
+MIGRATION = os.path.join('migrations', '001_waitlist_table_simple.sql')
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY = 64 * 1024
+UNIQUE_VIOLATION = '23505'
+
+
+class DuplicateEmail(Exception):
+    pass
+
+
+class MemoryStore:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.rows = {}
+
+    async def insert(self, email, name):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Check and insert without awaiting in between, like a unique index
+        if email in self.rows:
+            raise DuplicateEmail(email)
+        row = {'id': str(uuid.uuid4()), 'email': email, 'name': name, 'referral_source': None,
+               'created_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+               'notified_at': None, 'converted_at': None}
+        self.rows[email] = row
+        return row
+
+    def close(self):
+        pass
+
+
+def connect(dsn):
+    try:
+        import psycopg
+        return psycopg.connect(dsn)
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+        return psycopg2.connect(dsn)
+    except ImportError:
+        raise LoadTestError('the Postgres store needs psycopg ("pip install psycopg[binary]") or psycopg2') from None
+
+
+class PostgresStore:
+    """INSERT ... RETURNING on a pool of autocommit connections, one worker thread per connection."""
+
+    COLUMNS = ('id', 'email', 'name', 'referral_source', 'created_at', 'notified_at', 'converted_at')
+
+    def __init__(self, dsn, pool_size=10, init_schema=False, truncate=False):
+        self.connections = queue.SimpleQueue()
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='waitlist-db')
+        self._all = []
+        for _ in range(pool_size):
+            connection = connect(dsn)
+            connection.autocommit = True
+            self._all.append(connection)
+            self.connections.put(connection)
+        if init_schema or truncate:
+            cursor = self._all[0].cursor()
+            if init_schema:
+                with open(MIGRATION, 'r', encoding='utf-8') as f:
+                    migration = f.read()
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
+                cursor.execute(migration)
+            if truncate:
+                cursor.execute('TRUNCATE waitlist')
+            cursor.close()
+
+    def _insert(self, email, name):
+        connection = self.connections.get()
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('INSERT INTO waitlist (email, name) VALUES (%s, %s) '
+                               f"RETURNING {', '.join(self.COLUMNS)}", (email, name))
+                return dict(zip(self.COLUMNS, cursor.fetchone()))
+            finally:
+                cursor.close()
+        except Exception as e:
+            if (getattr(e, 'sqlstate', None) or getattr(e, 'pgcode', None)) == UNIQUE_VIOLATION:
+                raise DuplicateEmail(email) from None
+            raise
+        finally:
+            self.connections.put(connection)
+
+    async def insert(self, email, name):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._insert, email, name)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for connection in self._all:
+            connection.close()
+
+
+class WaitlistServer:
+    def __init__(self, store):
+        self.store = store
+        self.statuses = Counter()
+
+    async def signup(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            # request.json() throws inside the route's try block
+            return 500, {'error': 'Something went wrong. Please try again.'}
+        email = payload.get('email') if isinstance(payload, dict) else None
+        name = payload.get('name') if isinstance(payload, dict) else None
+        if not email or not isinstance(email, str):
+            return 400, {'error': 'Email is required'}
+        if not EMAIL_RE.match(email):
+            return 400, {'error': 'Please enter a valid email address'}
+        name = (name.strip() or None) if isinstance(name, str) else None
+        try:
+            row = await self.store.insert(email.lower().strip(), name)
+        except DuplicateEmail:
+            return 409, {'error': 'This email is already on the waitlist'}
+        except Exception as e:
+            return 500, {'error': f'Failed to join waitlist: {e or "Please try again."}'}
+        return 201, {'message': 'Successfully joined the waitlist!', 'data': row}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split(None, 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': 'Request body too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection != 'close' and (version.strip() != 'HTTP/1.0' or connection == 'keep-alive')
+                    if target.split('?', 1)[0].rstrip('/') != ROUTE:
+                        status, payload = 404, {'error': 'Not found'}
+                    elif method != 'POST':
+                        status, payload = 405, {'error': 'Method not allowed'}
+                    else:
+                        status, payload = await self.signup(body)
+                self.statuses[status] += 1
+                data = json.dumps(payload, default=str).encode('utf-8')
+                writer.write((f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n'
+                              f'Content-Length: {len(data)}\r\n'
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('ascii') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=3000, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        if ready:
+            ready(server)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Arrival schedules and waitlist signup payloads.
+
+Arrivals are open-loop: every request has a send time fixed before the
+run starts, so a slow server cannot slow the generator down and hide
+its own latency (coordinated omission). Times come from inverting the
+cumulative arrival count N(t) of a constant or linearly ramping rate,
+at evenly spaced counts (uniform) or exponential gaps (poisson).
+
+Payloads mimic real signups: mostly new emails, a share of duplicates
+that must hit the UNIQUE constraint on waitlist.email (double clicks
+racing the original and people signing up again later, in the other
+letter cases route.ts lowercases away), and a share of invalid
+submissions. route.ts checks the email before trimming it, so padded
+emails are invalid rather than duplicates. Emails are tagged with a run
+id so repeated runs against the same database do not collide.
+"""
+
+import csv
+import json
+import math
+import random
+import re
+from dataclasses import dataclass
+
+# Same check as app/api/waitlist/route.ts
+EMAIL_RE = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+MODES = ('constant', 'ramp')
+ARRIVALS = ('poisson', 'uniform')
+NEW = 'new'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+FIRST_NAMES = ('Ava', 'Liam', 'Noah', 'Emma', 'Mia', 'Lucas', 'Sofia', 'Arjun', 'Chen', 'Fatima', 'Jonas',
+               'Olivia', 'Mateo', 'Yuki', 'Amara', 'Leon', 'Isla', 'Omar', 'Hannah', 'Diego')
+LAST_NAMES = ('Smith', 'Garcia', 'Muller', 'Rossi', 'Kim', 'Patel', 'Nguyen', 'Silva', 'Cohen', 'Okafor',
+              'Jansen', 'Dubois', 'Novak', 'Tanaka', 'Brown', 'Larsen', 'Haddad', 'Kowalski', 'Moreau', 'Ali')
+DOMAINS = (('gmail.com', 40), ('outlook.com', 15), ('yahoo.com', 8), ('icloud.com', 7), ('hey.com', 2),
+           ('eventsco.com', 6), ('northwind-events.io', 4), ('galaplanners.co.uk', 3), ('acme.org', 5))
+INVALID_PAYLOADS = ({}, {'email': ''}, {'email': None}, {'email': 42}, {'email': 'not-an-email'},
+                    {'email': 'jane@localhost'}, {'email': 'jane doe@example.com'}, {'email': '@example.com'})
+
+
+@dataclass
+class Request:
+    at: float       # seconds after the start of the run
+    kind: str       # NEW, DUPLICATE or INVALID
+    email: str      # normalised email the server should store ('' for invalid requests)
+    body: bytes
+
+
+def arrival_times(rate, duration, mode='constant', start_rate=0.0, arrivals='poisson', seed=0):
+    """Send times in [0, duration) for a constant `rate` or a ramp from `start_rate` to `rate` (per second)."""
+    if mode not in MODES:
+        raise ValueError(f'unknown mode {mode!r}')
+    if arrivals not in ARRIVALS:
+        raise ValueError(f'unknown arrival process {arrivals!r}')
+    begin = rate if mode == 'constant' else start_rate
+    if rate < 0 or begin < 0 or duration <= 0:
+        raise ValueError('rates must be non-negative and the duration positive')
+    # N(t) = begin * t + slope * t^2 with slope = (rate - begin) / (2 * duration)
+    slope = (rate - begin) / (2 * duration)
+    total = begin * duration + slope * duration * duration
+    rng = random.Random(seed)
+    times = []
+    count = rng.expovariate(1.0) if arrivals == 'poisson' else 0.5
+    while count < total:
+        if slope == 0:
+            t = count / begin
+        else:
+            t = (-begin + math.sqrt(begin * begin + 4 * slope * count)) / (2 * slope)
+        times.append(t)
+        count += rng.expovariate(1.0) if arrivals == 'poisson' else 1.0
+    return times
+
+
+def read_replay(path):
+    """Signup payloads from a JSONL file of objects or a CSV with an email column."""
+    payloads = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        payloads.append(json.loads(line))
+                    except ValueError as e:
+                        raise ValueError(f'{path}:{number}: {e}') from None
+        else:
+            for row in csv.DictReader(f):
+                row = {key.strip().lower(): value for key, value in row.items() if key}
+                payloads.append({key: row[key] for key in ('email', 'name') if row.get(key)})
+    return payloads
+
+
+def tag_email(email, run_id):
+    if not run_id or '@' not in email:
+        return email
+    local, _, domain = email.rpartition('@')
+    return f'{local}+{run_id}@{domain}'
+
+
+class Workload:
+    """Builds the request list for a run from its arrival times."""
+
+    def __init__(self, duplicate_ratio=0.05, invalid_ratio=0.01, race_share=0.3, name_ratio=0.8,
+                 run_id='', replay=(), seed=0):
+        if duplicate_ratio + invalid_ratio > 1:
+            raise ValueError('duplicate and invalid ratios add up to more than 1')
+        self.duplicate_ratio = duplicate_ratio
+        self.invalid_ratio = invalid_ratio
+        self.race_share = race_share          # share of duplicates that resend one of the last few signups
+        self.name_ratio = name_ratio
+        self.run_id = run_id
+        self.replay = list(replay)
+        self.rng = random.Random(seed)
+        self._domains = [domain for domain, _ in DOMAINS]
+        self._weights = [weight for _, weight in DOMAINS]
+
+    def _new_payload(self, index):
+        if index < len(self.replay):
+            payload = dict(self.replay[index])
+            if isinstance(payload.get('email'), str):
+                payload['email'] = tag_email(payload['email'], self.run_id)
+            return payload
+        rng = self.rng
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        local = rng.choice((f'{first}.{last}', f'{first[0]}{last}', f'{first}{rng.randrange(100)}'))
+        domain = rng.choices(self._domains, self._weights)[0]
+        payload = {'email': tag_email(f'{local}{index}@{domain}', self.run_id)}
+        if rng.random() < self.name_ratio:
+            payload['name'] = f'{first} {last}'
+        return payload
+
+    def _variant(self, email):
+        # People retype their address in whatever case; the route lowercases it
+        choice = self.rng.randrange(3)
+        if choice == 1:
+            return email.upper()
+        if choice == 2:
+            return email.capitalize()
+        return email
+
+    def build(self, times):
+        rng = self.rng
+        sent = []       # normalised emails of new signups so far
+        seen = set()
+        requests = []
+        new_count = 0
+        for at in times:
+            draw = rng.random()
+            if draw < self.invalid_ratio:
+                payload = dict(rng.choice(INVALID_PAYLOADS))
+                requests.append(Request(at, INVALID, '', json.dumps(payload).encode('utf-8')))
+                continue
+            if draw < self.invalid_ratio + self.duplicate_ratio and sent:
+                if rng.random() < self.race_share:
+                    email = sent[max(len(sent) - rng.randint(1, 3), 0)]
+                else:
+                    email = rng.choice(sent)
+                payload = {'email': self._variant(email)}
+                requests.append(Request(at, DUPLICATE, email, json.dumps(payload).encode('utf-8')))
+                continue
+            payload = self._new_payload(new_count)
+            new_count += 1
+            email = payload.get('email')
+            if not isinstance(email, str) or not EMAIL_RE.match(email):
+                requests.append(Request(at, INVALID, '', json.dumps(payload).encode('utf-8')))
+                continue
+            email = email.lower().strip()
+            if email in seen:
+                # Replayed data has its own repeat signups
+                requests.append(Request(at, DUPLICATE, email, json.dumps(payload).encode('utf-8')))
+                continue
+            seen.add(email)
+            sent.append(email)
+            requests.append(Request(at, NEW, email, json.dumps(payload).encode('utf-8')))
+        return requests
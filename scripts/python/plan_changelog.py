@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Structural diffs and changelogs of the plan: todos and sections, not lines.
+
+    python scripts/python/plan_changelog.py diff                  # HEAD vs the working tree
+    python scripts/python/plan_changelog.py diff HEAD~5 HEAD
+    python scripts/python/plan_changelog.py log -n 50
+    python scripts/python/plan_changelog.py log v1.0..HEAD --json
+
+Each todo and heading subtree is hashed, so a diff reports added,
+removed and changed todos and sections and todo status transitions.
+Outlines of past revisions are cached by git blob id
+(scripts/python/.cache/plan-history.sqlite).
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from plan_tools import PLAN_PATH
+from plan_tools.history import DEFAULT_DB, HistoryError, OutlineCache, changelog, diff, outline
+
+
+def format_diff(result, indent=''):
+    lines = []
+    if result.frontmatter_changed:
+        lines.append('frontmatter changed')
+    for todo_id, content in result.todos_added:
+        lines.append(f'+ todo {todo_id}: {content}')
+    for todo_id, content in result.todos_removed:
+        lines.append(f'- todo {todo_id}: {content}')
+    for todo_id, _, content in result.todos_changed:
+        lines.append(f'~ todo {todo_id}: {content}')
+    for todo_id, old, new in result.status_changes:
+        lines.append(f'  todo {todo_id}: {old or "-"} -> {new or "-"}')
+    for key, title in result.sections_added:
+        lines.append(f'+ section {key}' + ('' if key == title else f' ({title})'))
+    for key, title in result.sections_removed:
+        lines.append(f'- section {key}' + ('' if key == title else f' ({title})'))
+    for key, title in result.sections_changed:
+        lines.append(f'~ section {key}' + ('' if key == title else f' ({title})'))
+    for key, old, new in result.sections_moved:
+        lines.append(f'> section {key}: under {old or "top level"} -> {new or "top level"}')
+    return '\n'.join(indent + line for line in lines)
+
+
+def load(cache, revision, path):
+    """Outline at a git revision, or of the file on disk when `revision` is None."""
+    if revision is None:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return outline(f.read())
+    return cache.at(revision, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Structural plan diffs and changelogs.')
+    parser.add_argument('--plan', default=PLAN_PATH, help='plan file, relative to the project root')
+    parser.add_argument('--db', default=DEFAULT_DB, help='outline cache, relative to the project root')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compare = commands.add_parser('diff', help='compare two revisions (default HEAD and the working tree)')
+    compare.add_argument('old', nargs='?', default='HEAD', help='old revision (default HEAD)')
+    compare.add_argument('new', nargs='?', help='new revision (default: the working tree)')
+
+    log = commands.add_parser('log', help='changelog of the commits that touched the plan, newest first')
+    log.add_argument('range', nargs='?', help='revision range, e.g. v1.0..HEAD (default: all history)')
+    log.add_argument('-n', '--max-count', type=int, help='at most this many commits')
+    log.add_argument('--all', action='store_true', help='include commits with no structural change')
+    args = parser.parse_args(argv)
+
+    # Change to project root directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+
+    cache = OutlineCache(args.db)
+    try:
+        if args.command == 'diff':
+            result = diff(load(cache, args.old, args.plan), load(cache, args.new, args.plan))
+            if args.json:
+                print(json.dumps(result.as_dict(), indent=2, ensure_ascii=False))
+            elif not result.empty:
+                print(format_diff(result))
+            return 0
+
+        entries = []
+        for revision, result in changelog(args.plan, args.range, args.max_count, cache=cache):
+            if result.empty and not args.all:
+                continue
+            if args.json:
+                entries.append({'commit': revision.commit, 'timestamp': revision.timestamp,
+                                'subject': revision.subject, **result.as_dict()})
+                continue
+            date = datetime.fromtimestamp(revision.timestamp, timezone.utc).strftime('%Y-%m-%d')
+            print(f'{revision.commit[:10]} {date} {revision.subject}')
+            if not result.empty:
+                print(format_diff(result, indent='    '))
+        if args.json:
+            print(json.dumps(entries, indent=2, ensure_ascii=False))
+    except (HistoryError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Query the plan's todos and headings, and update todo statuses in bulk.
+
+Answers come from a SQLite sidecar index (scripts/python/.cache) that is
+rebuilt only when the plan's content changes.
+
+    python scripts/python/plan_query.py todos --prefix phase2- --status pending
+    python scripts/python/plan_query.py todo phase2-export
+    python scripts/python/plan_query.py section 2.8
+    python scripts/python/plan_query.py section --match dedup
+    python scripts/python/plan_query.py set-status completed --prefix phase0-
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from plan_tools import PLAN_PATH
+from plan_tools.index import DEFAULT_DB, PlanIndex
+from plan_tools.patch import APPLIED, PatchBatch, PatchError, run
+
+STATUSES = ['pending', 'in_progress', 'completed', 'cancelled']
+
+
+def print_rows(rows, columns, as_json):
+    if as_json:
+        print(json.dumps([dict(zip(columns, row)) for row in rows], indent=2, ensure_ascii=False))
+        return
+    for row in rows:
+        print('  '.join('-' if value is None else str(value) for value in row))
+
+
+def set_status(index, args):
+    """Update every selected todo in one batch and one write, then re-index."""
+    ids = [row[0] for row in index.todos(ids=args.ids, status=args.status, prefix=args.prefix)]
+    missing = set(args.ids or ()) - set(ids)
+    if missing:
+        print(f"Error: no todo with id {', '.join(sorted(missing))}", file=sys.stderr)
+        return 1
+    if not ids:
+        print('No todos matched')
+        return 0
+    batch = PatchBatch('plan-query')
+    for todo_id in ids:
+        batch.set_status(todo_id, args.new_status)
+    try:
+        result = run(args.plan, [batch])
+    except PatchError as e:
+        print(f'Error: {e.args[0]}', file=sys.stderr)
+        return 1
+    if result.changed:
+        index.store(result.plan)
+    changed = sum(outcome.state == APPLIED for outcome in result.outcomes)
+    print(f'Set {changed} of {len(ids)} todo(s) to {args.new_status}')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query plan todos and sections.')
+    parser.add_argument('--plan', default=PLAN_PATH, help='plan file, relative to the project root')
+    parser.add_argument('--db', default=DEFAULT_DB, help='index file, relative to the project root')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    todo = commands.add_parser('todo', help='show todos by id')
+    todo.add_argument('ids', nargs='+')
+
+    todos = commands.add_parser('todos', help='list todos, optionally filtered')
+    todos.add_argument('--status', choices=STATUSES)
+    todos.add_argument('--prefix', help='id prefix, e.g. phase2-')
+
+    section = commands.add_parser('section', help='find headings by number, title or title substring')
+    section.add_argument('key', nargs='?', help='section number ("2.8", "Phase 3") or exact title')
+    section.add_argument('--match', help='case-insensitive title substring')
+
+    update = commands.add_parser('set-status', help='set the status of matching todos in one write')
+    update.add_argument('new_status', choices=STATUSES)
+    update.add_argument('--id', dest='ids', action='append', help='todo id (repeatable)')
+    update.add_argument('--status', choices=STATUSES, help='only todos currently in this status')
+    update.add_argument('--prefix', help='id prefix, e.g. phase0-')
+    args = parser.parse_args(argv)
+
+    # Change to project root directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+
+    if args.command == 'set-status' and not (args.ids or args.status or args.prefix):
+        parser.error('set-status needs --id, --status or --prefix')
+    if args.command == 'section' and not (args.key or args.match):
+        parser.error('section needs a key or --match')
+
+    index = PlanIndex(args.plan, args.db)
+    try:
+        index.refresh()
+        if args.command == 'set-status':
+            return set_status(index, args)
+        if args.command == 'section':
+            rows = index.sections(key=args.key, match=args.match)
+            print_rows(rows, ['number', 'title', 'level', 'line'], args.json)
+        else:
+            if args.command == 'todo':
+                rows = index.todos(ids=args.ids)
+            else:
+                rows = index.todos(status=args.status, prefix=args.prefix)
+            print_rows(rows, ['id', 'status', 'content'], args.json)
+    finally:
+        index.close()
+    if not rows:
+        print('No matches', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Check the SQL embedded in the plan and turn it into migrations.
+
+    python scripts/python/plan_schema.py check         # conflicts and missing indexes
+    python scripts/python/plan_schema.py migrations    # write migrations/NNN_<table>.sql
+    python scripts/python/plan_schema.py migrations --check
+
+`check` exits 1 when a foreign key or filter column has no supporting
+index (or definitions conflict), so it can run before a plan change is
+merged. `migrations` only rewrites files whose content changed and never
+touches hand-written migrations.
+"""
+
+import argparse
+import os
+import sys
+
+from plan_tools import PLAN_PATH
+from plan_tools.fragments import DEFAULT_ROOT
+from plan_tools.schema import DEFAULT_FILTER_COLUMNS, load_schema, missing_indexes, sync_migrations
+
+
+def check(schema, args):
+    print(f'{len(schema.tables)} tables, {len(schema.indexes)} indexes')
+    for location, message in schema.errors:
+        print(f'  {location}: could not parse statement ({message})')
+    for name, kept, ignored in schema.conflicts:
+        print(f'  {name}: definition at {ignored} differs from {kept} (using {kept})')
+    advice = missing_indexes(schema, DEFAULT_FILTER_COLUMNS + tuple(args.filter_column or ()),
+                             set(args.ignore or ()))
+    if advice:
+        print(f'{len(advice)} column(s) without a supporting index:')
+    for item in advice:
+        print(f"  {item.table}.{'/'.join(item.columns)}  {item.reason}  ({item.location})")
+        print(f'      {item.suggestion}')
+    return 1 if advice or schema.conflicts or schema.errors else 0
+
+
+def migrations(schema, args):
+    results = sync_migrations(schema, args.migrations, dry_run=args.check)
+    pending = [(path, state) for path, state in results if state != 'unchanged']
+    for path, state in pending if not args.verbose else results:
+        print(f'  {path} ({state})')
+    if args.check:
+        print(f'{len(pending)} migration(s) out of date' if pending else 'Migrations are up to date')
+        return 1 if pending else 0
+    written = sum(state in ('created', 'updated') for _, state in results)
+    print(f'Wrote {written} of {len(results)} migration(s)')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check plan SQL and generate migrations.')
+    parser.add_argument('--plan', default=PLAN_PATH, help='plan file, relative to the project root')
+    parser.add_argument('--migrations', default='migrations', help='migrations directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    checker = commands.add_parser('check', help='report conflicting definitions and missing indexes')
+    checker.add_argument('--filter-column', action='append',
+                         help='extra column (name or table.column) that queries filter on')
+    checker.add_argument('--ignore', action='append', help='table.column to leave out of the advice')
+
+    writer = commands.add_parser('migrations', help='write one numbered migration per table')
+    writer.add_argument('--check', action='store_true', help='report out-of-date files and exit 1, without writing')
+    writer.add_argument('-v', '--verbose', action='store_true', help='list unchanged files too')
+    args = parser.parse_args(argv)
+
+    # Change to project root directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+
+    schema = load_schema(args.plan, DEFAULT_ROOT, args.migrations)
+    return check(schema, args) if args.command == 'check' else migrations(schema, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Helpers for reading and patching the Cursor plan documents."""
+
+from plan_tools.document import PlanDocument, Section, Todo, parse
+
+PLAN_PATH = '.cursor/plans/event_guest_management_saas_94b10d1b.plan.md'
+
+__all__ = ['PLAN_PATH', 'PlanDocument', 'Section', 'Todo', 'parse']
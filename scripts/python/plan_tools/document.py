@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""Single-pass parser for Cursor plan documents.
+
+A plan is YAML frontmatter (name, overview, todos, ...) followed by a
+markdown body. parse() records the offsets of every frontmatter todo and
+every heading, so a patch can look up its anchor by todo id or section
+number and splice at that offset instead of rescanning the whole file
+with str.replace. It finds them with two regex passes (frontmatter and
+body) rather than stepping through every line in Python. The same two
+scanners rescan the regions apply_edits() touches, and they run over
+bytes too, which is how the streaming mode indexes a mapped file, so
+there is one line grammar for all three.
+"""
+
+import bisect
+import hashlib
+import json
+import re
+from dataclasses import dataclass, replace
+
+from plan_tools.locator import AnchorLocator
+
+# "2.6 Premium Tier", "1.4a CSV/Excel Import", "Phase 3: Supplier Mobile Apps"
+SECTION_NUMBER_RE = re.compile(r'^(?:Phase\s+)?(\d+(?:\.\d+)*[a-z]?)\b')
+SECTION_KEY_RE = re.compile(r'^(?:Phase\s+)?(\d+(?:\.\d+)*[a-z]?)$')
+TODO_ID_RE = re.compile(r'^  - id:[ \t]*(.*?)[ \t]*$')
+FENCES = ('```', '~~~')
+# The lines the scanners act on, for finditer() over a whole document. Only '\n' ends a line, and
+# a trailing '\r' is stripped by the scanner. The patterns are ASCII-only so the same text compiles
+# for str and for bytes: an indented line holding a fence marker may be a fence behind non-ASCII
+# whitespace, so it is decoded and checked in Python, and the section number is read off the title.
+FRONTMATTER_LINE = r'^(?:  - id:[ \t]*(.*)|    (content|status):[ \t]*(?P<value>.*)|([^ \n].*))'
+BODY_LINE = r'^(?:(```|~~~)|([ \t][^\n]*?(?:```|~~~)[^\n]*)|(#{1,6})[ \t]+(.*?)[ \t#]*\r*$)'
+# (frontmatter regex, body regex, newline, carriage return, decode) for str and for bytes-like text
+TEXT_SYNTAX = (re.compile(FRONTMATTER_LINE, re.MULTILINE), re.compile(BODY_LINE, re.MULTILINE), '\n', '\r', str)
+BYTES_SYNTAX = (re.compile(FRONTMATTER_LINE.encode('ascii'), re.MULTILINE),
+                re.compile(BODY_LINE.encode('ascii'), re.MULTILINE), b'\n', b'\r', bytes.decode)
+
+
+@dataclass
+class Todo:
+    # A plan can hold tens of thousands of todos and headings; slots keep the index small
+    __slots__ = ('id', 'content', 'status', 'start', 'end', 'status_start', 'status_end')
+
+    id: str
+    content: str
+    status: str
+    start: int          # offset of the "  - id:" line
+    end: int            # offset just past the todo's last line
+    status_start: int   # span of the status value, for in-place updates
+    status_end: int
+
+
+@dataclass
+class Section:
+    __slots__ = ('number', 'title', 'level', 'start', 'body', 'end')
+
+    number: str         # "2.6", "1.4a", "3" for "Phase 3: ..."; '' if unnumbered
+    title: str
+    level: int
+    start: int          # offset of the heading line
+    body: int           # offset just past the heading line
+    end: int            # end of the heading's subtree
+
+
+def unquote(value):
+    value = value.strip()
+    if value.startswith('"') and value.endswith('"') and len(value) >= 2:
+        if '\\' not in value:
+            return value[1:-1]      # nothing for json to unescape; it would also reject the same inputs
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value[1:-1]
+    if value.startswith("'") and value.endswith("'") and len(value) >= 2:
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+def fingerprint(text):
+    """Digest of a todo or section that ignores trailing whitespace and blank edges."""
+    lines = [line.rstrip() for line in text.strip('\n').splitlines()]
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def todo_fingerprint(todo_id, content):
+    # Status is progress, not content: a completed todo is still "applied".
+    return fingerprint(f'{todo_id}\n{content}')
+
+
+def syntax(text):
+    return TEXT_SYNTAX if isinstance(text, str) else BYTES_SYNTAX
+
+
+def scan_frontmatter(text, start, stop=None, in_todos=False, todo_ids=None):
+    """Todos of the frontmatter from `start` (just past its opening '---' line) up to `stop`.
+
+    Returns (frontmatter_end, todos_end, todos), with each todo's end set;
+    frontmatter_end is 0 if the frontmatter is never closed. `in_todos`
+    starts the scan inside the todo list. If `todo_ids` is given, only
+    the first todo with each of those ids is kept.
+    """
+    frontmatter_re, _, _, cr, decode = syntax(text)
+    size = len(text) if stop is None else stop
+    keep_all = todo_ids is None
+    todo_ids = set(todo_ids or ())
+    content_field = 'content' if decode is str else b'content'
+    todos = []
+    todos_end = None
+    todo = None             # the kept todo whose fields follow, if any
+    last = None             # the last kept todo, until the next todo line ends it
+    statuses = {}           # a handful of distinct values; share one string per value
+    for match in frontmatter_re.finditer(text, start, size):
+        todo_id, field, value, line = match.groups()
+        if line is not None:
+            line = decode(line).rstrip('\r')
+            if line == '---':
+                if in_todos and todos_end is None:
+                    todos_end = match.start()
+                frontmatter_end = min(match.end() + 1, size)
+                break
+            if not in_todos:
+                if line.rstrip() == 'todos:':
+                    in_todos = True
+                    todos_end = None
+            elif line:
+                todos_end = match.start()
+                in_todos = False
+        elif not in_todos:
+            continue
+        elif todo_id is not None:
+            if last is not None:
+                last.end = match.start()
+                last = None
+            todo_id = unquote(decode(todo_id.rstrip(cr)))
+            if keep_all:
+                todo = last = Todo(todo_id, '', '', match.start(), 0, 0, 0)
+                todos.append(todo)
+            elif todo_id in todo_ids:
+                todo_ids.discard(todo_id)       # later duplicates lose to the first, as in PlanDocument
+                todo = last = Todo(todo_id, '', '', match.start(), 0, 0, 0)
+                todos.append(todo)
+            else:
+                todo = None
+        elif todo is not None:
+            value = value.rstrip(cr)
+            if field == content_field:
+                todo.content = unquote(decode(value))
+            else:
+                status = unquote(decode(value))
+                todo.status = statuses.setdefault(status, status)
+                todo.status_start = match.start('value')
+                todo.status_end = todo.status_start + len(value)
+    else:
+        frontmatter_end = 0
+    if todos_end is None:
+        todos_end = frontmatter_end
+    if last is not None:
+        last.end = todos_end
+    return frontmatter_end, todos_end, todos
+
+
+def scan_headings(text, start, stop=None, titles=None, numbers=None):
+    """Sections from `start` (which starts a line) up to `stop`, each with its subtree's end set.
+
+    If `titles` or `numbers` is given, only the first heading with each
+    of those titles or numbers is kept, and the scan ends once they have
+    all been found and their subtrees closed.
+    """
+    _, body_re, newline, _, decode = syntax(text)
+    size = len(text) if stop is None else stop
+    keep_all = titles is None and numbers is None
+    titles, numbers = set(titles or ()), set(numbers or ())
+    sections = []
+    open_sections = []      # sections whose subtree is still running, by increasing level
+    in_fence = False
+    find = text.find
+    number_match = SECTION_NUMBER_RE.match
+    for match in body_re.finditer(text, start, size):
+        fence, indented, level, title = match.groups()
+        if indented is not None:
+            if not decode(indented).lstrip().startswith(FENCES):
+                continue
+            fence = indented
+        if fence is not None:
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        level = len(level)
+        while open_sections and open_sections[-1].level >= level:
+            open_sections.pop().end = match.start()
+        if not keep_all and not (titles or numbers):
+            if not open_sections:
+                break
+            continue
+        title = decode(title)
+        number = number_match(title)
+        number = number.group(1) if number else ''
+        if not keep_all:
+            if title not in titles and number not in numbers:
+                continue
+            titles.discard(title)
+            numbers.discard(number)
+        end = find(newline, match.end(), size)
+        section = Section(number, title, level, match.start(), size if end == -1 else end + 1, 0)
+        sections.append(section)
+        open_sections.append(section)
+    for section in open_sections:
+        section.end = size
+    return sections
+
+
+def scan_text(text, todo_ids=None, titles=None, numbers=None):
+    """Return (frontmatter_end, todos_end, todos, sections) for a whole document.
+
+    `text` is a str, or bytes or an mmap, in which case every offset is a
+    byte offset. The wanted todo ids, titles and numbers narrow the result
+    as in scan_frontmatter() and scan_headings().
+    """
+    _, _, newline, _, decode = syntax(text)
+    frontmatter_end, todos_end, todos = 0, 0, []
+    body = 0
+    first = text.find(newline)
+    first = len(text) if first == -1 else first + 1
+    if decode(text[:first]).rstrip('\r\n') == '---':
+        frontmatter_end, todos_end, todos = scan_frontmatter(text, first, todo_ids=todo_ids)
+        # An unclosed frontmatter runs to the end of the file
+        body = frontmatter_end or len(text)
+    return frontmatter_end, todos_end, todos, scan_headings(text, body, titles=titles, numbers=numbers)
+
+
+def close_spans(todos, todos_end, sections, length):
+    """Fill in Todo.end and Section.end from the start offsets alone."""
+    for current, following in zip(todos, todos[1:]):
+        current.end = following.start
+    if todos:
+        todos[-1].end = todos_end
+    # A subtree ends at the next heading of the same or a higher level.
+    open_sections = []
+    for section in sections:
+        while open_sections and open_sections[-1].level >= section.level:
+            open_sections.pop().end = section.start
+        open_sections.append(section)
+    for section in open_sections:
+        section.end = length
+
+
+class PlanDocument:
+    """Parsed plan with todos indexed by id and headings by number/title."""
+
+    def __init__(self, text, frontmatter_end, todos_end, todos, sections):
+        self.text = text
+        self.frontmatter_end = frontmatter_end
+        self.todos_end = todos_end
+        self.sections = sections
+        self.todo_list = todos      # in document order, repeated ids included
+        self.todos = {}
+        for todo in todos:
+            self.todos.setdefault(todo.id, todo)
+        self._by_number = {}
+        self._by_title = {}
+        for section in sections:
+            if section.number:
+                self._by_number.setdefault(section.number, section)
+            self._by_title.setdefault(section.title, section)
+        self._fingerprints = {}
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return parse(f.read())
+
+    def todo(self, todo_id):
+        try:
+            return self.todos[todo_id]
+        except KeyError:
+            raise KeyError(f'todo not found in plan: {todo_id}') from None
+
+    def section(self, key):
+        """Look up a heading by number ("2.6", "### 1.4a", "Phase 3") or title."""
+        key = key.lstrip('#').strip()
+        section = self._by_title.get(key)
+        if section is None:
+            number = SECTION_KEY_RE.match(key)
+            if number:
+                section = self._by_number.get(number.group(1))
+        if section is None:
+            raise KeyError(f'section not found in plan: {key}')
+        return section
+
+    def measure(self, text):
+        """Length of `text` in this document's offset units."""
+        return len(text)
+
+    def slice(self, start, end):
+        return self.text[start:end]
+
+    def locate(self, anchors):
+        """Return {anchor: [start offsets]} for literal anchors, in one pass."""
+        return AnchorLocator(anchors).scan(self.text)
+
+    def fingerprint_of(self, key):
+        """Fingerprint of ('todo', id) or ('section', number or title), or None."""
+        if key in self._fingerprints:
+            return self._fingerprints[key]
+        kind, name = key
+        value = None
+        if kind == 'todo':
+            todo = self.todos.get(name)
+            if todo is not None:
+                value = todo_fingerprint(todo.id, todo.content)
+        elif kind == 'section':
+            section = self._by_number.get(name) or self._by_title.get(name)
+            if section is not None:
+                value = fingerprint(self.slice(section.start, section.end))
+        self._fingerprints[key] = value
+        return value
+
+    @property
+    def fingerprints(self):
+        """Index of ('todo', id) and ('section', number or title) -> fingerprint."""
+        keys = [('todo', todo_id) for todo_id in self.todos]
+        keys += [('section', section.number or section.title) for section in self.sections]
+        return {key: self.fingerprint_of(key) for key in keys}
+
+    def has_section(self, key):
+        try:
+            self.section(key)
+        except KeyError:
+            return False
+        return True
+
+    def apply_edits(self, edits, text=None):
+        """Return the document with `edits` applied, without re-parsing untouched text.
+
+        Each edit is widened to whole lines (whole todos inside the todo
+        list). Entries starting inside a widened region are rescanned from
+        the new text; every other entry is only shifted. Edits are expected
+        at todo/heading boundaries or inside todo lines, never inside a
+        fenced block. `text` may be passed if the caller already spliced it.
+        """
+        edits = sorted(edits, key=lambda edit: (edit[0], edit[1]))
+        if text is None:
+            text = self.splice(edits)
+        old = self.text
+        todos = self.todo_list
+        todo_starts = [todo.start for todo in todos]
+
+        # Widen and merge: [old start, old end, size change, state]
+        regions = []
+        for start, end, replacement in edits:
+            state = 'todos' if start < self.frontmatter_end else 'body'
+            if state == 'todos':
+                index = bisect.bisect_right(todo_starts, start) - 1
+                while 0 <= index < len(todos) and todos[index].start < max(end, start + 1):
+                    todo = todos[index]
+                    if todo.start < start < todo.end or (start < end and start < todo.end):
+                        start, end = min(start, todo.start), max(end, todo.end)
+                    index += 1
+            else:
+                start = min(start, old.rfind('\n', 0, start) + 1)
+                if end > start and old[end - 1] != '\n':
+                    newline = old.find('\n', end)
+                    end = len(old) if newline == -1 else newline + 1
+            regions.append([start, end, 0, state])
+        for region, (start, end, replacement) in zip(regions, edits):
+            region[2] = len(replacement) - (end - start)
+        merged = []
+        for region in regions:
+            if merged and region[0] < merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], region[1])
+                merged[-1][2] += region[2]
+            else:
+                merged.append(region)
+
+        # Edits ending at or before a position move it (insertions at it go first)
+        edit_ends = [end for _, end, _ in edits]
+        moved_by = [0]
+        for start, end, replacement in edits:
+            moved_by.append(moved_by[-1] + len(replacement) - (end - start))
+
+        def shift(position):
+            return position + moved_by[bisect.bisect_right(edit_ends, position)]
+
+        todos_out = []
+        sections_out = []
+        delta = 0
+        for start, end, change, state in merged:
+            new_start = start + delta
+            delta += change
+            if state == 'todos':
+                # A region running past the closing '---' goes on in the body
+                new_start, _, found = scan_frontmatter(text, new_start, end + delta, in_todos=True)
+                todos_out.extend(found)
+                if not new_start:
+                    continue
+            sections_out.extend(scan_headings(text, new_start, end + delta))
+
+        region_starts = [region[0] for region in merged]
+
+        def untouched(entry):
+            index = bisect.bisect_right(region_starts, entry.start) - 1
+            return index < 0 or entry.start >= merged[index][1]
+
+        for todo in todos:
+            if untouched(todo):
+                todos_out.append(replace(todo, start=shift(todo.start),
+                                         status_start=shift(todo.status_start),
+                                         status_end=shift(todo.status_end)))
+        for section in self.sections:
+            if untouched(section):
+                moved = shift(section.start)
+                sections_out.append(replace(section, start=moved, body=moved + section.body - section.start))
+        todos_out.sort(key=lambda todo: todo.start)
+        sections_out.sort(key=lambda section: section.start)
+        # 0 means there is no (closed) frontmatter, so an insertion at the start must not move it
+        todos_end = shift(self.todos_end) if self.todos_end else 0
+        frontmatter_end = shift(self.frontmatter_end) if self.frontmatter_end else 0
+        close_spans(todos_out, todos_end, sections_out, len(text))
+        return PlanDocument(text, frontmatter_end, todos_end, todos_out, sections_out)
+
+    def splice(self, edits):
+        """Apply (start, end, replacement) edits in one pass and return the new text."""
+        pieces = []
+        position = 0
+        for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+            if start < position:
+                raise ValueError(f'overlapping edits at offset {start}')
+            pieces.append(self.text[position:start])
+            pieces.append(replacement)
+            position = end
+        pieces.append(self.text[position:])
+        return ''.join(pieces)
+
+
+def parse(text):
+    return PlanDocument(text, *scan_text(text))
+
+
+def parse_todos(text):
+    """Split a bare todo-list fragment into (Todo, block text) pairs."""
+    header = '---\ntodos:\n'
+    wrapped = header + text + ('' if text.endswith('\n') else '\n') + '---\n'
+    plan = parse(wrapped)
+    return [(todo, wrapped[todo.start:todo.end]) for todo in plan.todos.values()]
+
+
+def top_level_sections(text):
+    """Split a markdown fragment into (Section, subtree text) for its outermost headings."""
+    sections = parse(text).sections
+    if not sections:
+        return []
+    level = min(section.level for section in sections)
+    units = [[section, text[section.start:section.end]]
+             for section in sections if section.level == level]
+    # Anything before the first heading travels with the first unit
+    units[0][1] = text[:units[0][0].start] + units[0][1]
+    return [tuple(unit) for unit in units]
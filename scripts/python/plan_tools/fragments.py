@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Registry of plan fragments (todo lists and markdown sections).
+
+Fragments live as plain files under scripts/python/fragments/ and patch
+sets are declared in fragments/manifest.json, so a new phase is a
+manifest entry plus its fragment files. Each fragment is compiled once
+into a content-addressed object (text plus the todo ids and section
+numbers it defines) under fragments/.cache/, keyed by its sha256. A run
+only stats the fragments its patch set names and loads their compiled
+objects on first access.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+
+from plan_tools.document import TODO_ID_RE, parse, unquote
+from plan_tools.patch import PatchBatch
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'fragments')
+
+
+def compile_fragment(text):
+    todo_ids = []
+    for line in text.splitlines():
+        match = TODO_ID_RE.match(line)
+        if match:
+            todo_ids.append(unquote(match.group(1)))
+    sections = [section.number or section.title for section in parse(text).sections]
+    return {'text': text, 'todos': todo_ids, 'sections': sections}
+
+
+class Fragment:
+    def __init__(self, registry, name, digest):
+        self.registry = registry
+        self.name = name
+        self.digest = digest
+        self._compiled = None
+
+    def _load(self):
+        if self._compiled is None:
+            self._compiled = self.registry._load_object(self.name, self.digest)
+        return self._compiled
+
+    @property
+    def text(self):
+        return self._load()['text']
+
+    @property
+    def todo_ids(self):
+        return self._load()['todos']
+
+    @property
+    def section_keys(self):
+        return self._load()['sections']
+
+    def __repr__(self):
+        return f'Fragment({self.name!r}, {self.digest[:12]})'
+
+
+class FragmentRegistry:
+    def __init__(self, root=DEFAULT_ROOT, cache_dir=None):
+        self.root = root
+        self.cache_dir = cache_dir or os.path.join(root, '.cache')
+        self._manifest = None
+        self._index = None
+        self._index_dirty = False
+        self._fragments = {}
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(os.path.join(self.root, 'manifest.json'), 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def patch_sets(self):
+        return list(self.manifest)
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest[2:] + '.marshal')
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self._index_path(), 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def fragment(self, name):
+        """Return the fragment stored at fragments/<name>, hashing it only if it changed."""
+        fragment = self._fragments.get(name)
+        if fragment is not None:
+            return fragment
+        path = os.path.join(self.root, name)
+        stat = os.stat(path)
+        index = self._load_index()
+        entry = index.get(name)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size \
+                and os.path.exists(self._object_path(entry[2])):
+            digest = entry[2]
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            self._store_object(digest, compile_fragment(data.decode('utf-8')))
+            index[name] = [stat.st_mtime_ns, stat.st_size, digest]
+            self._index_dirty = True
+        fragment = self._fragments[name] = Fragment(self, name, digest)
+        return fragment
+
+    def _store_object(self, digest, compiled):
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            marshal.dump(compiled, f)
+        os.replace(tmp_path, path)
+
+    def _load_object(self, name, digest):
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            with open(os.path.join(self.root, name), 'rb') as f:
+                return compile_fragment(f.read().decode('utf-8'))
+
+    def save(self):
+        if not self._index_dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=0, sort_keys=True)
+        os.replace(tmp_path, self._index_path())
+        self._index_dirty = False
+
+    def add_patch(self, batch, patch, set_name=''):
+        """Append one manifest patch entry to `batch`."""
+        op = patch['op']
+        if op == 'add_todos':
+            batch.add_todos(self.fragment(patch['fragment']).text,
+                            after=patch.get('after'), before=patch.get('before'))
+        elif op == 'insert_section':
+            batch.insert_section(self.fragment(patch['fragment']).text,
+                                 after=patch.get('after'), before=patch.get('before'))
+        elif op == 'insert_at_anchor':
+            batch.insert_at_anchor(patch['anchor'], self.fragment(patch['fragment']).text,
+                                   before=patch.get('position') == 'before')
+        elif op == 'set_status':
+            batch.set_status(patch['id'], patch['status'])
+        else:
+            raise ValueError(f'{set_name or batch.name}: unknown patch op {op!r}')
+
+    def fragment_names(self, set_names):
+        """Fragments referenced by the given patch sets, in manifest order."""
+        names = []
+        for set_name in set_names:
+            for patch in self.manifest[set_name]['patches']:
+                if 'fragment' in patch and patch['fragment'] not in names:
+                    names.append(patch['fragment'])
+        return names
+
+    def patches_using(self, fragment_name, set_names):
+        """Return [(set name, patch entry)] for patches that insert `fragment_name`."""
+        return [(set_name, patch) for set_name in set_names
+                for patch in self.manifest[set_name]['patches']
+                if patch.get('fragment') == fragment_name]
+
+    def invalidate(self, name=None):
+        """Forget cached fragments (all of them, or one) so the next access re-stats them."""
+        if name is None:
+            self._fragments.clear()
+            self._manifest = None
+        else:
+            self._fragments.pop(name, None)
+
+    def patch_set(self, name):
+        """Build a PatchBatch from the manifest entry `name`."""
+        try:
+            spec = self.manifest[name]
+        except KeyError:
+            raise KeyError(f'unknown patch set: {name}') from None
+        batch = PatchBatch(name)
+        for patch in spec['patches']:
+            self.add_patch(batch, patch, name)
+        self.save()
+        return batch
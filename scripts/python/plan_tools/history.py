@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""Structural diffs of the plan across git history.
+
+outline() reduces a plan to one hash per frontmatter todo and two per
+heading: the heading's own text (up to its first child heading) and its
+whole subtree, built bottom-up from the children's subtree hashes.
+Comparing two outlines is then a walk over the section and todo keys,
+and an unchanged subtree is recognised from one hash.
+
+Git blobs never change, so outlines are cached in SQLite by blob id
+(scripts/python/.cache) and a changelog over hundreds of revisions only
+parses the revisions it has not seen before. Blobs are read through one
+long-running `git cat-file --batch` process rather than a `git show` per
+revision.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+from dataclasses import dataclass, field
+
+from plan_tools.document import fingerprint, parse, todo_fingerprint
+
+DEFAULT_DB = os.path.join('scripts', 'python', '.cache', 'plan-history.sqlite')
+# Bump when outline() changes so cached outlines are rebuilt
+OUTLINE_VERSION = 1
+NULL_BLOB = '0' * 40
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outlines (
+  blob TEXT PRIMARY KEY,
+  version INTEGER,
+  outline TEXT
+);
+'''
+
+
+class HistoryError(Exception):
+    pass
+
+
+@dataclass
+class Outline:
+    frontmatter: str = ''
+    todos: dict = field(default_factory=dict)       # id -> (content hash, status, content)
+    sections: dict = field(default_factory=dict)    # key -> (title, level, parent key, own hash, tree hash)
+
+    def to_json(self):
+        return json.dumps({'frontmatter': self.frontmatter, 'todos': self.todos, 'sections': self.sections},
+                          ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        return cls(data['frontmatter'], {key: tuple(value) for key, value in data['todos'].items()},
+                   {key: tuple(value) for key, value in data['sections'].items()})
+
+
+def section_keys(sections):
+    """Stable key per heading: its number or title, qualified by the parent when that repeats."""
+    keys = []
+    taken = set()
+    stack = []
+    for section in sections:
+        while stack and stack[-1][0].level >= section.level:
+            stack.pop()
+        parent = stack[-1][1] if stack else ''
+        key = section.number or section.title
+        if key in taken:
+            key = f'{parent} > {section.title}' if parent else section.title
+            base, count = key, 2
+            while key in taken:
+                key = f'{base} ({count})'
+                count += 1
+        taken.add(key)
+        keys.append((key, parent))
+        stack.append((section, key))
+    return keys
+
+
+def outline(text):
+    """Hash every todo and heading subtree of the plan `text`."""
+    plan = parse(text)
+    todos = list(plan.todos.values())
+    todos_start = todos[0].start if todos else plan.frontmatter_end
+    todos_end = plan.todos_end if todos else plan.frontmatter_end
+    result = Outline(fingerprint(text[:todos_start] + text[todos_end:plan.frontmatter_end]))
+    for todo in todos:
+        result.todos[todo.id] = (todo_fingerprint(todo.id, todo.content), todo.status, todo.content)
+
+    sections = plan.sections
+    keys = section_keys(sections)
+    own = []
+    for index, section in enumerate(sections):
+        following = sections[index + 1].start if index + 1 < len(sections) else len(text)
+        own.append(fingerprint(text[section.start:min(following, section.end)]))
+    # Children follow their parent, so walking backwards finishes every subtree before its parent
+    children = {}
+    trees = [None] * len(sections)
+    for index in range(len(sections) - 1, -1, -1):
+        key, parent = keys[index]
+        digest = hashlib.sha256(own[index].encode('ascii'))
+        for child in reversed(children.pop(key, ())):
+            digest.update(child.encode('ascii'))
+        trees[index] = digest.hexdigest()
+        children.setdefault(parent, []).append(trees[index])
+    for index, section in enumerate(sections):
+        key, parent = keys[index]
+        result.sections[key] = (section.title, section.level, parent, own[index], trees[index])
+    return result
+
+
+@dataclass
+class PlanDiff:
+    frontmatter_changed: bool = False
+    todos_added: list = field(default_factory=list)         # [(id, content)]
+    todos_removed: list = field(default_factory=list)       # [(id, content)]
+    todos_changed: list = field(default_factory=list)       # [(id, old content, new content)]
+    status_changes: list = field(default_factory=list)      # [(id, old status, new status)]
+    sections_added: list = field(default_factory=list)      # [(key, title)]
+    sections_removed: list = field(default_factory=list)    # [(key, title)]
+    sections_changed: list = field(default_factory=list)    # [(key, title)]
+    sections_moved: list = field(default_factory=list)      # [(key, old parent, new parent)]
+
+    @property
+    def empty(self):
+        return not (self.frontmatter_changed or self.todos_added or self.todos_removed or self.todos_changed
+                    or self.status_changes or self.sections_added or self.sections_removed
+                    or self.sections_changed or self.sections_moved)
+
+    def as_dict(self):
+        return {
+            'frontmatter_changed': self.frontmatter_changed,
+            'todos': {
+                'added': [{'id': todo_id, 'content': content} for todo_id, content in self.todos_added],
+                'removed': [{'id': todo_id, 'content': content} for todo_id, content in self.todos_removed],
+                'changed': [{'id': todo_id, 'old': old, 'new': new} for todo_id, old, new in self.todos_changed],
+                'status': [{'id': todo_id, 'old': old, 'new': new} for todo_id, old, new in self.status_changes],
+            },
+            'sections': {
+                'added': [{'key': key, 'title': title} for key, title in self.sections_added],
+                'removed': [{'key': key, 'title': title} for key, title in self.sections_removed],
+                'changed': [{'key': key, 'title': title} for key, title in self.sections_changed],
+                'moved': [{'key': key, 'old_parent': old, 'new_parent': new}
+                          for key, old, new in self.sections_moved],
+            },
+        }
+
+
+def diff(old, new):
+    """Compare two outlines; a section is "changed" only when its own text changed."""
+    result = PlanDiff(frontmatter_changed=old.frontmatter != new.frontmatter)
+    for todo_id, (digest, status, content) in new.todos.items():
+        previous = old.todos.get(todo_id)
+        if previous is None:
+            result.todos_added.append((todo_id, content))
+            continue
+        if previous[0] != digest:
+            result.todos_changed.append((todo_id, previous[2], content))
+        if previous[1] != status:
+            result.status_changes.append((todo_id, previous[1], status))
+    result.todos_removed = [(todo_id, value[2]) for todo_id, value in old.todos.items()
+                            if todo_id not in new.todos]
+
+    unchanged = set()   # keys whose whole subtree matches
+    for key, (title, level, parent, own, tree) in new.sections.items():
+        if parent in unchanged and key in old.sections:
+            unchanged.add(key)
+            continue
+        previous = old.sections.get(key)
+        if previous is None:
+            result.sections_added.append((key, title))
+            continue
+        if previous[4] == tree and previous[2] == parent:
+            unchanged.add(key)
+            continue
+        if previous[3] != own:
+            result.sections_changed.append((key, title))
+        if previous[2] != parent:
+            result.sections_moved.append((key, previous[2], parent))
+    result.sections_removed = [(key, value[0]) for key, value in old.sections.items()
+                               if key not in new.sections]
+    return result
+
+
+class BlobReader:
+    """Read git objects through one `git cat-file --batch` process."""
+
+    def __init__(self, cwd=None):
+        try:
+            self.process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=cwd, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE)
+        except OSError as e:
+            raise HistoryError(f'cannot run git: {e}') from None
+
+    def read(self, name):
+        """Return the bytes of blob `name` (an id or "rev:path")."""
+        self.process.stdin.write(name.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().decode('utf-8').split()
+        if len(header) != 3:
+            raise HistoryError(f'git object not found: {name}')
+        data = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)   # trailing newline
+        return data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+@dataclass
+class Revision:
+    commit: str
+    timestamp: int
+    subject: str
+    old_blob: str    # NULL_BLOB when the commit added the plan
+    new_blob: str    # NULL_BLOB when the commit deleted it
+
+
+def git(*args, cwd=None):
+    try:
+        return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout
+    except OSError as e:
+        raise HistoryError(f'cannot run git: {e}') from None
+    except subprocess.CalledProcessError as e:
+        raise HistoryError(e.stderr.strip() or f"git {' '.join(args)} failed") from None
+
+
+def head_commit(cwd=None):
+    """Short id of HEAD for tagging results, or 'unknown' outside a git checkout."""
+    try:
+        return git('rev-parse', '--short', 'HEAD', cwd=cwd).strip()
+    except HistoryError:
+        return 'unknown'
+
+
+def revisions(path, revision_range=None, limit=None, cwd=None):
+    """Commits that touched `path`, newest first, with its blob before and after each one."""
+    args = ['log', '--format=%x00%H%x09%ct%x09%s', '--raw', '--no-abbrev', '--no-renames']
+    if limit:
+        args.append(f'--max-count={limit}')
+    if revision_range:
+        args.append(revision_range)
+    result = []
+    for entry in git(*args, '--', path, cwd=cwd).split('\x00')[1:]:
+        header, _, raw = entry.partition('\n')
+        commit, timestamp, subject = header.split('\t', 2)
+        for line in raw.splitlines():
+            if line.startswith(':'):
+                fields = line.split('\t', 1)[0].split()
+                result.append(Revision(commit, int(timestamp), subject, fields[2], fields[3]))
+                break
+    return result
+
+
+class OutlineCache:
+    """Outlines keyed by git blob id, in memory and in SQLite."""
+
+    def __init__(self, db_path=DEFAULT_DB, cwd=None):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+        self.cwd = cwd
+        self._reader = None
+        self._memory = {NULL_BLOB: Outline()}
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        self.db.close()
+
+    def get(self, blob):
+        if blob in self._memory:
+            return self._memory[blob]
+        row = self.db.execute('SELECT outline FROM outlines WHERE blob = ? AND version = ?',
+                              (blob, OUTLINE_VERSION)).fetchone()
+        if row:
+            self.hits += 1
+            result = Outline.from_json(row[0])
+        else:
+            self.misses += 1
+            if self._reader is None:
+                self._reader = BlobReader(self.cwd)
+            result = outline(self._reader.read(blob).decode('utf-8'))
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO outlines VALUES (?, ?, ?)',
+                                (blob, OUTLINE_VERSION, result.to_json()))
+        self._memory[blob] = result
+        return result
+
+    def at(self, revision, path):
+        """Outline of `path` at a git revision."""
+        try:
+            blob = git('rev-parse', '--verify', '--quiet', f'{revision}:{path}', cwd=self.cwd).strip()
+        except HistoryError:
+            raise HistoryError(f'{path} not found at {revision}') from None
+        return self.get(blob)
+
+
+def changelog(path, revision_range=None, limit=None, cache=None, cwd=None):
+    """Yield (Revision, PlanDiff) for each commit that touched `path`, newest first."""
+    own_cache = cache is None
+    cache = cache or OutlineCache(cwd=cwd)
+    try:
+        for revision in revisions(path, revision_range, limit, cwd=cwd):
+            yield revision, diff(cache.get(revision.old_blob), cache.get(revision.new_blob))
+    finally:
+        if own_cache:
+            cache.close()
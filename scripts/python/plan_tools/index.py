@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""SQLite sidecar index of a plan's todos and headings.
+
+The index remembers the plan's mtime, size and sha256. refresh() only
+stats the file when nothing changed, hashes it when the stat differs,
+and re-parses only when the content really changed, so queries by id,
+status, id prefix or heading normally never touch the plan itself.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+DEFAULT_DB = os.path.join('scripts', 'python', '.cache', 'plan-index.sqlite')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS plans (
+  path TEXT PRIMARY KEY,
+  mtime_ns INTEGER,
+  size INTEGER,
+  sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS todos (
+  path TEXT,
+  position INTEGER,
+  id TEXT,
+  content TEXT,
+  status TEXT,
+  PRIMARY KEY (path, position)
+);
+CREATE INDEX IF NOT EXISTS idx_todos_id ON todos(path, id);
+CREATE INDEX IF NOT EXISTS idx_todos_status ON todos(path, status);
+CREATE TABLE IF NOT EXISTS sections (
+  path TEXT,
+  position INTEGER,
+  number TEXT,
+  title TEXT,
+  level INTEGER,
+  line INTEGER,
+  PRIMARY KEY (path, position)
+);
+CREATE INDEX IF NOT EXISTS idx_sections_number ON sections(path, number);
+'''
+
+
+def like_prefix(prefix):
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+class PlanIndex:
+    def __init__(self, plan_path, db_path=DEFAULT_DB):
+        self.plan_path = plan_path
+        self.key = os.path.abspath(plan_path)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def refresh(self):
+        """Bring the index up to date; returns True if the plan had to be re-parsed."""
+        stat = os.stat(self.plan_path)
+        row = self.db.execute('SELECT mtime_ns, size, sha256 FROM plans WHERE path = ?',
+                              (self.key,)).fetchone()
+        if row and (row[0], row[1]) == (stat.st_mtime_ns, stat.st_size):
+            return False
+        with open(self.plan_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if row and row[2] == digest:
+            # Touched but not changed
+            with self.db:
+                self.db.execute('UPDATE plans SET mtime_ns = ?, size = ? WHERE path = ?',
+                                (stat.st_mtime_ns, stat.st_size, self.key))
+            return False
+        from plan_tools.document import parse
+        self.store(parse(data.decode('utf-8')), stat, digest)
+        return True
+
+    def store(self, plan, stat=None, digest=None):
+        """Replace the indexed rows with `plan`, the model of the file as it is on disk."""
+        stat = stat or os.stat(self.plan_path)
+        digest = digest or hashlib.sha256(plan.text.encode('utf-8')).hexdigest()
+        sections = []
+        line = 1
+        offset = 0
+        for position, section in enumerate(plan.sections):
+            line += plan.text.count('\n', offset, section.start)
+            offset = section.start
+            sections.append((self.key, position, section.number, section.title, section.level, line))
+        with self.db:
+            self.db.execute('DELETE FROM todos WHERE path = ?', (self.key,))
+            self.db.execute('DELETE FROM sections WHERE path = ?', (self.key,))
+            self.db.executemany('INSERT INTO todos VALUES (?, ?, ?, ?, ?)',
+                                [(self.key, position, todo.id, todo.content, todo.status)
+                                 for position, todo in enumerate(plan.todos.values())])
+            self.db.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?)', sections)
+            self.db.execute('INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?)',
+                            (self.key, stat.st_mtime_ns, stat.st_size, digest))
+
+    def todos(self, ids=None, status=None, prefix=None):
+        """Return [(id, status, content)] in plan order, filtered by any combination."""
+        query = 'SELECT id, status, content FROM todos WHERE path = ?'
+        params = [self.key]
+        if ids:
+            query += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += list(ids)
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        if prefix:
+            query += " AND id LIKE ? ESCAPE '\\'"
+            params.append(like_prefix(prefix))
+        return self.db.execute(query + ' ORDER BY position', params).fetchall()
+
+    def sections(self, key=None, match=None):
+        """Return [(number, title, level, line)] by section number/title, or by title substring."""
+        query = 'SELECT number, title, level, line FROM sections WHERE path = ?'
+        params = [self.key]
+        if key:
+            key = key.lstrip('#').strip()
+            if key.lower().startswith('phase '):
+                key = key[6:].strip()
+            query += ' AND (number = ? OR title = ?)'
+            params += [key, key]
+        if match:
+            query += " AND title LIKE ? ESCAPE '\\'"
+            params.append('%' + like_prefix(match))
+        return self.db.execute(query + ' ORDER BY position', params).fetchall()
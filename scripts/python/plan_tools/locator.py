@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Multi-pattern anchor search (Aho-Corasick).
+
+All literal anchors of a patch run are compiled into one automaton and
+found in a single pass over the plan, with every match offset reported,
+so callers can tell a missing anchor from an ambiguous one. Works on str
+and on bytes-like input (bytes, mmap), and can be fed in chunks.
+"""
+
+import re
+from collections import deque
+
+
+class AnchorLocator:
+    def __init__(self, anchors):
+        self.anchors = list(dict.fromkeys(anchors))
+        if not self.anchors:
+            raise ValueError('AnchorLocator needs at least one anchor')
+        if any(not anchor for anchor in self.anchors):
+            raise ValueError('anchors must not be empty')
+        self._binary = isinstance(self.anchors[0], (bytes, bytearray))
+        self._lengths = [len(anchor) for anchor in self.anchors]
+        self._build()
+
+    def _build(self):
+        goto = [{}]
+        output = [()]
+        for index, anchor in enumerate(self.anchors):
+            state = 0
+            for symbol in anchor:
+                following = goto[state].get(symbol)
+                if following is None:
+                    following = len(goto)
+                    goto[state][symbol] = following
+                    goto.append({})
+                    output.append(())
+                state = following
+            output[state] += (index,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, following in goto[state].items():
+                queue.append(following)
+                fallback = fail[state]
+                while fallback and symbol not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(symbol, 0)
+                fail[following] = target if target != following else 0
+                output[following] += output[fail[following]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+        # While in the root state, jump straight to the next possible first symbol
+        firsts = sorted(goto[0])
+        if self._binary:
+            self._skip = re.compile(b'[' + b''.join(re.escape(bytes([s])) for s in firsts) + b']')
+        else:
+            self._skip = re.compile('[' + ''.join(re.escape(s) for s in firsts) + ']')
+
+    def _run(self, text, state, base, hits):
+        goto, fail, output, lengths = self._goto, self._fail, self._output, self._lengths
+        skip = self._skip.search
+        position = 0
+        size = len(text)
+        while position < size:
+            if not state:
+                match = skip(text, position)
+                if match is None:
+                    break
+                position = match.start()
+            symbol = text[position]
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for index in output[state]:
+                hits[index].append(base + position - lengths[index] + 1)
+            position += 1
+        return state
+
+    def scan(self, text):
+        """Return {anchor: [start offsets]} for every anchor, including misses."""
+        hits = [[] for _ in self.anchors]
+        self._run(text, 0, 0, hits)
+        return dict(zip(self.anchors, hits))
+
+    def scan_chunks(self, chunks):
+        """Like scan(), for input delivered as consecutive chunks."""
+        hits = [[] for _ in self.anchors]
+        state = 0
+        base = 0
+        for chunk in chunks:
+            state = self._run(chunk, state, base, hits)
+            base += len(chunk)
+        return dict(zip(self.anchors, hits))
+
+
+def check_unique(matches):
+    """Return a list of problems for anchors that matched zero or several times."""
+    problems = []
+    for anchor, offsets in matches.items():
+        if len(offsets) != 1:
+            shown = anchor if len(anchor) <= 60 else anchor[:57] + '...'
+            if not offsets:
+                where = 'not found'
+            else:
+                shown_offsets = ', '.join(map(str, offsets[:5])) + (', ...' if len(offsets) > 5 else '')
+                where = f'found {len(offsets)} times (offsets {shown_offsets})'
+            problems.append(f'anchor {shown!r} {where}')
+    return problems
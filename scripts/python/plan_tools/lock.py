@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Advisory lock around plan writes.
+
+The lock is taken on a sidecar file (".<plan name>.lock" next to the
+plan), not on the plan itself: writers replace the plan with os.replace,
+so a lock on the plan's inode would stop protecting anything after the
+first write. fcntl.flock on POSIX, msvcrt.locking on Windows. The lock
+is advisory: it orders our own tools, while edits from tools that do
+not take it are caught by the content check in patch.write_merged().
+"""
+
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class LockTimeout(Exception):
+    pass
+
+
+def lock_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f'.{name}.lock')
+
+
+class PlanLock:
+    """Exclusive lock for writing `path`; use as a context manager."""
+
+    def __init__(self, path, timeout=30.0, poll=0.01):
+        self.path = lock_path(path)
+        self.timeout = timeout
+        self.poll = poll
+        self.waited = 0.0
+        self._file = None
+
+    def _try_lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self):
+        self._file = open(self.path, 'a+b')
+        started = time.monotonic()
+        delay = self.poll
+        while not self._try_lock():
+            if time.monotonic() - started >= self.timeout:
+                self._file.close()
+                self._file = None
+                raise LockTimeout(f'timed out after {self.timeout:g} s waiting for {self.path}')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+        self.waited = time.monotonic() - started
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Structural three-way merge of plan documents.
+
+A plan is split into units: the frontmatter around the todo list, one
+unit per todo (its status merged separately from the rest, so a status
+change and a content edit to the same todo both survive) and a tree of
+heading sections, each holding its own text up to its first child.
+Units are matched by todo id and by section number or title among their
+siblings (a repeated id or key is told apart by its order, "2.1 #2"),
+and merged with the usual rules: a unit changed on one side
+takes that side's version, additions from both sides are kept (ours go
+after the unit they follow in our version), and a unit changed on both
+sides is merged line by line when the changes do not overlap.
+
+What cannot be merged is reported as a conflict; the result then holds
+their version of that unit.
+"""
+
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+
+from plan_tools.document import scan_text
+
+STATUS_MARK = '\x00'
+SPLIT_LINES_RE = re.compile(r'(?<=\n)')
+
+
+class MergeConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__('conflicting edits to ' + ', '.join(conflicts))
+        self.conflicts = conflicts
+
+
+@dataclass
+class MergeResult:
+    text: str
+    conflicts: list = field(default_factory=list)
+
+
+@dataclass
+class Node:
+    key: str
+    own: str
+    children: list = field(default_factory=list)
+
+    def text(self):
+        return join([self.own] + [child.text() for child in self.children])
+
+
+def join(pieces):
+    """Concatenate units, keeping each one on its own lines."""
+    out = []
+    for piece in pieces:
+        if out and out[-1] and not out[-1].endswith('\n') and piece:
+            out.append('\n')
+        out.append(piece)
+    return ''.join(out)
+
+
+def merge_lines(base, ours, theirs):
+    """diff3 on lines: the merged text, or None when the two sides touch the same lines."""
+    base_lines = SPLIT_LINES_RE.split(base)
+    changes = []
+    for side in (ours, theirs):
+        lines = SPLIT_LINES_RE.split(side)
+        matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+        changes += [(i1, i2, lines[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+    changes.sort(key=lambda change: (change[0], change[1]))
+    merged = []
+    for change in changes:
+        if merged:
+            start, end, lines = merged[-1]
+            if change == merged[-1]:
+                continue    # same edit on both sides
+            overlap = max(start, change[0]) < min(end, change[1])
+            inside = start < change[0] < end
+            if overlap or inside or change[0] == start:
+                return None
+        merged.append(change)
+    out = []
+    position = 0
+    for start, end, lines in merged:
+        out += base_lines[position:start]
+        out += lines
+        position = end
+    out += base_lines[position:]
+    return ''.join(out)
+
+
+def merge_text(base, ours, theirs, label, conflicts):
+    if ours == theirs or theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    if base is not None:
+        merged = merge_lines(base, ours, theirs)
+        if merged is not None:
+            return merged
+    conflicts.append(label)
+    return theirs
+
+
+def merge_sequence(base, ours, theirs, merge_item, label, conflicts):
+    """Merge three ordered [(key, item)] lists; their order wins, our additions follow our predecessors."""
+    base_items, our_items, their_items = dict(base), dict(ours), dict(theirs)
+    result = []
+    for key, theirs_item in theirs:
+        if key in our_items:
+            if key in base_items:
+                result.append((key, merge_item(base_items[key], our_items[key], theirs_item, key)))
+            else:
+                # Added on both sides
+                result.append((key, merge_item(None, our_items[key], theirs_item, key)))
+        elif key in base_items:
+            # We deleted it
+            if not same(base_items[key], theirs_item):
+                conflicts.append(f'{label} {key} (deleted here, edited on disk)')
+                result.append((key, theirs_item))
+        else:
+            result.append((key, theirs_item))
+
+    # Walk our order: our additions go right after the last shared unit before them (None: at the start),
+    # then go in with one pass over the result rather than one list insert each
+    additions = {}
+    anchor = None
+    for key, ours_item in ours:
+        if key in their_items:
+            anchor = key
+            continue
+        if key in base_items:
+            # They deleted it
+            if not same(base_items[key], ours_item):
+                conflicts.append(f'{label} {key} (edited here, deleted on disk)')
+            continue
+        additions.setdefault(anchor, []).append((key, ours_item))
+    if not additions:
+        return result
+    merged = list(additions.get(None, ()))
+    for key, item in result:
+        merged.append((key, item))
+        merged += additions.get(key, ())
+    return merged
+
+
+def same(left, right):
+    if isinstance(left, Node):
+        return left.text() == right.text()
+    return left == right
+
+
+def todo_parts(text, todo):
+    """(block with the status value replaced by a marker, status) for one todo."""
+    block = text[todo.start:todo.end]
+    if not todo.status_start:
+        return block, None
+    return (block[:todo.status_start - todo.start] + STATUS_MARK + block[todo.status_end - todo.start:],
+            todo.status)
+
+
+@dataclass
+class Parts:
+    head: str
+    todos: list         # [(id, (block with status marker, status))]
+    tail: str
+    root: Node
+
+
+def unique_key(key, taken):
+    """`key`, or "key #2", "key #3"... when it is already in `taken`."""
+    if key not in taken:
+        return key
+    count = 2
+    while f'{key} #{count}' in taken:
+        count += 1
+    return f'{key} #{count}'
+
+
+def split(text):
+    # The ordered todo list, not PlanDocument.todos: a repeated id would lose its later todos there
+    frontmatter_end, todos_end, todos, sections = scan_text(text)
+    todos_start = todos[0].start if todos else todos_end
+    todo_keys = set()
+    todo_units = []
+    for todo in todos:
+        key = unique_key(todo.id, todo_keys)
+        todo_keys.add(key)
+        todo_units.append((key, todo_parts(text, todo)))
+
+    root = Node('', '')
+    stack = [(0, root, set())]     # (level, node, keys of its children)
+    for index, section in enumerate(sections):
+        while stack[-1][0] >= section.level:
+            stack.pop()
+        _, parent, siblings = stack[-1]
+        following = sections[index + 1].start if index + 1 < len(sections) else len(text)
+        key = unique_key(section.number or section.title, siblings)
+        siblings.add(key)
+        node = Node(key, text[section.start:min(following, section.end)])
+        parent.children.append(node)
+        stack.append((section.level, node, set()))
+    root.own = text[frontmatter_end:sections[0].start if sections else len(text)]
+    return Parts(text[:todos_start], todo_units, text[todos_end:frontmatter_end], root)
+
+
+def merge_plans(base, ours, theirs):
+    """Merge `ours` and `theirs`, two edits of `base`; returns a MergeResult."""
+    if ours == theirs or theirs == base:
+        return MergeResult(ours)
+    if ours == base:
+        return MergeResult(theirs)
+    b, o, t = split(base), split(ours), split(theirs)
+    conflicts = []
+
+    def merge_todo(base_todo, our_todo, their_todo, todo_id):
+        base_block, base_status = base_todo or (None, None)
+        block = merge_text(base_block, our_todo[0], their_todo[0], f'todo {todo_id}', conflicts)
+        status = merge_text(base_status, our_todo[1], their_todo[1], f'todo {todo_id} status', conflicts)
+        return block, status
+
+    def merge_node(base_node, our_node, their_node, path):
+        own = merge_text(base_node.own if base_node else None, our_node.own, their_node.own,
+                         f'section {path}' if path else 'text before the first heading', conflicts)
+        children = merge_sequence([(child.key, child) for child in base_node.children] if base_node else [],
+                                  [(child.key, child) for child in our_node.children],
+                                  [(child.key, child) for child in their_node.children],
+                                  lambda b_child, o_child, t_child, key: merge_node(
+                                      b_child, o_child, t_child, f'{path} > {key}' if path else key),
+                                  'section', conflicts)
+        return Node(our_node.key, own, [child for _, child in children])
+
+    head = merge_text(b.head, o.head, t.head, 'frontmatter', conflicts)
+    todos = merge_sequence(b.todos, o.todos, t.todos, merge_todo, 'todo', conflicts)
+    tail = merge_text(b.tail, o.tail, t.tail, 'frontmatter', conflicts)
+    root = merge_node(b.root, o.root, t.root, '')
+    blocks = [block.replace(STATUS_MARK, status or '') for _, (block, status) in todos]
+    return MergeResult(join([head] + blocks + [tail]) + root.text(), conflicts)
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""Batch patch engine for plan documents.
+
+Patches are collected into PatchBatch objects, resolved against a single
+parsed PlanDocument and spliced in one pass. run() reads the plan once,
+applies any number of batches and writes the result once through a temp
+file and os.replace, so an interrupted write never leaves a truncated
+plan behind.
+
+Every todo and top-level section a patch would insert carries a
+fingerprint. Units whose id or section number is already in the plan are
+skipped, so re-running a patch set is a no-op and run() does not touch
+the file at all when nothing changed.
+
+A long-running caller (see plan_tools.watch) can pass `replaceable`: units
+whose current fingerprint it put there itself are replaced in place when
+their fragment changes, while units edited by hand are left alone.
+
+Patches anchored on literal text are located together: every anchor of
+the run goes into one AnchorLocator pass, and the run fails before
+writing if any anchor is missing or ambiguous.
+
+Passing a plan_tools.trace.Tracer records a span per stage (read, parse,
+locate, each patch op, serialize, write) with byte and match counts.
+
+Writes go through write_merged(): under an advisory lock (plan_tools.lock)
+the file is re-read, and if another writer changed it since it was read,
+the two versions are merged todo by todo and section by section
+(plan_tools.merge). When both touched the same unit, run() re-applies its
+batches to the other writer's version instead, still under the lock.
+"""
+
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+
+from plan_tools.document import (PlanDocument, fingerprint, parse, parse_todos,
+                                 todo_fingerprint, top_level_sections)
+from plan_tools.locator import check_unique
+from plan_tools.lock import LockTimeout, PlanLock
+from plan_tools.merge import MergeConflict, merge_plans
+from plan_tools.trace import NULL_TRACER
+
+APPLIED = 'applied'
+ALREADY_APPLIED = 'already-applied'
+MODIFIED = 'modified'    # present in the plan, but edited since it was inserted
+REPLACED = 'replaced'    # present with an older fragment's content, now updated
+
+STATUS_LINE_RE = re.compile(r'^(    status:[ \t]*).*$', re.MULTILINE)
+LOCK_TIMEOUT = 30.0
+
+
+class PatchError(Exception):
+    pass
+
+
+@dataclass
+class Outcome:
+    batch: str
+    unit: str
+    state: str
+
+
+@dataclass
+class Resolution:
+    """Edits for one run plus what happened to each unit."""
+    _plan: PlanDocument
+    edits: list = field(default_factory=list)
+    outcomes: list = field(default_factory=list)
+    # Units inserted earlier in the same run, so two batches never add one twice
+    pending: dict = field(default_factory=dict)
+    # Literal anchor -> start offsets, filled by one AnchorLocator pass
+    matches: dict = field(default_factory=dict)
+    # Unit key -> fingerprint that may be overwritten with a newer fragment
+    replaceable: dict = field(default_factory=dict)
+    # Unit key -> fingerprint of every unit that matches its fragment after this run
+    owned: dict = field(default_factory=dict)
+    tracer: object = NULL_TRACER
+    # The file had changed under us and was merged (or the batches re-applied) on write
+    merged: bool = False
+    # Builds .plan on first access after a write, so callers that never read it don't pay for it
+    _rebuild: object = None
+
+    @property
+    def plan(self):
+        if self._rebuild is not None:
+            self._plan, self._rebuild = self._rebuild(), None
+        return self._plan
+
+    @plan.setter
+    def plan(self, plan):
+        self._plan, self._rebuild = plan, None
+
+    def lookup(self, key):
+        return self.pending.get(key) or self.plan.fingerprint_of(key)
+
+    def record(self, batch, unit, state):
+        self.outcomes.append(Outcome(batch, unit, state))
+
+    @property
+    def changed(self):
+        return bool(self.edits)
+
+
+class AddTodos:
+    """Insert raw todo entries after/before a todo, or at the end of the list."""
+
+    kind = 'add_todos'
+
+    def __init__(self, text, after=None, before=None):
+        self.text = text if text.endswith('\n') else text + '\n'
+        self.after = after
+        self.before = before
+        self.units = [(('todo', todo.id), todo_fingerprint(todo.id, todo.content), block)
+                      for todo, block in parse_todos(self.text)]
+
+    @property
+    def keys(self):
+        return [('todo', todo_id) for todo_id in (self.after, self.before) if todo_id] + \
+            [key for key, _, _ in self.units]
+
+    def anchor(self, plan):
+        if self.after:
+            return plan.todo(self.after).end
+        if self.before:
+            return plan.todo(self.before).start
+        return plan.todos_end
+
+    def resolve(self, resolution, batch):
+        plan = resolution.plan
+        blocks, replacements = missing_units(resolution, batch, self.units)
+        for (_, todo_id), block in replacements:
+            todo = plan.todo(todo_id)
+            # Keep the progress recorded in the plan
+            block = STATUS_LINE_RE.sub(lambda match: match.group(1) + todo.status, block, count=1)
+            resolution.edits.append((todo.start, todo.end, block))
+        if blocks:
+            offset = self.anchor(plan)
+            resolution.edits.append((offset, offset, ''.join(blocks)))
+
+
+class InsertSection:
+    """Insert markdown after a section's subtree or before its heading."""
+
+    kind = 'insert_section'
+
+    def __init__(self, text, after=None, before=None):
+        if bool(after) == bool(before):
+            raise ValueError('InsertSection needs exactly one of after= or before=')
+        self.text = text.strip('\n') + '\n\n'
+        self.after = after
+        self.before = before
+        units = top_level_sections(self.text)
+        if not units:
+            raise ValueError('section fragments must contain at least one heading')
+        self.units = [(('section', section.number or section.title), fingerprint(block),
+                       block.strip('\n') + '\n\n') for section, block in units]
+
+    @property
+    def keys(self):
+        return [('section', self.after or self.before)] + [key for key, _, _ in self.units]
+
+    def anchor(self, plan):
+        if self.after:
+            return plan.section(self.after).end
+        return plan.section(self.before).start
+
+    def resolve(self, resolution, batch):
+        plan = resolution.plan
+        blocks, replacements = missing_units(resolution, batch, self.units)
+        for (_, key), block in replacements:
+            section = plan.section(key)
+            resolution.edits.append((section.start, section.end, block))
+        if not blocks:
+            return
+        offset = self.anchor(plan)
+        text = ''.join(blocks)
+        # Appending at the end of the file: keep a blank line before the heading
+        tail = plan.slice(max(offset - 2, 0), offset)
+        if offset == len(plan.text) and tail != '\n\n':
+            text = ('\n' if tail.endswith('\n') else '\n\n') + text
+        resolution.edits.append((offset, offset, text))
+
+
+class InsertAtAnchor:
+    """Insert text right after (or before) a literal anchor that must occur exactly once."""
+
+    kind = 'insert_at_anchor'
+
+    def __init__(self, anchor, text, before=False):
+        if not anchor:
+            raise ValueError('InsertAtAnchor needs a non-empty anchor')
+        self.anchor = anchor
+        self.text = text
+        self.before = before
+
+    @property
+    def anchors(self):
+        return [self.anchor]
+
+    def resolve(self, resolution, batch):
+        plan = resolution.plan
+        start = resolution.matches[self.anchor][0]
+        offset = start if self.before else start + plan.measure(self.anchor)
+        label = f'text at {self.anchor[:40]!r}'
+        size = plan.measure(self.text)
+        if self.before:
+            already = plan.slice(max(offset - size, 0), offset) == self.text
+        else:
+            already = plan.slice(offset, offset + size) == self.text
+        if already:
+            resolution.record(batch, label, ALREADY_APPLIED)
+            return
+        resolution.edits.append((offset, offset, self.text))
+        resolution.record(batch, label, APPLIED)
+
+
+class SetStatus:
+    kind = 'set_status'
+
+    def __init__(self, todo_id, status):
+        self.todo_id = todo_id
+        self.status = status
+
+    @property
+    def keys(self):
+        return [('todo', self.todo_id)]
+
+    def resolve(self, resolution, batch):
+        todo = resolution.plan.todo(self.todo_id)
+        unit = f'todo {self.todo_id} -> {self.status}'
+        if todo.status == self.status:
+            resolution.record(batch, unit, ALREADY_APPLIED)
+            return
+        # Later status updates for the same todo replace earlier ones
+        resolution.edits[:] = [edit for edit in resolution.edits
+                               if edit[:2] != (todo.status_start, todo.status_end)]
+        resolution.edits.append((todo.status_start, todo.status_end, self.status))
+        resolution.record(batch, unit, APPLIED)
+
+
+def missing_units(resolution, batch, units):
+    """Sort units into (blocks to insert, (key, block) pairs to replace), recording outcomes."""
+    blocks = []
+    replacements = []
+    for key, digest, block in units:
+        label = ' '.join(key)
+        existing = resolution.lookup(key)
+        if existing is None:
+            resolution.pending[key] = digest
+            resolution.record(batch, label, APPLIED)
+            blocks.append(block)
+        elif existing == digest:
+            resolution.record(batch, label, ALREADY_APPLIED)
+        elif resolution.replaceable.get(key) == existing and key not in resolution.pending:
+            resolution.pending[key] = digest
+            resolution.record(batch, label, REPLACED)
+            replacements.append((key, block))
+        else:
+            resolution.record(batch, label, MODIFIED)
+            continue
+        resolution.owned[key] = digest
+    return blocks, replacements
+
+
+class PatchBatch:
+    """An ordered set of todo inserts, section inserts and status updates."""
+
+    def __init__(self, name=''):
+        self.name = name
+        self.ops = []
+
+    def add_todos(self, text, after=None, before=None):
+        self.ops.append(AddTodos(text, after=after, before=before))
+        return self
+
+    def insert_section(self, text, after=None, before=None):
+        self.ops.append(InsertSection(text, after=after, before=before))
+        return self
+
+    def insert_at_anchor(self, anchor, text, before=False):
+        self.ops.append(InsertAtAnchor(anchor, text, before=before))
+        return self
+
+    def set_status(self, todo_id, status):
+        self.ops.append(SetStatus(todo_id, status))
+        return self
+
+    @property
+    def anchors(self):
+        return [anchor for op in self.ops for anchor in getattr(op, 'anchors', ())]
+
+    @property
+    def keys(self):
+        """('todo', id) and ('section', key) pairs the ops look up, for indexing only those."""
+        return [key for op in self.ops for key in getattr(op, 'keys', ())]
+
+    def resolve(self, resolution):
+        name = self.name or 'patch'
+        tracer = resolution.tracer
+        for op in self.ops:
+            edits = len(resolution.edits)
+            outcomes = len(resolution.outcomes)
+            with tracer.span(op.kind, 'patch', batch=name) as span:
+                try:
+                    op.resolve(resolution, name)
+                except KeyError as e:
+                    raise PatchError(f'{name}: {e.args[0]}') from None
+                if tracer.enabled:
+                    added = resolution.edits[edits:]
+                    span.set(units=len(resolution.outcomes) - outcomes, edits=len(added),
+                             inserted_chars=sum(len(edit[2]) for edit in added))
+
+
+def resolve_batches(plan, batches, replaceable=None, tracer=NULL_TRACER):
+    """Resolve every batch against the same model."""
+    resolution = Resolution(plan, replaceable=replaceable or {}, tracer=tracer)
+    anchors = [anchor for batch in batches for anchor in batch.anchors]
+    if anchors:
+        with tracer.span('locate', anchors=len(anchors)) as span:
+            resolution.matches = plan.locate(anchors)
+            span.set(matches=sum(len(offsets) for offsets in resolution.matches.values()))
+        problems = check_unique(resolution.matches)
+        if problems:
+            raise PatchError('; '.join(problems))
+    for batch in batches:
+        with tracer.span('resolve', batch=batch.name or 'patch', ops=len(batch.ops)):
+            batch.resolve(resolution)
+    return resolution
+
+
+def apply(plan, batches):
+    """Return the plan text with every batch applied."""
+    return plan.splice(resolve_batches(plan, batches).edits)
+
+
+def write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def write_merged(path, base, text, tracer=NULL_TRACER, on_conflict=None, timeout=LOCK_TIMEOUT):
+    """Write `text`, an edit of `base`, under the plan lock; returns the text now on disk.
+
+    If the file no longer holds `base`, another writer got there first and
+    both versions are merged. When they changed the same unit,
+    on_conflict(current text) is called, still under the lock, for the
+    text to write instead; without it MergeConflict is raised and nothing
+    is written.
+    """
+    lock = PlanLock(path, timeout)
+    with tracer.span('lock') as span:
+        try:
+            lock.acquire()
+        except LockTimeout as e:
+            raise PatchError(str(e)) from None
+        span.set(waited_ms=round(lock.waited * 1000, 3))
+    try:
+        current = read_text(path)
+        if current != base:
+            with tracer.span('merge') as span:
+                result = merge_plans(base, text, current)
+                span.set(conflicts=len(result.conflicts))
+            if result.conflicts:
+                if on_conflict is None:
+                    raise MergeConflict(result.conflicts)
+                text = on_conflict(current)
+            else:
+                text = result.text
+        if text != current:
+            write_atomic(path, text)
+    finally:
+        lock.release()
+    return text
+
+
+def run(path, batches, tracer=NULL_TRACER):
+    """Read the plan once, apply all batches, write once if anything changed.
+
+    Returns the Resolution; its .plan is the model of the file as it is on
+    disk afterwards, built on first access: re-indexed from the edits, or
+    parsed again only if another writer's changes were merged in.
+    """
+    with tracer.span('run', path=path, batches=len(batches)):
+        with tracer.span('read') as span:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+                span.set(bytes=os.fstat(f.fileno()).st_size)
+        with tracer.span('parse') as span:
+            plan = parse(text)
+            span.set(todos=len(plan.todos), sections=len(plan.sections))
+        resolution = resolve_batches(plan, batches, tracer=tracer)
+        if resolution.changed:
+            with tracer.span('serialize', edits=len(resolution.edits)) as span:
+                content = resolution.plan.splice(resolution.edits)
+                span.set(chars=len(content))
+
+            def rebase(current):
+                # Same units edited on both sides: apply the batches to their version instead
+                nonlocal resolution
+                with tracer.span('rebase'):
+                    resolution = resolve_batches(parse(current), batches, tracer=tracer)
+                    return resolution.plan.splice(resolution.edits) if resolution.changed else current
+
+            with tracer.span('write') as span:
+                written = write_merged(path, text, content, tracer=tracer, on_conflict=rebase)
+                span.set(bytes=os.path.getsize(path))
+            resolution.merged = written != content
+            if resolution.merged:
+                resolution._rebuild = lambda: parse(written)
+            else:
+                plan, edits = resolution.plan, resolution.edits
+                resolution._rebuild = lambda: plan.apply_edits(edits, content)
+    return resolution
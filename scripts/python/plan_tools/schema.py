@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""Schema model built from the SQL embedded in the plan.
+
+Fenced ```sql blocks in the plan and in the fragment files, plus the
+hand-written files in migrations/, are split into statements and merged
+into one Schema: tables (columns, keys, foreign keys) and indexes.
+Repeated definitions that only differ in whitespace, comments or
+IF NOT EXISTS are the same definition; real differences are reported as
+conflicts and the first definition wins.
+
+The model drives two things: missing_indexes(), which flags foreign keys
+and filter columns that no index supports, and sync_migrations(), which
+writes one numbered migration per table and rewrites a file only when
+its content changed.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+
+SQL_FENCE_RE = re.compile(r'^[ \t]*(```|~~~)[ \t]*sql\b[^\n]*\n(.*?)^[ \t]*\1[ \t]*$', re.M | re.S | re.I)
+CREATE_TABLE_RE = re.compile(r'CREATE\s+(?:(?:GLOBAL|LOCAL)\s+)?(?:(?:TEMP|TEMPORARY|UNLOGGED)\s+)?TABLE\s+'
+                             r'(?:IF\s+NOT\s+EXISTS\s+)?([\w."]+)\s*\(', re.I)
+CREATE_INDEX_RE = re.compile(r'CREATE\s+(UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?'
+                             r'(?:([\w."]+)\s+)?ON\s+(?:ONLY\s+)?([\w."]+)\s*(?:USING\s+(\w+)\s*)?\(', re.I)
+IF_NOT_EXISTS_RE = re.compile(r'^(CREATE\s+(?:UNIQUE\s+)?(?:TABLE|INDEX))\s+(?!IF\s+NOT\s+EXISTS|CONCURRENTLY)', re.I)
+REFERENCES_RE = re.compile(r'\bREFERENCES\s+([\w."]+)\s*(?:\(\s*([^)]*)\))?', re.I)
+TABLE_CONSTRAINT_RE = re.compile(r'^(?:CONSTRAINT\s+\S+\s+)?(PRIMARY\s+KEY|UNIQUE|FOREIGN\s+KEY|CHECK|EXCLUDE)\b\s*(.*)$',
+                                 re.I | re.S)
+INDEX_COLUMN_RE = re.compile(r'^"?(\w+)"?(?:\s+(?:ASC|DESC|NULLS\s+(?:FIRST|LAST)|\w+_ops))*$', re.I)
+MIGRATION_NAME_RE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+DOLLAR_TAG_RE = re.compile(r'\$\w*\$')
+
+GENERATED_MARKER = '-- Generated by scripts/python/plan_schema.py'
+# Index methods that support equality lookups on a leading column
+BTREE_METHODS = (None, 'btree', 'hash')
+# Columns the app filters or joins on even where they are not foreign keys
+DEFAULT_FILTER_COLUMNS = ('organization_id', 'event_id', 'guest_id', 'user_id', 'status', 'email')
+
+
+def identifier(name):
+    return name.replace('"', '').lower()
+
+
+def split_statements(sql):
+    """Yield (offset, raw, clean) for each ';'-terminated statement.
+
+    `clean` has comments blanked out; quotes and dollar-quoted bodies are
+    respected when looking for the terminating semicolon.
+    """
+    clean = []
+    start = 0
+    position = 0
+    length = len(sql)
+    while position < length:
+        char = sql[position]
+        if sql.startswith('--', position):
+            end = sql.find('\n', position)
+            end = length if end == -1 else end
+            clean.append(' ' * (end - position))
+            position = end
+        elif sql.startswith('/*', position):
+            end = sql.find('*/', position + 2)
+            end = length if end == -1 else end + 2
+            clean.append(re.sub(r'[^\n]', ' ', sql[position:end]))
+            position = end
+        elif char in '\'"':
+            end = sql.find(char, position + 1)
+            while end != -1 and sql.startswith(char * 2, end):
+                end = sql.find(char, end + 2)
+            end = length if end == -1 else end + 1
+            clean.append(sql[position:end])
+            position = end
+        elif char == '$' and DOLLAR_TAG_RE.match(sql, position):
+            tag = DOLLAR_TAG_RE.match(sql, position).group()
+            end = sql.find(tag, position + len(tag))
+            end = length if end == -1 else end + len(tag)
+            clean.append(sql[position:end])
+            position = end
+        elif char == ';':
+            text = ''.join(clean)
+            if text.strip():
+                yield start, sql[start:position + 1], text
+            clean = []
+            position += 1
+            start = position
+        else:
+            clean.append(char)
+            position += 1
+    text = ''.join(clean)
+    if text.strip():
+        yield start, sql[start:], text
+
+
+def closing_paren(text, start):
+    """Return the index of the ')' matching the '(' at `start`."""
+    depth = 0
+    for position in range(start, len(text)):
+        if text[position] == '(':
+            depth += 1
+        elif text[position] == ')':
+            depth -= 1
+            if depth == 0:
+                return position
+    raise ValueError('unbalanced parentheses')
+
+
+def split_top_level(text):
+    items = []
+    depth = 0
+    current = []
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            items.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if ''.join(current).strip():
+        items.append(''.join(current).strip())
+    return items
+
+
+def column_list(text):
+    return tuple(identifier(name.strip()) for name in text.split(',') if name.strip())
+
+
+def normalize(clean):
+    """Statement text as compared between sources."""
+    text = ' '.join(clean.split()).rstrip(';').strip().lower()
+    return re.sub(r'\s*([(),])\s*', r'\1', re.sub(r'\bif not exists\s+', '', text))
+
+
+@dataclass
+class Location:
+    path: str
+    line: int
+
+    def __str__(self):
+        return f'{self.path}:{self.line}'
+
+
+@dataclass
+class Statement:
+    raw: str
+    clean: str
+    location: Location
+
+    @property
+    def key(self):
+        return normalize(self.clean)
+
+    def idempotent(self):
+        """The statement text with IF NOT EXISTS added to CREATE TABLE/INDEX."""
+        raw = self.raw.strip()
+        lines = raw.split('\n')
+        # Leading comment lines stay in front of the statement
+        body = next((index for index, line in enumerate(lines) if not line.lstrip().startswith('--')), 0)
+        lines[body] = IF_NOT_EXISTS_RE.sub(r'\1 IF NOT EXISTS ', lines[body].lstrip(), count=1)
+        text = '\n'.join(lines)
+        return text if text.endswith(';') else text + ';'
+
+
+@dataclass
+class Table:
+    name: str
+    statement: Statement
+    columns: list = field(default_factory=list)
+    keys: list = field(default_factory=list)           # column tuples with an implicit unique index
+    foreign_keys: list = field(default_factory=list)   # (columns, referenced table)
+
+
+@dataclass
+class Index:
+    name: str
+    table: str
+    columns: tuple          # None entries are expressions
+    method: str
+    unique: bool
+    statement: Statement
+
+
+def parse_table(statement):
+    clean = statement.clean.strip()
+    match = CREATE_TABLE_RE.match(clean)
+    open_paren = match.end() - 1
+    table = Table(identifier(match.group(1)), statement)
+    for item in split_top_level(clean[open_paren + 1:closing_paren(clean, open_paren)]):
+        constraint = TABLE_CONSTRAINT_RE.match(item)
+        if constraint:
+            kind = ' '.join(constraint.group(1).upper().split())
+            rest = constraint.group(2)
+            if kind in ('PRIMARY KEY', 'UNIQUE'):
+                table.keys.append(column_list(rest[rest.index('(') + 1:closing_paren(rest, rest.index('('))]))
+            elif kind == 'FOREIGN KEY':
+                columns = column_list(rest[rest.index('(') + 1:closing_paren(rest, rest.index('('))])
+                reference = REFERENCES_RE.search(rest)
+                if reference:
+                    table.foreign_keys.append((columns, identifier(reference.group(1))))
+            continue
+        name, definition = (item.split(None, 1) + [''])[:2]
+        name = identifier(name)
+        table.columns.append(name)
+        if re.search(r'\bPRIMARY\s+KEY\b', definition, re.I) or re.search(r'\bUNIQUE\b', definition, re.I):
+            table.keys.append((name,))
+        reference = REFERENCES_RE.search(definition)
+        if reference:
+            table.foreign_keys.append(((name,), identifier(reference.group(1))))
+    return table
+
+
+def parse_index(statement):
+    clean = statement.clean.strip()
+    match = CREATE_INDEX_RE.match(clean)
+    open_paren = match.end() - 1
+    columns = []
+    for item in split_top_level(clean[open_paren + 1:closing_paren(clean, open_paren)]):
+        column = INDEX_COLUMN_RE.match(item)
+        columns.append(identifier(column.group(1)) if column else None)
+    method = match.group(4).lower() if match.group(4) else None
+    return Index(identifier(match.group(2) or ''), identifier(match.group(3)), tuple(columns), method,
+                 bool(match.group(1)), statement)
+
+
+def sql_blocks(text):
+    """Yield (sql, first line number) for every fenced sql block in markdown text."""
+    for match in SQL_FENCE_RE.finditer(text):
+        yield match.group(2), text.count('\n', 0, match.start(2)) + 1
+
+
+def is_generated(text):
+    return text.startswith(GENERATED_MARKER)
+
+
+class Schema:
+    def __init__(self):
+        self.tables = {}
+        self.indexes = {}
+        self.conflicts = []    # (name, kept location, ignored location)
+        self.errors = []       # (location, message)
+
+    def add_sql(self, sql, path, first_line=1):
+        for offset, raw, clean in split_statements(sql):
+            leading = len(clean) - len(clean.lstrip())
+            line = first_line + sql.count('\n', 0, offset + leading)
+            statement = Statement(raw, clean, Location(path, line))
+            head = clean.lstrip()
+            try:
+                if CREATE_TABLE_RE.match(head):
+                    self._add(self.tables, parse_table(statement))
+                elif CREATE_INDEX_RE.match(head):
+                    self._add(self.indexes, parse_index(statement))
+            except ValueError as e:
+                self.errors.append((statement.location, str(e)))
+
+    def _add(self, registry, item):
+        name = item.name or f'{item.table}({", ".join(str(column) for column in item.columns)})'
+        existing = registry.get(name)
+        if existing is None:
+            registry[name] = item
+        elif existing.statement.key != item.statement.key:
+            self.conflicts.append((name, existing.statement.location, item.statement.location))
+
+    def add_markdown(self, text, path):
+        for sql, line in sql_blocks(text):
+            self.add_sql(sql, path, line)
+
+    def table_indexes(self, table):
+        """Column tuples with an index on `table`, implicit key indexes included."""
+        indexed = [key for key in self.tables[table].keys]
+        indexed += [index.columns for index in self.indexes.values()
+                    if index.table == table and index.method in BTREE_METHODS]
+        return indexed
+
+    def dependency_order(self, names):
+        """Order table names so referenced tables come first; ties keep the given order."""
+        names = list(names)
+        remaining = set(names)
+        ordered = []
+        while remaining:
+            ready = [name for name in names if name in remaining and not any(
+                target in remaining and target != name
+                for _, target in self.tables[name].foreign_keys)]
+            # A reference cycle falls back to the given order
+            ready = ready or [next(name for name in names if name in remaining)]
+            for name in ready:
+                remaining.discard(name)
+                ordered.append(name)
+        return ordered
+
+
+def load_schema(plan_path, fragment_root=None, migrations_dir='migrations'):
+    """Merge hand-written migrations, the plan and the fragment files, in that order."""
+    schema = Schema()
+    if os.path.isdir(migrations_dir):
+        for name in sorted(os.listdir(migrations_dir)):
+            path = os.path.join(migrations_dir, name)
+            if not name.endswith('.sql'):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            if not is_generated(text):
+                schema.add_sql(text, path.replace(os.sep, '/'))
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        schema.add_markdown(f.read(), plan_path)
+    if fragment_root and os.path.isdir(fragment_root):
+        for directory, dirnames, filenames in os.walk(fragment_root):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith('.'))
+            for name in sorted(filenames):
+                if name.endswith('.md'):
+                    path = os.path.join(directory, name)
+                    with open(path, 'r', encoding='utf-8') as f:
+                        schema.add_markdown(f.read(), os.path.relpath(path).replace(os.sep, '/'))
+    return schema
+
+
+@dataclass
+class Advice:
+    table: str
+    columns: tuple
+    reason: str
+    location: Location
+
+    @property
+    def suggestion(self):
+        return (f"CREATE INDEX idx_{self.table.replace('.', '_')}_{'_'.join(self.columns)} "
+                f"ON {self.table}({', '.join(self.columns)});")
+
+
+def covers(indexed, columns):
+    """True if `indexed` starts with exactly the columns in `columns` (any order)."""
+    return len(indexed) >= len(columns) and set(indexed[:len(columns)]) == set(columns)
+
+
+def missing_indexes(schema, filter_columns=DEFAULT_FILTER_COLUMNS, ignore=()):
+    """Return Advice for foreign keys and filter columns no index supports.
+
+    `filter_columns` entries are plain column names or table.column;
+    `ignore` holds table.column entries to skip.
+    """
+    advice = []
+    for name, table in schema.tables.items():
+        indexed = schema.table_indexes(name)
+        candidates = [(columns, f'foreign key to {target}') for columns, target in table.foreign_keys]
+        foreign = {columns for columns, _ in table.foreign_keys}
+        candidates += [((column,), 'filter column') for column in table.columns
+                       if (column in filter_columns or f'{name}.{column}' in filter_columns)
+                       and (column,) not in foreign]
+        for columns, reason in candidates:
+            if any(f'{name}.{column}' in ignore for column in columns):
+                continue
+            if not any(covers(existing, columns) for existing in indexed):
+                advice.append(Advice(name, columns, reason, table.statement.location))
+    return advice
+
+
+def render_migration(schema, table, sources):
+    lines = [f'{GENERATED_MARKER} from the SQL blocks in the plan.',
+             f'-- Edit {", ".join(sources)} and re-run it instead of editing this file.', '']
+    lines.append(schema.tables[table].statement.idempotent())
+    indexes = [index for index in schema.indexes.values() if index.table == table]
+    if indexes:
+        lines.append('')
+        lines += [index.statement.idempotent() for index in indexes]
+    return '\n'.join(lines) + '\n'
+
+
+def read_migrations(directory):
+    """Return ({table: hand-written path}, {table: generated path}, highest number)."""
+    hand = {}
+    generated = {}
+    highest = 0
+    if not os.path.isdir(directory):
+        return hand, generated, highest
+    for name in sorted(os.listdir(directory)):
+        match = MIGRATION_NAME_RE.match(name)
+        if not match:
+            continue
+        highest = max(highest, int(match.group(1)))
+        path = os.path.join(directory, name)
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        owner = generated if is_generated(text) else hand
+        for _, _, clean in split_statements(text):
+            table = CREATE_TABLE_RE.match(clean.lstrip())
+            if table:
+                owner.setdefault(identifier(table.group(1)), path)
+    return hand, generated, highest
+
+
+def sync_migrations(schema, directory='migrations', dry_run=False):
+    """Write one numbered migration per table not covered by a hand-written file.
+
+    Returns [(path, state)] with states 'created', 'updated', 'unchanged'
+    and 'stale' (a generated file whose table left the schema; never deleted).
+    """
+    hand, generated, highest = read_migrations(directory)
+    results = []
+    for table in schema.dependency_order(schema.tables):
+        if table in hand:
+            continue
+        sources = sorted({schema.tables[table].statement.location.path} |
+                         {index.statement.location.path for index in schema.indexes.values()
+                          if index.table == table})
+        content = render_migration(schema, table, sources)
+        path = generated.get(table)
+        if path is None:
+            highest += 1
+            path = os.path.join(directory, f"{highest:03d}_{table.replace('.', '_')}.sql")
+            state = 'created'
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = 'unchanged' if f.read() == content else 'updated'
+        if state != 'unchanged' and not dry_run:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(content)
+        results.append((path, state))
+    results += [(path, 'stale') for table, path in generated.items() if table not in schema.tables]
+    return results
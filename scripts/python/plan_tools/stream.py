@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Streaming patch mode for very large plan documents.
+
+The source plan is memory-mapped instead of read into a str. The map is
+scanned as bytes by document.scan_text() itself, but only the todos and
+headings the batches look up are kept (by byte offset), and only their
+ids, titles and values are decoded. The output is written by copying
+the untouched spans straight from the map into the temp file, with only
+the inserted fragments encoded in memory, so peak memory follows the
+size of the inserted content, not of the plan.
+
+The temp file replaces the plan under the plan lock. Keeping the old
+text around for a three-way merge would defeat the point of streaming,
+so if the plan changed since it was mapped (new inode, size or mtime),
+the batches are re-applied to the new version while the lock is held.
+"""
+
+import mmap
+import os
+import tempfile
+
+from plan_tools.document import SECTION_KEY_RE, PlanDocument, scan_text
+from plan_tools.locator import AnchorLocator
+from plan_tools.lock import LockTimeout, PlanLock
+from plan_tools.patch import LOCK_TIMEOUT, PatchError, resolve_batches, run
+from plan_tools.trace import NULL_TRACER
+
+
+def wanted_keys(batches):
+    """Todo ids, section titles and section numbers the batches can look up."""
+    todo_ids, titles, numbers = set(), set(), set()
+    for batch in batches:
+        for kind, name in batch.keys:
+            if kind == 'todo':
+                todo_ids.add(name)
+                continue
+            # section() strips '#'s and tries the title first; fingerprint_of() takes the name as is
+            key = name.lstrip('#').strip()
+            titles.update((name, key))
+            numbers.add(name)
+            number = SECTION_KEY_RE.match(key)
+            if number:
+                numbers.add(number.group(1))
+    return todo_ids, titles, numbers
+
+
+class MappedPlan(PlanDocument):
+    """PlanDocument over an mmap; every offset is a byte offset.
+
+    Only the todos and headings passed to from_mmap() are indexed, so
+    lookups of anything else fail as if it were not in the plan.
+    """
+
+    @classmethod
+    def from_mmap(cls, mapped, batches):
+        return cls(mapped, *scan_text(mapped, *wanted_keys(batches)))
+
+    def measure(self, text):
+        return len(text.encode('utf-8'))
+
+    def slice(self, start, end):
+        # Offsets worked out from measure() can land inside a character; such a slice never compares equal
+        return self.text[start:end].decode('utf-8', errors='replace')
+
+    def locate(self, anchors):
+        encoded = {anchor: anchor.encode('utf-8') for anchor in anchors}
+        matches = AnchorLocator(list(encoded.values())).scan(self.text)
+        return {anchor: matches[data] for anchor, data in encoded.items()}
+
+    def splice(self, edits):
+        raise TypeError('MappedPlan is written with write_spliced(), not spliced in memory')
+
+
+def write_spliced(mapped, edits, out):
+    """Write `mapped` with (start, end, replacement) edits applied to the binary file `out`."""
+    view = memoryview(mapped)
+    try:
+        position = 0
+        for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+            if start < position:
+                raise ValueError(f'overlapping edits at offset {start}')
+            out.write(view[position:start])
+            out.write(replacement.encode('utf-8'))
+            position = end
+        out.write(view[position:])
+    finally:
+        view.release()
+
+
+def stat_key(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def stream_to_temp(path, batches, tracer):
+    """Resolve against the mapped plan and write the result next to it; returns (resolution, temp path, stat)."""
+    tmp_path = None
+    with open(path, 'rb') as source:
+        seen = stat_key(path)
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with tracer.span('parse', bytes=len(mapped)) as span:
+                plan = MappedPlan.from_mmap(mapped, batches)
+                span.set(todos=len(plan.todos), sections=len(plan.sections))
+            resolution = resolve_batches(plan, batches, tracer=tracer)
+            if resolution.changed:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                                prefix='.' + os.path.basename(path) + '.',
+                                                suffix='.tmp')
+                try:
+                    with tracer.span('write', edits=len(resolution.edits)) as span:
+                        with os.fdopen(fd, 'wb') as out:
+                            write_spliced(mapped, resolution.edits, out)
+                            out.flush()
+                            os.fsync(out.fileno())
+                            span.set(bytes=out.tell())
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+    # The map and source handle are closed before the rename (required on Windows)
+    return resolution, tmp_path, seen
+
+
+def run_streaming(path, batches, tracer=NULL_TRACER):
+    """Streaming counterpart of patch.run(); returns the Resolution.
+
+    The returned resolution's .plan refers to a map that is already
+    closed, so only its offsets and outcomes should be used.
+    """
+    if os.path.getsize(path) == 0:
+        # Nothing to map; the in-memory path handles the empty file
+        return run(path, batches, tracer=tracer)
+
+    with tracer.span('run', path=path, batches=len(batches), streaming=True):
+        resolution, tmp_path, seen = stream_to_temp(path, batches, tracer)
+        if tmp_path is None:
+            return resolution
+        lock = PlanLock(path, LOCK_TIMEOUT)
+        try:
+            with tracer.span('lock') as span:
+                try:
+                    lock.acquire()
+                except LockTimeout as e:
+                    raise PatchError(str(e)) from None
+                span.set(waited_ms=round(lock.waited * 1000, 3))
+            if stat_key(path) != seen:
+                # Changed since we mapped it: apply the batches to the new version instead
+                os.unlink(tmp_path)
+                with tracer.span('rebase'):
+                    resolution, tmp_path, _ = stream_to_temp(path, batches, tracer)
+                resolution.merged = True
+            if tmp_path is not None:
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+                os.replace(tmp_path, path)
+                tmp_path = None
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            lock.release()
+    return resolution
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Stage timings for patch runs, exportable as a Chrome trace.
+
+A Tracer records nested spans (read, parse, locate, one per patch op,
+serialize, write) with byte and match counts in their args. write()
+produces the Trace Event JSON understood by chrome://tracing, Perfetto
+and speedscope; summary() folds the spans into per-stage totals for
+--profile. NULL_TRACER is the default everywhere and costs one method
+call per span.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.finish(self, time.perf_counter_ns())
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class NullTracer:
+    enabled = False
+    _span = NullSpan()
+
+    def span(self, name, category='plan', **args):
+        return self._span
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer:
+    enabled = True
+
+    def __init__(self, process_name='plan_tools'):
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': process_name}}]
+        self.spans = []     # (name, duration ns, args) in completion order
+
+    def span(self, name, category='plan', **args):
+        return Span(self, name, category, args)
+
+    def finish(self, span, end):
+        self.spans.append((span.name, end - span.start, span.args))
+        self.events.append({'name': span.name, 'cat': span.category, 'ph': 'X',
+                            'ts': (span.start - self.origin) / 1000, 'dur': (end - span.start) / 1000,
+                            'pid': self.pid, 'tid': threading.get_ident(), 'args': span.args})
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def summary(self):
+        """Return [(name, count, seconds, summed numeric args)] in first-seen order."""
+        totals = {}
+        for name, duration, args in self.spans:
+            entry = totals.setdefault(name, [0, 0, {}])
+            entry[0] += 1
+            entry[1] += duration
+            for key, value in args.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    entry[2][key] = entry[2].get(key, 0) + value
+        return [(name, count, duration / 1e9, sums) for name, (count, duration, sums) in totals.items()]
+
+    def format_summary(self):
+        rows = self.summary()
+        width = max((len(name) for name, *_ in rows), default=5)
+        lines = [f"{'stage':<{width}}  {'count':>5}  {'ms':>9}  details"]
+        for name, count, seconds, sums in rows:
+            details = ', '.join(f'{key}={value}' for key, value in sums.items())
+            lines.append(f'{name:<{width}}  {count:>5}  {seconds * 1000:>9.3f}  {details}')
+        return '\n'.join(lines)
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', action='store_true', help='print per-stage timings to stderr')
+    # Resolved when parsed, since the CLIs change to the project root before the trace is written
+    parser.add_argument('--trace', metavar='FILE', type=os.path.abspath,
+                        help='write a Chrome trace (chrome://tracing, Perfetto) to FILE')
+
+
+def from_args(args, process_name='plan_tools'):
+    return Tracer(process_name) if args.profile or args.trace else NULL_TRACER
+
+
+def report(tracer, args, stream=None):
+    """Print the --profile summary and write the --trace file, if requested."""
+    if not tracer.enabled:
+        return
+    if args.profile:
+        print(tracer.format_summary(), file=stream or sys.stderr)
+    if args.trace:
+        tracer.write(args.trace)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Watch mode: keep the plan loaded and re-apply patches as fragments change.
+
+PatchDaemon parses the plan once and keeps the model in memory. When a
+fragment file changes, only the patches that insert that fragment are
+re-resolved; units the daemon inserted itself are replaced in place, the
+model is updated with PlanDocument.apply_edits() (no re-parse) and the
+file is written once. Writes made by the daemon are recognised by their
+stat and digest and do not trigger another round. Writes go through
+patch.write_merged(), so an edit that lands between an event and our
+write is merged in rather than overwritten.
+
+File events come from inotify on Linux (via ctypes, no extra packages)
+and from stat polling everywhere else.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import time
+
+from plan_tools.document import PlanDocument, parse
+from plan_tools.merge import MergeConflict
+from plan_tools.patch import ALREADY_APPLIED, PatchBatch, resolve_batches, write_merged
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_EVENT_HEADER = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    def __init__(self, paths, interval=0.25):
+        self.interval = interval
+        self._stats = {}
+        self.set_paths(paths)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def set_paths(self, paths):
+        self._stats = {os.path.abspath(path): self._stat(path) for path in paths}
+
+    def wait(self, timeout=None):
+        """Return the set of watched paths that changed, or an empty set on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, previous in self._stats.items():
+                current = self._stat(path)
+                if current != previous:
+                    self._stats[path] = current
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval if deadline is None
+                       else max(0, min(self.interval, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watches the parent directories, so atomic renames over a file are seen."""
+
+    def __init__(self, paths):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._directories = {}    # watch descriptor -> directory
+        self._paths = set()
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        self._paths = {os.path.abspath(path) for path in paths}
+        watched = set(self._directories.values())
+        for directory in {os.path.dirname(path) for path in self._paths} - watched:
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory),
+                                                      IN_CLOSE_WRITE | IN_MOVED_TO)
+            if descriptor < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+            self._directories[descriptor] = directory
+
+    def wait(self, timeout=None):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        changed = set()
+        if not ready:
+            return changed
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                descriptor, _, _, length = IN_EVENT_HEADER.unpack_from(data, offset)
+                offset += IN_EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                directory = self._directories.get(descriptor)
+                if directory is not None:
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if path in self._paths:
+                        changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(paths, poll=False):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
+
+
+class PatchDaemon:
+    def __init__(self, plan_path, set_names, registry, log=print):
+        self.plan_path = os.path.abspath(plan_path)
+        self.set_names = list(set_names)
+        self.registry = registry
+        self.log = log
+        self.plan = None
+        self._written = None      # (mtime_ns, size, sha256) of the plan as we last saw it
+        self._owned = {}          # unit key -> fingerprint the daemon is allowed to replace
+        self._fragment_digests = {}
+
+    def watched_paths(self):
+        paths = [self.plan_path, os.path.join(self.registry.root, 'manifest.json')]
+        paths += [os.path.join(self.registry.root, name)
+                  for name in self.registry.fragment_names(self.set_names)]
+        return paths
+
+    def _remember_file(self, text):
+        stat = os.stat(self.plan_path)
+        self._written = (stat.st_mtime_ns, stat.st_size,
+                         hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+    def load(self):
+        """Parse the plan and apply every patch set; returns the resolution."""
+        self.plan = PlanDocument.read(self.plan_path)
+        self._remember_file(self.plan.text)
+        for name in self.registry.fragment_names(self.set_names):
+            self._fragment_digests[name] = self.registry.fragment(name).digest
+        return self.apply([self.registry.patch_set(name) for name in self.set_names])
+
+    def apply(self, batches):
+        resolution = resolve_batches(self.plan, batches, replaceable=self._owned)
+        self._owned.update(resolution.owned)
+        if resolution.changed:
+            text = self.plan.splice(resolution.edits)
+            try:
+                written = write_merged(self.plan_path, self.plan.text, text)
+            except MergeConflict:
+                # Someone else edited the units we touched: start over from their version
+                return self.load()
+            if written == text:
+                self.plan = self.plan.apply_edits(resolution.edits, text)
+            else:
+                self.plan = parse(written)
+            self._remember_file(written)
+        resolution.plan = self.plan
+        return resolution
+
+    def _plan_changed_externally(self):
+        try:
+            stat = os.stat(self.plan_path)
+        except OSError:
+            return False
+        if self._written and (stat.st_mtime_ns, stat.st_size) == self._written[:2]:
+            return False
+        with open(self.plan_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if self._written and digest == self._written[2]:
+            self._written = (stat.st_mtime_ns, stat.st_size, digest)
+            return False
+        return True
+
+    def handle(self, paths):
+        """Re-apply what the changed paths affect; returns the resolution or None."""
+        manifest_path = os.path.join(self.registry.root, 'manifest.json')
+        if manifest_path in paths:
+            self.registry.invalidate()
+            self._fragment_digests.clear()
+            return self.load()
+        if self.plan_path in paths and self._plan_changed_externally():
+            # Someone else edited the plan: the model has to be rebuilt from disk
+            return self.load()
+
+        batch = PatchBatch('watch')
+        for path in sorted(paths - {self.plan_path}):
+            name = os.path.relpath(path, self.registry.root).replace(os.sep, '/')
+            self.registry.invalidate(name)
+            try:
+                digest = self.registry.fragment(name).digest
+            except OSError:
+                continue      # deleted or mid-rename; the next event will bring it back
+            if self._fragment_digests.get(name) == digest:
+                continue
+            self._fragment_digests[name] = digest
+            for set_name, patch in self.registry.patches_using(name, self.set_names):
+                self.registry.add_patch(batch, patch, set_name)
+        self.registry.save()
+        if not batch.ops:
+            return None
+        return self.apply([batch])
+
+    def serve(self, watcher, debounce=0.1):
+        """Block forever, applying changes as they settle."""
+        while True:
+            changed = watcher.wait()
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+            started = time.perf_counter()
+            resolution = self.handle(changed)
+            if resolution is None:
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            watcher.set_paths(self.watched_paths())
+            changes = [f'{outcome.unit} ({outcome.state})' for outcome in resolution.outcomes
+                       if outcome.state != ALREADY_APPLIED]
+            if resolution.changed:
+                self.log(f'[{time.strftime("%H:%M:%S")}] applied in {elapsed:.1f} ms: '
+                         + ', '.join(changes))
+            elif changes:
+                self.log(f'[{time.strftime("%H:%M:%S")}] nothing written: ' + ', '.join(changes))
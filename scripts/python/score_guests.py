@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Score guest importance in batches, reusing cached scores for unchanged guests.
+
+    python scripts/python/score_guests.py guests.csv -o guest_metadata.csv --context "Annual investor dinner"
+    python scripts/python/score_guests.py guests.csv -o scores.csv --backend stub     # no API calls
+
+Scores are cached by the hash of the guest data, event context and
+prompt version (scripts/python/.cache/importance-scores.jsonl), so
+re-scoring an unchanged event makes no model calls, and an interrupted
+run picks up where it stopped. The output columns match guest_metadata:
+COPY guest_metadata (guest_id, importance_score, importance_reasoning,
+importance_factors, importance_calculated_at, importance_data_hash)
+FROM ... CSV HEADER.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from datetime import datetime, timezone
+
+from guests.importer import GuestImportError
+from guests.scoring import (DEFAULT_CACHE, BatchScorer, OpenAIBackend, ScoreCache, ScoringError, StubBackend,
+                            read_scoring_input)
+
+OUTPUT_COLUMNS = ('guest_id', 'importance_score', 'importance_reasoning', 'importance_factors',
+                  'importance_calculated_at', 'importance_data_hash')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch importance scoring with a content-hash cache.')
+    parser.add_argument('input', help='guest CSV/TSV/XLSX (id, name, company, job title, notes, tags, ...)')
+    parser.add_argument('-o', '--output', required=True, help='guest_metadata CSV to write')
+    parser.add_argument('--context', default='', help='event context given to the model')
+    parser.add_argument('--backend', choices=('openai', 'stub'), default='openai',
+                        help='scoring backend (default openai; stub scores locally)')
+    parser.add_argument('--model', default='gpt-4o-mini', help='OpenAI model (default gpt-4o-mini)')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight (default 8)')
+    parser.add_argument('--rpm', type=float, default=500, help='requests per minute (default 500)')
+    parser.add_argument('--tpm', type=float, help='prompt tokens per minute (default: unlimited)')
+    parser.add_argument('--max-retries', type=int, default=5, help='retries per guest (default 5)')
+    parser.add_argument('--ttl-days', type=float, default=30, help='re-score cached scores older than this')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='score cache file')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='seconds per stub call')
+    parser.add_argument('-v', '--verbose', action='store_true', help='report progress')
+    args = parser.parse_args(argv)
+
+    def progress(stats, done, total):
+        if stats.scored % 100 == 0:
+            print(f'  {done}/{total} scored ({stats.calls} calls, {stats.retries} retries)', file=sys.stderr)
+
+    cache = ScoreCache(args.cache, ttl=args.ttl_days * 24 * 3600)
+    backend = None
+    try:
+        backend = StubBackend(latency=args.stub_latency) if args.backend == 'stub' else OpenAIBackend(model=args.model)
+        scorer = BatchScorer(backend, cache, concurrency=args.concurrency, requests_per_minute=args.rpm,
+                             tokens_per_minute=args.tpm, max_retries=args.max_retries,
+                             progress=progress if args.verbose else None)
+        guests = list(read_scoring_input(args.input))
+        results, stats = asyncio.run(scorer.score(guests, context=args.context))
+    except (ScoringError, GuestImportError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print('Interrupted; finished scores are cached, run again to resume', file=sys.stderr)
+        return 130
+    finally:
+        cache.compact()
+        if isinstance(backend, OpenAIBackend):
+            backend.close()
+
+    with open(args.output, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_COLUMNS)
+        for guest_id, score in results.items():
+            if score is not None:
+                calculated_at = datetime.fromtimestamp(score.calculated_at, timezone.utc)
+                writer.writerow([guest_id, f'{score.score:.2f}', score.reasoning, json.dumps(score.factors),
+                                 calculated_at.strftime('%Y-%m-%d %H:%M:%S'), score.data_hash])
+
+    print(json.dumps({'guests': stats.guests, 'unique': stats.unique, 'cached': stats.cached,
+                      'scored': stats.scored, 'calls': stats.calls, 'retries': stats.retries,
+                      'failed': stats.failed, 'seconds': round(stats.seconds, 2)}, indent=2))
+    for key, error in list(stats.errors.items())[:10]:
+        print(f'  failed {key[:12]}: {error}', file=sys.stderr)
+    return 1 if stats.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
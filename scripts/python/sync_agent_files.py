@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Keep the agent skill copies in sync with their source directories.
+
+Sources and target directories are listed in agent_sync_manifest.json;
+adding an agent is one "targets" entry. A state file records the stat and
+sha256 of every source and target file, so an up-to-date tree is
+verified with stat calls alone and only changed files are hashed and
+copied. Copies fan out across target directories in a process pool.
+Target files the state records but the manifest no longer produces (a
+source file was removed, or a target dropped from the manifest) are
+deleted, and their state entries with them.
+
+    python scripts/python/sync_agent_files.py              # sync
+    python scripts/python/sync_agent_files.py --dry-run    # list copies and deletions only
+    python scripts/python/sync_agent_files.py --check      # exit 1 if out of sync
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agent_sync_manifest.json')
+STATE_PATH = os.path.join('scripts', 'python', '.cache', 'agent-sync.json')
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stat_key(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def known_digest(state, path):
+    """Return the recorded digest of `path` if its stat is unchanged, hashing it otherwise."""
+    entry = state.get(path)
+    current = stat_key(path)
+    if entry and entry[:2] == current:
+        return entry[2]
+    digest = file_digest(path)
+    state[path] = current + [digest]
+    return digest
+
+
+def source_files(manifest, state):
+    """Return ({source name: {relative path: digest}}, set of source file paths)."""
+    sources = {}
+    paths = set()
+    for name, root in manifest['sources'].items():
+        files = {}
+        if os.path.isfile(root):
+            files[os.path.basename(root)] = known_digest(state, root)
+            paths.add(root)
+        else:
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    files[os.path.relpath(path, root).replace(os.sep, '/')] = known_digest(state, path)
+                    paths.add(path)
+        sources[name] = files
+    return sources, paths
+
+
+def plan_copies(manifest, sources, state):
+    """Return ({target dir: [(source path, target path, digest)]} for out-of-date files, set of all targets)."""
+    jobs = {}
+    targets = set()
+    for target_dir, names in manifest['targets'].items():
+        for name in names:
+            root = manifest['sources'][name]
+            single_file = os.path.isfile(root)
+            for relative, digest in sources[name].items():
+                source = root if single_file else os.path.join(root, relative)
+                target = os.path.join(target_dir, relative if single_file else os.path.join(name, relative))
+                targets.add(target)
+                entry = state.get(target)
+                if entry and entry[2] == digest and os.path.exists(target) \
+                        and stat_key(target) == entry[:2]:
+                    # Target entries carry their source as a fourth item, which marks them for pruning
+                    state[target] = entry[:3] + [source]
+                    continue
+                # Unknown or touched target: hash it before deciding to copy
+                if os.path.exists(target) and known_digest(state, target) == digest:
+                    state[target] = state[target][:3] + [source]
+                    continue
+                jobs.setdefault(target_dir, []).append((source, target, digest))
+    return jobs, targets
+
+
+def stale_targets(state, source_paths, targets):
+    """Return recorded target files the manifest no longer produces; forget other unused entries."""
+    stale = []
+    for path in [path for path in state if path not in targets and path not in source_paths]:
+        if len(state[path]) > 3:
+            stale.append(path)
+        else:
+            del state[path]     # a source file that is gone or no longer listed
+    return sorted(stale)
+
+
+def remove_targets(stale, state):
+    for target in stale:
+        try:
+            os.unlink(target)
+        except FileNotFoundError:
+            pass
+        del state[target]
+
+
+def copy_files(jobs):
+    """Worker: copy one target directory's files; returns [(target, stat key)]."""
+    copied = []
+    for source, target, _ in jobs:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = target + '.sync-tmp'
+        shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, target)
+        copied.append((target, stat_key(target)))
+    return copied
+
+
+def sync(manifest, state, workers=None, dry_run=False):
+    """Copy out-of-date files and delete stale ones; returns (copy jobs, stale target paths)."""
+    sources, source_paths = source_files(manifest, state)
+    jobs, targets = plan_copies(manifest, sources, state)
+    stale = stale_targets(state, source_paths, targets)
+    if dry_run:
+        return jobs, stale
+    remove_targets(stale, state)
+    if not jobs:
+        return jobs, stale
+    digests = {target: digest for batch in jobs.values() for _, target, digest in batch}
+    sources_of = {target: source for batch in jobs.values() for source, target, _ in batch}
+    if len(jobs) == 1:
+        results = [copy_files(next(iter(jobs.values())))]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(copy_files, jobs.values()))
+    for copied in results:
+        for target, key in copied:
+            state[target] = key + [digests[target], sources_of[target]]
+    return jobs, stale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sync skill files to every agent directory.')
+    parser.add_argument('--check', action='store_true', help='report out-of-date files and exit 1, without copying')
+    parser.add_argument('--dry-run', action='store_true', help='list the copies and deletions a sync would make')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list every copied file')
+    args = parser.parse_args(argv)
+
+    # Change to project root directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+
+    started = time.perf_counter()
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    state = load_json(STATE_PATH, {})
+    before = dict(state)
+    dry_run = args.check or args.dry_run
+    jobs, stale = sync(manifest, state, workers=args.workers, dry_run=dry_run)
+    if state != before:
+        save_json(STATE_PATH, state)
+
+    count = sum(len(batch) for batch in jobs.values())
+    if args.verbose or dry_run:
+        for batch in jobs.values():
+            for _, target, _ in batch:
+                print(f'  {target}')
+        for target in stale:
+            print(f'  delete {target}')
+    elapsed = (time.perf_counter() - started) * 1000
+    if args.check:
+        print(f'{count + len(stale)} file(s) out of date' if count or stale else 'All agent copies are up to date')
+        return 1 if count or stale else 0
+    if args.dry_run:
+        print(f'Would sync {count} file(s) and delete {len(stale)} stale file(s)')
+        return 0
+    print(f'Synced {count} file(s) to {len(jobs)} director{"y" if len(jobs) == 1 else "ies"}'
+          + (f', deleted {len(stale)} stale file(s)' if stale else '') + f' in {elapsed:.1f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Run with: python -m pytest scripts/python/tests"""
+
+import os
+import sys
+
+# The packages under test (plan_tools, guests, checkoff) live next to this directory, as the CLIs import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""The full parse, the incremental rescan and the stream index must agree on every span."""
+
+import glob
+import itertools
+import mmap
+import os
+import random
+from dataclasses import astuple
+from types import SimpleNamespace
+
+import pytest
+
+from bench_plan_tools import generate_plan
+from plan_tools.document import parse, scan_text
+from plan_tools.stream import MappedPlan
+
+PLANS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))), '.cursor', 'plans')
+
+EDGE_PLAN = '''---
+name: Edge cases
+todos:
+  - id: "quoted-id"
+    content: 'It''s quoted'
+    status: "in_progress"
+  - id: repeated
+    content: First of two
+    status: pending
+  - id: repeated
+    content: Second of two
+    status: completed
+  - id: no-status
+    content: Nothing else
+isProject: false
+todos:
+  - id: second-list
+    status: pending
+---
+
+# Phase 1: Start é
+
+## 2.1é Non-ASCII after the number
+
+  ```
+# fenced behind a no-break space
+  ```
+
+ ```
+## 2.2 Not a fence, so a heading
+
+  ~~~ indented fence
+### 2.2.1 Inside the fence
+  ~~~
+
+    code ``` mid-line
+## Phase 3 Loose  ##
+#### 3.1a Deep
+##no space, not a heading
+# 2.1é Repeated title
+###### 9 Six
+## Trailing
+```
+# after an unclosed fence
+'''
+
+
+def random_plan(rng):
+    pieces = ['---\n', 'todos:\n', 'name: x\n', '  - id: a\n', '  - id: "b"\n', '    content: c\n',
+              '    status: pending\n', '    status: done\r\n', '  - id: a\r\n', '\n', '## 1.2 Sub\n',
+              '# Top\n', '### 1.2.3a Deep\r\n', '```\n', '  ~~~\n', '  ```\n', ' ```\n', 'text\n',
+              '## 2.1é\n', '## Phase 4: x\n', 'isProject: false\n', '#### \n', '# é 2\n']
+    return ''.join(rng.choice(pieces) for _ in range(rng.randrange(1, 30)))
+
+
+def plans():
+    found = [('real ' + os.path.basename(path), path) for path in sorted(glob.glob(os.path.join(PLANS_DIR, '*.md')))]
+    assert found, f'no plans under {PLANS_DIR}'
+    texts = []
+    for name, path in found:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            texts.append((name, f.read()))
+    texts += [('synthetic', generate_plan(300)), ('synthetic deep', generate_plan(40, depth=6, seed=3)),
+              ('edge', EDGE_PLAN), ('edge crlf', EDGE_PLAN.replace('\n', '\r\n'))]
+    rng = random.Random(5)
+    texts += [(f'random {number}', random_plan(rng)) for number in range(150)]
+    return texts
+
+
+PLANS = plans()
+each_plan = pytest.mark.parametrize('text', [text for _, text in PLANS], ids=[name for name, _ in PLANS])
+
+
+def spans(frontmatter_end, todos_end, todos, sections, position=lambda offset: offset):
+    return (position(frontmatter_end), position(todos_end),
+            [astuple(todo)[:3] + tuple(map(position, astuple(todo)[3:])) for todo in todos],
+            [astuple(section)[:3] + tuple(map(position, astuple(section)[3:])) for section in sections])
+
+
+def byte_offsets(text):
+    return list(itertools.accumulate((len(char.encode('utf-8')) for char in text), initial=0)).__getitem__
+
+
+def edits_for(plan, rng, serial):
+    """A few random edits at the boundaries apply_edits() supports."""
+    # Todo edits need a closed frontmatter, or the offsets would fall in the body
+    todos = plan.todo_list if plan.frontmatter_end else []
+    sections = plan.sections
+    block = f'  - id: new-{serial}\n    content: "Added {serial}"\n    status: pending\n'
+    chunk = f'## 9.{serial} Added é\n\nText.\n\n```\n# inside a fence\n```\n### 9.{serial}.1 Child\n'
+    candidates = []
+    for todo in rng.sample(todos, min(3, len(todos))):
+        candidates += [(todo.start, todo.start, block), (todo.start, todo.end, ''),
+                       (todo.start, todo.end, block.replace('pending', 'completed'))]
+        if todo.status_end > todo.status_start:
+            candidates.append((todo.status_start, todo.status_end, 'completed'))
+    if todos:
+        candidates.append((plan.todos_end, plan.todos_end, block))
+    for section in rng.sample(sections, min(3, len(sections))):
+        candidates += [(section.start, section.start, chunk), (section.start, section.end, ''),
+                       (section.start, section.body, f'### 8.{serial} Renamed\n')]
+    edits = sorted(rng.sample(candidates, min(rng.randint(1, 3), len(candidates))))
+    if any(following[0] < current[1] for current, following in zip(edits, edits[1:])):
+        return []
+    return edits
+
+
+@each_plan
+def test_bytes_scan_matches_text_scan(text):
+    data = text.encode('utf-8')
+    assert spans(*scan_text(data)) == spans(*scan_text(text), position=byte_offsets(text))
+
+
+@each_plan
+def test_stream_index_matches_full_parse(text, tmp_path):
+    plan = parse(text)
+    keys = [('todo', todo_id) for todo_id in plan.todos]
+    keys += [('section', section.title) for section in plan.sections]
+    keys += [('section', section.number) for section in plan.sections if section.number]
+    path = tmp_path / 'plan.md'
+    path.write_bytes(text.encode('utf-8'))
+    position = byte_offsets(text)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        streamed = MappedPlan.from_mmap(mapped, [SimpleNamespace(keys=keys)])
+        for todo_id, todo in plan.todos.items():
+            assert spans(0, 0, [streamed.todo(todo_id)], []) == spans(0, 0, [todo], [], position)
+        for _, key in keys[len(plan.todos):]:
+            assert spans(0, 0, [], [streamed.section(key)]) == spans(0, 0, [], [plan.section(key)], position)
+        assert {key: streamed.fingerprint_of(key) for key in plan.fingerprints} == plan.fingerprints
+        assert (streamed.frontmatter_end, streamed.todos_end) == (position(plan.frontmatter_end),
+                                                                  position(plan.todos_end))
+
+
+@each_plan
+def test_incremental_rescan_matches_full_parse(text):
+    rng = random.Random(len(text))
+    plan = parse(text)
+    for serial in range(25):
+        edits = edits_for(plan, rng, serial)
+        if not edits:
+            continue
+        plan = plan.apply_edits(edits)
+        full = parse(plan.text)
+        assert spans(plan.frontmatter_end, plan.todos_end, plan.todo_list, plan.sections) == \
+            spans(full.frontmatter_end, full.todos_end, full.todo_list, full.sections)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from guests.export import file_rows
+
+
+def write_csv(tmp_path, text):
+    path = tmp_path / 'guests.csv'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_splits_a_single_name_column(tmp_path):
+    path = write_csv(tmp_path, 'Full Name,Email\nAda Lovelace,ada@example.com\n"Hopper, Grace",grace@example.com\n')
+    rows = list(file_rows(path, ['first_name', 'last_name', 'email']))
+    assert rows == [['Ada', 'Lovelace', 'ada@example.com'], ['Grace', 'Hopper', 'grace@example.com']]
+
+
+def test_first_and_last_name_columns_win(tmp_path):
+    path = write_csv(tmp_path, 'First Name,Last Name,Name,Email\nAda,Byron,Ada Lovelace,ada@example.com\n')
+    assert list(file_rows(path, ['first_name', 'last_name'])) == [['Ada', 'Byron']]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from guests.filters import FilterCompiler, FilterError
+
+RSVP = {'field': 'rsvp_status', 'op': 'eq', 'value': 'confirmed'}
+
+
+def test_event_fields_compile_against_the_join():
+    compiled = FilterCompiler().compile({'event_id': 'e1', 'conditions': [RSVP]}, 'org')
+    assert 'JOIN event_guests eg' in compiled.sql and 'eg.rsvp_status = %s' in compiled.sql
+    assert compiled.params == ['org', 'e1', 'confirmed']
+
+
+def test_event_fields_outside_an_event_use_a_subquery():
+    compiled = FilterCompiler().compile({'conditions': [RSVP]}, 'org')
+    assert 'JOIN' not in compiled.sql and 'EXISTS' in compiled.sql
+
+
+@pytest.mark.parametrize('event_id', ['', 0, 12, ['e1'], {'id': 'e1'}, False])
+def test_rejects_invalid_event_id(event_id):
+    with pytest.raises(FilterError, match='event_id'):
+        FilterCompiler().compile({'event_id': event_id, 'conditions': [RSVP]}, 'org')
+
+
+def test_custom_fields_need_a_column():
+    criteria = {'conditions': [{'field': 'custom.dietary', 'op': 'eq', 'value': 'vegan'}]}
+    with pytest.raises(FilterError, match='custom fields column'):
+        FilterCompiler().compile(criteria, 'org')
+    assert 'g.extra @> %s::jsonb' in FilterCompiler(custom_fields='extra').compile(criteria, 'org').sql
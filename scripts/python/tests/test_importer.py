@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+
+import pytest
+
+import import_guests
+
+
+class DriverError(Exception):
+    pass
+
+
+class Cursor:
+    def copy(self, statement):
+        raise DriverError('insert or update on table "event_guests" violates foreign key constraint')
+
+
+class Connection:
+    def cursor(self):
+        return Cursor()
+
+    def rollback(self):
+        raise DriverError('connection already closed')
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    module = types.ModuleType('psycopg')
+    module.Error = DriverError
+    module.connect = lambda dsn: Connection() if dsn == 'ok' else (_ for _ in ()).throw(DriverError('bad dsn'))
+    monkeypatch.setitem(sys.modules, 'psycopg', module)
+    return module
+
+
+@pytest.fixture
+def guests_csv(tmp_path):
+    path = tmp_path / 'guests.csv'
+    path.write_text('First Name,Last Name,Email\nAda,Lovelace,ada@example.com\n', encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('dsn, message', [('bad', 'cannot connect to Postgres: bad dsn'),
+                                          ('ok', 'loading guests failed: insert or update on table')])
+def test_driver_errors_are_reported(driver, guests_csv, capsys, dsn, message):
+    assert import_guests.main([guests_csv, '--dsn', dsn, '--organization', 'org', '--event', 'ev']) == 1
+    assert capsys.readouterr().err.startswith(f'Error: {message}')
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Load test the waitlist signup endpoint (plan: Stress Testing, Week 3-4 Phase 0).
+
+    python scripts/python/waitlist_loadtest.py serve --port 3000                     # in-memory stand-in
+    python scripts/python/waitlist_loadtest.py serve --dsn postgresql://localhost/waitlist_test --init-schema
+    python scripts/python/waitlist_loadtest.py run http://127.0.0.1:3000/api/waitlist --rate 200 --duration 60
+    python scripts/python/waitlist_loadtest.py run http://localhost:3000/api/waitlist \\
+        --mode ramp --start-rate 10 --rate 1000 --duration 120 --duplicates 0.1 -o report.json
+
+`run` is open-loop: requests leave on a fixed schedule (constant rate or
+linear ramp, Poisson or evenly spaced arrivals) regardless of how fast
+the server answers. The report has p50/p95/p99 latency per request kind
+(new, duplicate, invalid), status and error counts, a per-second
+timeline, and whether each email was accepted exactly once. `serve`
+mimics app/api/waitlist/route.ts against memory or a local Postgres, so
+the numbers can be taken before the real deployment exists.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from loadtest.client import LoadTestError
+from loadtest.runner import run_load
+from loadtest.server import MemoryStore, PostgresStore, WaitlistServer
+from loadtest.workload import ARRIVALS, MODES, Workload, arrival_times, read_replay
+
+
+def run(args):
+    try:
+        replay = read_replay(args.replay) if args.replay else ()
+        times = arrival_times(args.rate, args.duration, mode=args.mode, start_rate=args.start_rate,
+                              arrivals=args.arrivals, seed=args.seed)
+        workload = Workload(duplicate_ratio=args.duplicates, invalid_ratio=args.invalid, race_share=args.race,
+                            run_id=args.run_id, replay=replay, seed=args.seed)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    requests = workload.build(times)
+    print(f'{len(requests)} requests over {args.duration} s ({args.mode}, {args.arrivals} arrivals, '
+          f'run id {args.run_id or "-"})', file=sys.stderr)
+
+    def progress(second, done, inflight):
+        print(f'  t={second:.0f}s answered {done}, in flight {inflight}', file=sys.stderr)
+
+    try:
+        report = asyncio.run(run_load(args.url, requests, duration=args.duration, connections=args.connections,
+                                      max_inflight=args.max_inflight, timeout=args.timeout,
+                                      progress=progress if args.verbose else None))
+    except LoadTestError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print('Interrupted', file=sys.stderr)
+        return 130
+
+    data = report.as_dict()
+    data['config'] = {'url': args.url, 'mode': args.mode, 'rate': args.rate, 'start_rate': args.start_rate,
+                      'duration': args.duration, 'arrivals': args.arrivals, 'duplicates': args.duplicates,
+                      'invalid': args.invalid, 'connections': args.connections, 'run_id': args.run_id}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    print(report.format_summary())
+
+    failures = []
+    if args.max_p95 is not None and (data['latency_ms']['all'].get('p95') or 0) > args.max_p95:
+        failures.append(f"p95 {data['latency_ms']['all']['p95']} ms over {args.max_p95} ms")
+    if data['failed'] or data['unexpected_status'] or sum(data['dropped'].values()):
+        failures.append(f"{data['failed']} failed, {data['unexpected_status']} unexpected, "
+                        f"{sum(data['dropped'].values())} dropped")
+    if data['uniqueness']['accepted_more_than_once']:
+        failures.append(f"{data['uniqueness']['accepted_more_than_once']} email(s) accepted more than once")
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+def serve(args):
+    # The Postgres store reads migrations/ relative to the project root
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, '..', '..'))
+    try:
+        if args.dsn:
+            store = PostgresStore(args.dsn, pool_size=args.pool_size, init_schema=args.init_schema,
+                                  truncate=args.truncate)
+        else:
+            store = MemoryStore(latency=args.db_latency / 1000)
+    except (LoadTestError, OSError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    server = WaitlistServer(store)
+
+    def ready(listener):
+        address = listener.sockets[0].getsockname()
+        print(f"Stand-in waitlist API on http://{address[0]}:{address[1]}/api/waitlist "
+              f"({'postgres' if args.dsn else 'memory'} store, Ctrl+C to stop)", file=sys.stderr)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready=ready))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+        print(json.dumps({str(status): count for status, count in sorted(server.statuses.items())}),
+              file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Open-loop load test for the waitlist API.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('run', help='send a signup workload and report latency and errors')
+    load.add_argument('url', help='waitlist endpoint, e.g. http://127.0.0.1:3000/api/waitlist')
+    load.add_argument('--mode', choices=MODES, default='constant', help='arrival rate shape (default constant)')
+    load.add_argument('--rate', type=float, default=100, help='requests per second (ramp: final rate)')
+    load.add_argument('--start-rate', type=float, default=1, help='ramp starting rate (default 1/s)')
+    load.add_argument('--duration', type=float, default=30, help='seconds of load (default 30)')
+    load.add_argument('--arrivals', choices=ARRIVALS, default='poisson', help='arrival process (default poisson)')
+    load.add_argument('--duplicates', type=float, default=0.05, help='share of duplicate signups (default 0.05)')
+    load.add_argument('--race', type=float, default=0.3,
+                      help='share of duplicates resending one of the last few signups (default 0.3)')
+    load.add_argument('--invalid', type=float, default=0.01, help='share of invalid submissions (default 0.01)')
+    load.add_argument('--replay', help='JSONL or CSV of real signup payloads to send first')
+    load.add_argument('--run-id', default=format(int(time.time()) % 36 ** 5, 'x'),
+                      help="tag added to every email (default: time based; '' to send emails unchanged)")
+    load.add_argument('--seed', type=int, default=0, help='random seed for arrivals and payloads')
+    load.add_argument('--connections', type=int, default=256, help='keep-alive connection pool size (default 256)')
+    load.add_argument('--max-inflight', type=int, default=10000,
+                      help='drop (and report) requests beyond this many in flight (default 10000)')
+    load.add_argument('--timeout', type=float, default=30, help='per-request timeout in seconds (default 30)')
+    load.add_argument('--max-p95', type=float, help='fail if overall p95 latency exceeds this many ms')
+    load.add_argument('-o', '--output', help='write the full JSON report here')
+    load.add_argument('-v', '--verbose', action='store_true', help='report progress every second')
+
+    stand_in = commands.add_parser('serve', help='run the local stand-in for /api/waitlist')
+    stand_in.add_argument('--host', default='127.0.0.1')
+    stand_in.add_argument('--port', type=int, default=3000)
+    stand_in.add_argument('--dsn', help='store signups in this Postgres database instead of memory')
+    stand_in.add_argument('--pool-size', type=int, default=10, help='Postgres connections (default 10)')
+    stand_in.add_argument('--init-schema', action='store_true',
+                          help='create the waitlist table from migrations/001_waitlist_table_simple.sql')
+    stand_in.add_argument('--truncate', action='store_true', help='empty the waitlist table first')
+    stand_in.add_argument('--db-latency', type=float, default=0.0,
+                          help='simulated insert latency in ms for the memory store')
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else serve(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())